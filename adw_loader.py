@@ -0,0 +1,274 @@
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from focus_schema import NUMERIC_COLUMNS, TIMESTAMP_COLUMNS
+from focus_stream import stream_object_chunks
+
+# Bulk loader of FOCUS reports into Autonomous Database, or into a local SQLite stand-in.
+# Each report is streamed from Object Storage and gunzipped on the fly, bound in batches of rows through
+# cursor.executemany into a staging table, then moved into the target table in the same transaction that
+# records it in the load ledger. A report already in the ledger with the same etag is skipped, and a
+# changed report replaces exactly the rows it loaded before, so re-running a load never duplicates cost.
+
+DEFAULT_WORKERS = 4
+DEFAULT_BATCH_SIZE = 20_000
+TARGET_TABLE = 'FOCUS_COSTS'
+STAGE_TABLE = 'FOCUS_COSTS_STAGE'
+LEDGER_TABLE = 'FOCUS_LOAD_LEDGER'
+SOURCE_COLUMN = 'SourceFile'
+
+# Report columns kept in the database, the ones a report does not have are loaded as NULL
+LOAD_COLUMNS = [
+    'BillingAccountId', 'BillingPeriodStart', 'BillingPeriodEnd', 'ChargePeriodStart', 'ChargePeriodEnd',
+    'ChargeCategory', 'ChargeDescription', 'Provider', 'ServiceName', 'Region', 'AvailabilityZone',
+    'SubAccountId', 'SubAccountName', 'ResourceId', 'SkuId', 'PricingUnit', 'PricingQuantity',
+    'UsageUnit', 'UsageQuantity', 'ListUnitPrice', 'ListCost', 'BilledCost', 'EffectiveCost', 'BillingCurrency',
+]
+TABLE_COLUMNS = LOAD_COLUMNS + [SOURCE_COLUMN]
+
+
+def _column_kind(column):
+    if column in TIMESTAMP_COLUMNS:
+        return 'timestamp'
+    if column in NUMERIC_COLUMNS:
+        return 'number'
+    return 'text'
+
+
+class Backend:
+    # SQL dialect and connection handling for one database. Subclasses provide connection(),
+    # the column types, the table DDL suffix and the ledger upsert.
+    column_types = {}
+    ledger_upsert = None
+    table_exists = None
+
+    def bind(self, position):
+        return '?'
+
+    def binds(self, count):
+        return ', '.join(self.bind(i + 1) for i in range(count))
+
+    @contextmanager
+    def connection(self):
+        raise NotImplementedError
+
+    def table_options(self, table):
+        return ''
+
+    def set_input_sizes(self, cursor):
+        pass
+
+    def to_rows(self, frame):
+        for column in TIMESTAMP_COLUMNS:
+            if column in frame and hasattr(frame[column], 'dt'):
+                frame[column] = frame[column].dt.tz_convert(None)
+        return list(frame.astype(object).where(frame.notna(), None).itertuples(index=False, name=None))
+
+    def create_tables(self):
+        columns = ', '.join(f"{c} {self.column_types[_column_kind(c)]}" for c in TABLE_COLUMNS)
+        ledger_columns = ', '.join(f"{c} {self.column_types[kind]}" for c, kind in (
+            ('SourceFile', 'key'), ('ETag', 'text'), ('Md5', 'text'), ('ObjectSize', 'number'),
+            ('RowCount', 'number'), ('LoadedAt', 'text')))
+        tables = {
+            TARGET_TABLE: f"CREATE TABLE {TARGET_TABLE} ({columns}){self.table_options(TARGET_TABLE)}",
+            STAGE_TABLE: f"CREATE TABLE {STAGE_TABLE} ({columns}){self.table_options(STAGE_TABLE)}",
+            LEDGER_TABLE: f"CREATE TABLE {LEDGER_TABLE} ({ledger_columns}, PRIMARY KEY (SourceFile))",
+        }
+        with self.connection() as connection:
+            cursor = connection.cursor()
+            for table, ddl in tables.items():
+                cursor.execute(self.table_exists, [table])
+                if cursor.fetchone() is None:
+                    cursor.execute(ddl)
+            connection.commit()
+
+    def ledger(self):
+        with self.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(f"SELECT SourceFile, ETag, Md5, ObjectSize FROM {LEDGER_TABLE}")
+            return {name: {'etag': etag, 'md5': md5, 'size': size} for name, etag, md5, size in cursor.fetchall()}
+
+
+class OracleBackend(Backend):
+    column_types = {'timestamp': 'TIMESTAMP', 'number': 'NUMBER', 'text': 'VARCHAR2(4000)', 'key': 'VARCHAR2(1024)'}
+    table_exists = "SELECT table_name FROM user_tables WHERE table_name = :1"
+    ledger_upsert = (
+        f"MERGE INTO {LEDGER_TABLE} l USING (SELECT :1 SourceFile, :2 ETag, :3 Md5, :4 ObjectSize, :5 RowCount, "
+        ":6 LoadedAt FROM dual) s ON (l.SourceFile = s.SourceFile) "
+        "WHEN MATCHED THEN UPDATE SET l.ETag = s.ETag, l.Md5 = s.Md5, l.ObjectSize = s.ObjectSize, "
+        "l.RowCount = s.RowCount, l.LoadedAt = s.LoadedAt "
+        "WHEN NOT MATCHED THEN INSERT (SourceFile, ETag, Md5, ObjectSize, RowCount, LoadedAt) "
+        "VALUES (s.SourceFile, s.ETag, s.Md5, s.ObjectSize, s.RowCount, s.LoadedAt)"
+    )
+
+    def __init__(self, user, password, dsn, workers=DEFAULT_WORKERS):
+        import oracledb
+
+        self.oracledb = oracledb
+        # One pooled session per loader worker
+        self.pool = oracledb.create_pool(user=user, password=password, dsn=dsn, min=1, max=workers, increment=1)
+
+    def bind(self, position):
+        return f":{position}"
+
+    @contextmanager
+    def connection(self):
+        with self.pool.acquire() as connection:
+            yield connection
+
+    def table_options(self, table):
+        # Cost rows land in daily interval partitions, so queries over a time window prune to those days
+        if table == TARGET_TABLE:
+            return (" PARTITION BY RANGE (BillingPeriodStart) INTERVAL (NUMTODSINTERVAL(1, 'DAY')) "
+                    "(PARTITION p_initial VALUES LESS THAN (TIMESTAMP '2020-01-01 00:00:00'))")
+        return ' NOLOGGING'
+
+    def set_input_sizes(self, cursor):
+        # Fixed bind types, so a batch whose first rows are NULL does not make the driver guess a type
+        types = {'timestamp': self.oracledb.DB_TYPE_TIMESTAMP, 'number': self.oracledb.DB_TYPE_NUMBER,
+                 'text': 4000}
+        cursor.setinputsizes(*[types[_column_kind(c)] for c in TABLE_COLUMNS])
+
+
+class SqliteBackend(Backend):
+    # Local stand-in with the same tables and load path, for development and tests
+    column_types = {'timestamp': 'TEXT', 'number': 'REAL', 'text': 'TEXT', 'key': 'TEXT'}
+    table_exists = "SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?"
+    ledger_upsert = (f"INSERT OR REPLACE INTO {LEDGER_TABLE} (SourceFile, ETag, Md5, ObjectSize, RowCount, LoadedAt) "
+                     "VALUES (?, ?, ?, ?, ?, ?)")
+
+    def __init__(self, path):
+        self.path = path
+
+    @contextmanager
+    def connection(self):
+        # SQLite has a single writer, the other workers wait for it
+        connection = sqlite3.connect(self.path, timeout=600, check_same_thread=False)
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def to_rows(self, frame):
+        for column in TIMESTAMP_COLUMNS:
+            if column in frame and hasattr(frame[column], 'dt'):
+                frame[column] = frame[column].dt.strftime('%Y-%m-%d %H:%M:%S')
+        return super().to_rows(frame)
+
+
+def is_loaded(entry, obj):
+    # Same comparison as SyncManifest.is_current: size first, then etag, else md5
+    if entry is None or entry.get('size') != obj.size:
+        return False
+    etag = getattr(obj, 'etag', None)
+    if etag and entry.get('etag'):
+        return etag == entry['etag']
+    md5 = getattr(obj, 'md5', None)
+    return md5 is not None and md5 == entry.get('md5')
+
+
+@dataclass
+class LoadResult:
+    source_name: str
+    rows: int = 0
+    seconds: float = 0.0
+    error: str = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+@dataclass
+class LoadSummary:
+    results: list = field(default_factory=list)
+    skipped: int = 0
+    seconds: float = 0.0
+
+    @property
+    def loaded(self):
+        return [r for r in self.results if r.ok]
+
+    @property
+    def failed(self):
+        return [r for r in self.results if not r.ok]
+
+    @property
+    def rows(self):
+        return sum(r.rows for r in self.loaded)
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {
+            "objects": len(self.results) + self.skipped,
+            "loaded": len(self.loaded),
+            "skipped": self.skipped,
+            "failed": [r.source_name for r in self.failed],
+            "rows": self.rows,
+            "seconds": round(self.seconds, 3),
+            "rows_per_sec": round(self.rows_per_sec),
+        }
+
+
+def load_report(backend, client, namespace, bucket, obj, batch_size=DEFAULT_BATCH_SIZE):
+    name = obj.name
+    started = time.perf_counter()
+    where_source = f"WHERE {SOURCE_COLUMN} = {backend.bind(1)}"
+    column_list = ', '.join(TABLE_COLUMNS)
+    insert_stage = f"INSERT INTO {STAGE_TABLE} ({column_list}) VALUES ({backend.binds(len(TABLE_COLUMNS))})"
+
+    rows = 0
+    with backend.connection() as connection:
+        cursor = connection.cursor()
+        # One executemany per parsed chunk, the chunk size is the array bind size. Numbers are bound as
+        # float64, the database keeps them as the report has them
+        for chunk in stream_object_chunks(client, namespace, bucket, name, chunksize=batch_size, stored=True):
+            frame = chunk[chunk['BillingPeriodStart'].notna()].reindex(columns=LOAD_COLUMNS)
+            if frame.empty:
+                continue
+            frame[SOURCE_COLUMN] = name
+            backend.set_input_sizes(cursor)
+            cursor.executemany(insert_stage, backend.to_rows(frame))
+            rows += len(frame)
+
+        # The report's previous rows are replaced and the ledger updated in one commit
+        cursor.execute(f"DELETE FROM {TARGET_TABLE} {where_source}", [name])
+        cursor.execute(f"INSERT INTO {TARGET_TABLE} ({column_list}) SELECT {column_list} FROM {STAGE_TABLE} {where_source}",
+                       [name])
+        cursor.execute(f"DELETE FROM {STAGE_TABLE} {where_source}", [name])
+        cursor.execute(backend.ledger_upsert, [name, getattr(obj, 'etag', None), getattr(obj, 'md5', None), obj.size,
+                                               rows, datetime.now(timezone.utc).isoformat()])
+        connection.commit()
+    return LoadResult(name, rows=rows, seconds=time.perf_counter() - started)
+
+
+def load_reports(backend, client, namespace, bucket, objects, workers=DEFAULT_WORKERS, batch_size=DEFAULT_BATCH_SIZE):
+    # objects are listing summaries with name, size and etag/md5 (see sync_manifest.list_objects_since)
+    backend.create_tables()
+    ledger = backend.ledger()
+    pending = [o for o in objects if not is_loaded(ledger.get(o.name), o)]
+    summary = LoadSummary(skipped=len(objects) - len(pending))
+    print(f"{len(pending)} of {len(objects)} reports are new or changed, {summary.skipped} already loaded")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        futures = {pool.submit(load_report, backend, client, namespace, bucket, o, batch_size): o.name for o in pending}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = LoadResult(name, error=str(e))
+                print(f"Error loading {name}: {e}")
+            else:
+                print(f"Loaded {result.rows} rows from {name} in {result.seconds:.1f}s")
+            summary.results.append(result)
+    summary.seconds = time.perf_counter() - started
+    return summary
@@ -0,0 +1,289 @@
+import json
+import os
+import sys
+import warnings
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# Instrumentation ships with the copy-cost-reports function
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'copy-cost-reports'))
+from instrumentation import count, span
+
+# Daily cost anomaly detection over many (service, region[, compartment, sku ...]) series at once.
+# Each series keeps a small incremental state: the last `window` daily costs (for median/MAD),
+# an EWMA mean and variance, and a multiplicative day-of-week profile. A daily run scores only the
+# days after the state's last day and then folds them in, so nothing is refit from scratch.
+# All arithmetic is over (series x window) NumPy arrays, one vector operation per day.
+
+DEFAULT_WINDOW = 28
+DEFAULT_ALPHA = 0.1
+PROFILE_ALPHA = 0.1
+# Days of history a series needs before it is scored, two of each weekday
+MIN_PERIODS = 14
+CLIP_SCALE = 3.5
+MAD_SCALE = 1.4826
+# Lowest day-of-week factor. A weekday without cost (a weekend of a weekday-only workload) keeps this
+# instead of 0, which would make every later cost on it infinitely anomalous; such weekdays say nothing
+# about the series' level and are left out of the robust baseline
+PROFILE_FLOOR = 0.05
+
+
+def _scale_floor(level):
+    # Keeps flat or near-zero series from producing infinite scores on a few cents of change
+    return 0.05 * np.abs(level) + 0.01
+
+
+class SeriesState:
+    def __init__(self, keys, window=DEFAULT_WINDOW):
+        self.keys = list(keys)
+        self.window_size = window
+        self.series = []
+        self.index = {}
+        self.window = np.full((0, window), np.nan)
+        self.count = np.zeros(0, dtype=np.int64)
+        self.ewma_mean = np.zeros(0)
+        self.ewma_var = np.zeros(0)
+        self.profile = np.ones((0, 7))
+        self.last_day = None
+
+    def __len__(self):
+        return len(self.series)
+
+    def align(self, series):
+        # New series (a service used for the first time) start with an empty history
+        new = [s for s in series if s not in self.index]
+        if new:
+            for s in new:
+                self.index[s] = len(self.series)
+                self.series.append(s)
+            n = len(new)
+            self.window = np.vstack([self.window, np.full((n, self.window_size), np.nan)])
+            self.count = np.concatenate([self.count, np.zeros(n, dtype=np.int64)])
+            self.ewma_mean = np.concatenate([self.ewma_mean, np.zeros(n)])
+            self.ewma_var = np.concatenate([self.ewma_var, np.zeros(n)])
+            self.profile = np.vstack([self.profile, np.ones((n, 7))])
+        return np.array([self.index[s] for s in series], dtype=np.int64)
+
+    def window_weekdays(self):
+        # Weekday of each window column; the last column holds last_day
+        last = self.last_day.weekday() if self.last_day else 0
+        return (last - self.window_size + 1 + np.arange(self.window_size)) % 7
+
+    def robust_baseline(self):
+        # Median and MAD of the window with the day-of-week profile divided out, over the weekdays with cost
+        profile = self.profile[:, self.window_weekdays()]
+        adjusted = np.where(profile > PROFILE_FLOOR, self.window / profile, np.nan)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            median = np.nanmedian(adjusted, axis=1)
+            mad = np.nanmedian(np.abs(adjusted - median[:, None]), axis=1)
+        return median, mad
+
+    def fold(self, values, weekday, alpha=DEFAULT_ALPHA):
+        # A spike moves the EWMA and profile only as far as a borderline value would, so one outlier
+        # does not mask the following days; a lasting level shift is still absorbed over time.
+        # The window keeps the raw values, its median is robust on its own.
+        expected = self.ewma_mean * self.profile[:, weekday]
+        bound = CLIP_SCALE * np.maximum(np.sqrt(self.ewma_var), _scale_floor(expected))
+        tracked = np.where(self.count >= MIN_PERIODS, np.clip(values, expected - bound, expected + bound), values)
+
+        first = self.count == 0
+        diff = tracked - self.ewma_mean
+        self.ewma_mean = np.where(first, tracked, self.ewma_mean + alpha * diff)
+        self.ewma_var = np.where(first, 0.0, (1 - alpha) * (self.ewma_var + alpha * diff ** 2))
+
+        # Each weekday is seen once a week, so its profile starts as a running mean over the weeks seen
+        level = self.ewma_mean
+        ratio = np.divide(tracked, level, out=np.ones_like(tracked), where=level > 0)
+        profile_alpha = np.maximum(PROFILE_ALPHA, 1 / (self.count // 7 + 1))
+        self.profile[:, weekday] = np.maximum((1 - profile_alpha) * self.profile[:, weekday] + profile_alpha * ratio,
+                                              PROFILE_FLOOR)
+
+        self.window = np.roll(self.window, -1, axis=1)
+        self.window[:, -1] = values
+        self.count += 1
+
+    def save(self, path):
+        meta = {
+            'keys': self.keys,
+            'window': self.window_size,
+            'series': [list(s) for s in self.series],
+            'last_day': self.last_day.isoformat() if self.last_day else None,
+        }
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(tmp_path, meta=np.array(json.dumps(meta)), window=self.window, count=self.count,
+                            ewma_mean=self.ewma_mean, ewma_var=self.ewma_var, profile=self.profile)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            state = cls(meta['keys'], meta['window'])
+            state.series = [tuple(s) for s in meta['series']]
+            state.index = {s: i for i, s in enumerate(state.series)}
+            state.window = data['window']
+            state.count = data['count']
+            state.ewma_mean = data['ewma_mean']
+            state.ewma_var = data['ewma_var']
+            # States saved before the floor may hold zero factors
+            state.profile = np.maximum(data['profile'], PROFILE_FLOOR)
+        state.last_day = date.fromisoformat(meta['last_day']) if meta['last_day'] else None
+        return state
+
+
+# Scorers see the state as it was before the day is folded in, plus that day's costs for every series.
+# score() returns one value per series (NaN when there is not enough history), flag() turns scores
+# into anomaly booleans.
+
+class Scorer:
+    name = None
+    threshold = 3.5
+
+    def score(self, state, values, weekday):
+        raise NotImplementedError
+
+    def flag(self, scores):
+        return np.abs(np.nan_to_num(scores)) > self.threshold
+
+
+class RobustScorer(Scorer):
+    # Distance from the rolling median in MAD units, with the day-of-week profile applied to both. The
+    # scale floor follows the series' level rather than the weekday's, so an empty weekday expected to be
+    # empty scores near zero instead of a full median below its baseline
+    name = 'mad'
+
+    def score(self, state, values, weekday):
+        median, mad = state.robust_baseline()
+        profile = state.profile[:, weekday]
+        scale = np.maximum(MAD_SCALE * mad * profile, _scale_floor(median))
+        return np.where(state.count >= MIN_PERIODS, (values - median * profile) / scale, np.nan)
+
+
+class EwmaScorer(Scorer):
+    name = 'ewma'
+
+    def score(self, state, values, weekday):
+        scale = np.maximum(np.sqrt(state.ewma_var), _scale_floor(state.ewma_mean))
+        return np.where(state.count >= MIN_PERIODS, (values - state.ewma_mean) / scale, np.nan)
+
+
+class SeasonalScorer(Scorer):
+    # EWMA level adjusted by the series' day-of-week profile, so weekday/weekend swings are expected
+    name = 'seasonal'
+
+    def score(self, state, values, weekday):
+        expected = state.ewma_mean * state.profile[:, weekday]
+        scale = np.maximum(np.sqrt(state.ewma_var), _scale_floor(expected))
+        return np.where(state.count >= MIN_PERIODS, (values - expected) / scale, np.nan)
+
+
+class ZScoreScorer(Scorer):
+    # Cross-sectional z-score of trailing window totals, the detector main.py uses
+    name = 'zscore'
+    threshold = 3.0
+
+    def score(self, state, values, weekday):
+        totals = np.nansum(state.window[:, 1:], axis=1) + values
+        std = totals.std()
+        return (totals - totals.mean()) / std if std else np.zeros_like(totals)
+
+
+class IsolationForestScorer(Scorer):
+    # IsolationForest over trailing window totals, the detector main_isolation_forest.py uses
+    name = 'isolation_forest'
+    threshold = 0.0
+
+    def __init__(self, contamination=0.05, random_state=42):
+        self.contamination = contamination
+        self.random_state = random_state
+
+    def score(self, state, values, weekday):
+        from sklearn.ensemble import IsolationForest
+
+        totals = (np.nansum(state.window[:, 1:], axis=1) + values).reshape(-1, 1)
+        if len(totals) < 2:
+            return np.full(len(totals), np.nan)
+        model = IsolationForest(contamination=self.contamination, random_state=self.random_state)
+        # decision_function is negative for outliers; flip it so larger means more anomalous
+        return -model.fit(totals).decision_function(totals)
+
+    def flag(self, scores):
+        return np.nan_to_num(scores, nan=-1.0) > self.threshold
+
+
+SCORERS = {cls.name: cls for cls in (RobustScorer, EwmaScorer, SeasonalScorer, ZScoreScorer, IsolationForestScorer)}
+
+
+class AnomalyEngine:
+    def __init__(self, keys=('ServiceName', 'Region'), scorers=('mad', 'seasonal'), window=DEFAULT_WINDOW,
+                 alpha=DEFAULT_ALPHA, state=None):
+        self.state = state or SeriesState(keys, window)
+        self.keys = self.state.keys
+        self.scorers = [SCORERS[s]() if isinstance(s, str) else s for s in scorers]
+        self.alpha = alpha
+
+    @classmethod
+    def open(cls, path, keys=('ServiceName', 'Region'), **kwargs):
+        state = SeriesState.load(path) if os.path.exists(path) else None
+        if state is not None and state.keys != list(keys):
+            raise ValueError(f"state at {path} is keyed on {state.keys}, not {list(keys)}")
+        return cls(keys=keys, state=state, **kwargs)
+
+    def save(self, path):
+        self.state.save(path)
+
+    def columns(self, value='EffectiveCost'):
+        return self.keys + ['BillingDay', value] + [f"score_{s.name}" for s in self.scorers] + ['is_anomaly']
+
+    def update(self, daily, value='EffectiveCost', through=None):
+        # daily: long frame of keys + BillingDay + value. Days already folded into the state are skipped;
+        # a series with no row on a day had no cost that day. through is the last day whose reports are
+        # complete: later days are left out of the state (and last_day) so the next run scores them whole.
+        # Returns one row per (series, new day) with a score column per scorer and an is_anomaly flag.
+        if self.state.last_day is not None:
+            daily = daily[daily['BillingDay'] > self.state.last_day]
+        if through is not None:
+            daily = daily[daily['BillingDay'] <= through]
+        if daily.empty:
+            empty = pd.DataFrame({c: pd.Series(dtype=float) for c in self.columns(value)})
+            return empty.astype({c: object for c in self.keys + ['BillingDay']} | {'is_anomaly': bool})
+
+        matrix = daily.pivot_table(index=self.keys, columns='BillingDay', values=value, aggfunc='sum',
+                                   fill_value=0.0, observed=True)
+        days = pd.date_range(matrix.columns.min(), matrix.columns.max(), freq='D').date
+        matrix = matrix.reindex(columns=days, fill_value=0.0)
+
+        rows = self.state.align([s if isinstance(s, tuple) else (s,) for s in matrix.index])
+        n = len(self.state)
+        count('series_scored', n * len(days))
+        # Series known to the state but absent from this batch are folded in with zero cost
+        values_by_day = np.zeros((n, len(days)))
+        values_by_day[rows] = matrix.to_numpy(dtype=float)
+
+        results = []
+        for column, day in enumerate(days):
+            values = values_by_day[:, column]
+            weekday = day.weekday()
+            with span('detect', day=day, series=n):
+                scores = {s.name: s.score(self.state, values, weekday) for s in self.scorers}
+                flagged = np.zeros(n, dtype=bool)
+                for scorer in self.scorers:
+                    flagged |= scorer.flag(scores[scorer.name])
+            count('anomalies_flagged', int(flagged.sum()))
+
+            frame = pd.DataFrame(self.state.series, columns=self.keys)
+            frame['BillingDay'] = day
+            frame[value] = values
+            for name, score in scores.items():
+                frame[f"score_{name}"] = score
+            frame['is_anomaly'] = flagged
+            results.append(frame)
+
+            self.state.fold(values, weekday, self.alpha)
+            self.state.last_day = day
+
+        return pd.concat(results, ignore_index=True)
+
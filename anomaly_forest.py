@@ -0,0 +1,205 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import IsolationForest
+
+# Instrumentation ships with the copy-cost-reports function
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'copy-cost-reports'))
+from instrumentation import count, span
+
+from focus_cache import iter_cache
+from focus_stream import aggregate_chunks
+
+# IsolationForest over per-series behaviour instead of a single window total.
+# build_features turns the daily cost of every (keys..., SkuId) in the window into one row of features
+# per series with array reductions: the daily costs are binned into one series x days float array
+# (about 100 MB at 100k series over 120 days) and every feature is a row-wise sum over it, with no
+# per-series Python loop. The fitted forest is persisted with the feature list it was trained on, so a
+# daily run only scores and retrains when the model is missing, older than max_age or the features
+# changed. Scoring splits the series into shards scored in worker processes that each load the
+# persisted model once.
+#
+# Scripts that score with n_jobs > 1 must keep their top-level code under `if __name__ == '__main__':`,
+# worker processes are spawned (not forked) on Windows and re-import the main module.
+
+FEATURES = ['log_daily_mean', 'trend', 'week_over_week', 'volatility', 'active_share', 'sku_count',
+            'sku_concentration']
+VALUE = 'EffectiveCost'
+DEFAULT_CONTAMINATION = 0.05
+DEFAULT_MAX_AGE = 7
+# Shards per worker, so a slow shard does not leave the other workers idle at the end
+SHARDS_PER_JOB = 4
+
+
+def daily_rows(cache_dir, keys, start, end):
+    # One streaming pass over the cache: cost per series, SKU and day inside [start, end).
+    # Rows without a SkuId are kept under '' so their cost still counts towards the series.
+    def with_sku(chunk):
+        sku = chunk['SkuId']
+        if isinstance(sku.dtype, pd.CategoricalDtype) and '' not in sku.cat.categories:
+            sku = sku.cat.add_categories([''])
+        return chunk.assign(SkuId=sku.fillna(''))
+
+    columns = ['BillingPeriodStart', VALUE, 'SkuId'] + list(keys)
+    chunks = (with_sku(chunk) for chunk in iter_cache(cache_dir, columns=columns, start=start, end=end))
+    return aggregate_chunks(chunks, keys=list(keys) + ['SkuId', 'BillingDay'])
+
+
+def build_features(rows, keys, start, end):
+    # rows: keys + SkuId + BillingDay + EffectiveCost, e.g. aggregate_chunks(..., keys=keys + ['SkuId', 'BillingDay']).
+    # start/end are dates, end exclusive; days without a row count as zero cost.
+    #   log_daily_mean     log1p of the mean daily cost over the window
+    #   trend              least-squares slope of the daily cost, as a fraction of the mean per day
+    #   week_over_week     log1p(last 7 days) - log1p(the 7 days before)
+    #   volatility         standard deviation of the daily cost over its mean
+    #   active_share       fraction of the window's days with cost
+    #   sku_count          SKUs with positive cost
+    #   sku_concentration  sum of squared SKU cost shares, 1.0 for a single-SKU series
+    keys = list(keys)
+    days = (end - start).days
+    offset = (np.asarray(rows['BillingDay'], dtype='datetime64[D]') - np.datetime64(start, 'D')).astype(np.int64)
+    inside = (offset >= 0) & (offset < days)
+    if not inside.all():
+        rows, offset = rows[inside], offset[inside]
+    if rows.empty:
+        return pd.DataFrame(columns=keys + [VALUE] + FEATURES)
+
+    groups = rows.groupby(keys, observed=True, sort=True)
+    codes = groups.ngroup().to_numpy()
+    n = groups.ngroups
+    cost = rows[VALUE].to_numpy(dtype=float)
+
+    # Daily totals per series, the SKU rows of one day are one observation
+    x = np.bincount(codes.astype(np.int64) * days + offset, cost, n * days).reshape(n, days)
+    total = x.sum(axis=1)
+    mean = total / days
+    t = np.arange(days) - (days - 1) / 2
+    slope = x @ t / ((t * t).sum() or 1.0)
+    variance = np.maximum(np.einsum('ij,ij->i', x, x) / days - mean ** 2, 0.0)
+    last_week = x[:, -7:].sum(axis=1)
+    prior_week = x[:, -14:-7].sum(axis=1)
+    active = np.count_nonzero(x, axis=1)
+    del x
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale = np.abs(mean)
+        trend = np.where(scale > 0, slope / scale, 0.0)
+        volatility = np.where(scale > 0, np.sqrt(variance) / scale, 0.0)
+
+    # SKU mix on positive costs only, credits would make shares meaningless. (series, SKU) pairs are
+    # grouped on one int64 code, SKUs are too many for a dense array
+    sku_codes, sku_names = pd.factorize(rows['SkuId'])
+    sku = pd.Series(np.maximum(cost, 0.0)).groupby(codes.astype(np.int64) * len(sku_names) + sku_codes).sum()
+    sku_series, sku_cost = sku.index.to_numpy() // len(sku_names), sku.to_numpy()
+    sku_total = np.bincount(sku_series, sku_cost, n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        share = np.where(sku_total[sku_series] > 0, sku_cost / sku_total[sku_series], 0.0)
+
+    features = groups.size().index.to_frame(index=False)
+    features[VALUE] = total
+    features['log_daily_mean'] = np.sign(mean) * np.log1p(np.abs(mean))
+    features['trend'] = trend
+    features['week_over_week'] = np.log1p(np.maximum(last_week, 0.0)) - np.log1p(np.maximum(prior_week, 0.0))
+    features['volatility'] = volatility
+    features['active_share'] = active / days
+    features['sku_count'] = np.bincount(sku_series, sku_cost > 0, n)
+    features['sku_concentration'] = np.bincount(sku_series, share ** 2, n)
+    count('series_featurized', n)
+    return features
+
+
+class ForestModel:
+    def __init__(self, forest, features=FEATURES, fitted_on=None, series=0, version=sklearn.__version__):
+        self.forest = forest
+        self.features = list(features)
+        self.fitted_on = fitted_on
+        self.series = series
+        self.version = version
+
+    @classmethod
+    def fit(cls, features, contamination=DEFAULT_CONTAMINATION, n_estimators=100, random_state=42, n_jobs=None):
+        # n_jobs parallelises building the trees, scoring is sharded separately by score_features
+        with span('fit', series=len(features)):
+            forest = IsolationForest(n_estimators=n_estimators, contamination=contamination,
+                                     random_state=random_state, n_jobs=n_jobs)
+            forest.fit(features[FEATURES].to_numpy(dtype=float))
+        return cls(forest, FEATURES, date.today(), len(features))
+
+    @classmethod
+    def load(cls, path):
+        saved = joblib.load(path)
+        return cls(saved['forest'], saved['features'], date.fromisoformat(saved['fitted_on']), saved['series'],
+                   saved['sklearn'])
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        saved = {'forest': self.forest, 'features': self.features, 'fitted_on': self.fitted_on.isoformat(),
+                 'series': self.series, 'sklearn': self.version}
+        joblib.dump(saved, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+
+    def stale(self, max_age=DEFAULT_MAX_AGE, today=None):
+        # Features added or renamed since the fit, or another scikit-learn, make the model unusable;
+        # age only makes it old
+        today = today or date.today()
+        return self.features != FEATURES or self.version != sklearn.__version__ or \
+            today - self.fitted_on > timedelta(days=max_age)
+
+    def score(self, matrix):
+        # Positive anomaly_score is outside what the forest considers normal (decision_function < 0)
+        return -self.forest.decision_function(matrix)
+
+
+def load_or_fit(path, features, max_age=DEFAULT_MAX_AGE, retrain=False, **fit_args):
+    # The persisted model is reused while it is fresh; otherwise the forest is refit on these features
+    if not retrain and os.path.exists(path):
+        model = ForestModel.load(path)
+        if not model.stale(max_age):
+            print(f"Using the model fitted on {model.fitted_on} over {model.series} series")
+            return model
+    model = ForestModel.fit(features, **fit_args)
+    model.save(path)
+    print(f"Fitted a new model over {model.series} series, saved to {path}")
+    return model
+
+
+_worker_model = None
+
+
+def _load_worker_model(path):
+    global _worker_model
+    _worker_model = ForestModel.load(path)
+
+
+def _score_shard(matrix):
+    return _worker_model.score(matrix)
+
+
+def score_features(model, path, features, n_jobs=None):
+    # model is the ForestModel saved at path. n_jobs=1 scores in this process; otherwise the series are
+    # split into shards and scored by n_jobs worker processes (os.cpu_count() when None), each of which
+    # loads the model from path instead of receiving it with every shard.
+    # Returns features with anomaly_score and is_anomaly added.
+    n_jobs = (os.cpu_count() or 1) if n_jobs is None else n_jobs
+    if features.empty:
+        return features.assign(anomaly_score=pd.Series(dtype=float), is_anomaly=pd.Series(dtype=bool))
+    matrix = features[model.features].to_numpy(dtype=float)
+    shards = np.array_split(matrix, max(1, min(len(matrix), n_jobs * SHARDS_PER_JOB)))
+    with span('score', series=len(matrix), shards=len(shards), jobs=n_jobs):
+        if n_jobs <= 1 or len(shards) == 1:
+            scores = [model.score(shard) for shard in shards]
+        else:
+            with ProcessPoolExecutor(n_jobs, initializer=_load_worker_model, initargs=(path,)) as pool:
+                scores = list(pool.map(_score_shard, shards))
+    scored = features.copy()
+    scored['anomaly_score'] = np.concatenate(scores)
+    scored['is_anomaly'] = scored['anomaly_score'] > 0
+    count('series_scored', len(scored))
+    count('anomalies_flagged', int(scored['is_anomaly'].sum()))
+    return scored
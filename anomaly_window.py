@@ -0,0 +1,190 @@
+import json
+import os
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from focus_cube import DAY_KEY
+
+# Incremental sliding-window z-scores for main.py --incremental.
+# The state keeps, per series, the daily costs inside the window and their window total, plus the
+# sufficient statistics of those totals across series (count, sum, sum of squares). A run reads from the
+# cost cube only the days that changed or entered the window, adds and subtracts their difference,
+# drops the days that left the window and derives every z-score from the maintained statistics, so
+# nothing is re-aggregated over the whole window. Days are whole UTC days, the window is the `days` days
+# [end - days + 1, end] inclusive (see first_day), the same days a full run of main.py sums.
+#
+# State directory:
+#   daily.parquet    keys + BillingDay + EffectiveCost, days inside the window only
+#   totals.parquet   keys + EffectiveCost (window total) + days (days with cost rows) + z_score + is_anomaly
+#   window.json      keys, window bounds and the sufficient statistics
+
+DEFAULT_DAYS = 120
+THRESHOLD = 3.0
+VALUE = 'EffectiveCost'
+# Per-day totals that differ by more than this from the cube are re-read, e.g. after another script
+# updated the cube for days this state did not see change
+DRIFT_TOLERANCE = 1e-6
+
+
+def first_day(end, days=DEFAULT_DAYS):
+    # First day of the window of `days` whole days ending with end
+    return end - timedelta(days=days - 1)
+
+
+def _empty_index(names):
+    return pd.MultiIndex.from_arrays([[] for _ in names], names=names)
+
+
+@dataclass
+class WindowUpdate:
+    # affected: series whose total, presence or flag changed in this update, with their new score.
+    # anomalies: every flagged series. changed: whether the flagged rows differ from the last run.
+    affected: pd.DataFrame
+    anomalies: pd.DataFrame
+    changed: bool
+    days_read: int
+
+
+class AnomalyWindow:
+    def __init__(self, keys=('ServiceName', 'Region'), days=DEFAULT_DAYS, threshold=THRESHOLD):
+        self.keys = list(keys)
+        self.days = days
+        self.threshold = threshold
+        self.start = None
+        self.end = None
+        self.count = 0
+        self.total = 0.0
+        self.total_squares = 0.0
+        self.daily = pd.Series(dtype=float, index=_empty_index([DAY_KEY] + self.keys), name=VALUE)
+        self.totals = pd.DataFrame({VALUE: pd.Series(dtype=float), 'days': pd.Series(dtype=np.int64),
+                                    'z_score': pd.Series(dtype=float), 'is_anomaly': pd.Series(dtype=bool)},
+                                   index=_empty_index(self.keys))
+
+    @classmethod
+    def open(cls, path, keys=('ServiceName', 'Region'), days=DEFAULT_DAYS, threshold=THRESHOLD):
+        window = cls(keys, days, threshold)
+        meta_path = os.path.join(path, 'window.json')
+        if not os.path.exists(meta_path):
+            return window
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta['keys'] != window.keys or meta['days'] != days:
+            # A different series definition or window length starts over
+            return window
+        window.start = date.fromisoformat(meta['start'])
+        window.end = date.fromisoformat(meta['end'])
+        window.count, window.total, window.total_squares = meta['count'], meta['total'], meta['total_squares']
+
+        daily = pd.read_parquet(os.path.join(path, 'daily.parquet'))
+        daily[DAY_KEY] = pd.to_datetime(daily[DAY_KEY]).dt.date
+        window.daily = daily.set_index([DAY_KEY] + window.keys)[VALUE]
+        window.totals = pd.read_parquet(os.path.join(path, 'totals.parquet')).set_index(window.keys)
+        return window
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        # window.json goes first and comes back last: a save interrupted halfway leaves no window.json and
+        # the next run rebuilds, instead of applying its deltas to tables of a different run
+        meta_path = os.path.join(path, 'window.json')
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        for name, frame in (('daily.parquet', self.daily.reset_index()), ('totals.parquet', self.totals.reset_index())):
+            frame.to_parquet(os.path.join(path, f"{name}.tmp"), index=False)
+            os.replace(os.path.join(path, f"{name}.tmp"), os.path.join(path, name))
+        meta = {'keys': self.keys, 'days': self.days, 'start': self.start.isoformat(), 'end': self.end.isoformat(),
+                'count': self.count, 'total': self.total, 'total_squares': self.total_squares}
+        with open(f"{meta_path}.tmp", 'w') as f:
+            json.dump(meta, f)
+        os.replace(f"{meta_path}.tmp", meta_path)
+
+    def _cube_rows(self, cube, mask):
+        # Rows with an empty key are left out, as the group-by of a full run leaves out missing keys
+        selected = cube.frame[mask]
+        for key in self.keys:
+            selected = selected[selected[key].astype(str) != '']
+        return selected
+
+    def _cube_days(self, cube, days):
+        # Per-series costs of the given days from the cube
+        selected = self._cube_rows(cube, cube.frame[DAY_KEY].isin(pd.to_datetime(sorted(days))))
+        rows = selected.groupby([DAY_KEY] + self.keys, observed=True)[VALUE].sum()
+        rows.index = rows.index.set_levels(rows.index.levels[0].date, level=0)
+        return rows
+
+    def _drifted(self, cube, start, end):
+        # Days whose total in the cube no longer matches the state
+        day = cube.frame[DAY_KEY]
+        in_window = self._cube_rows(cube, (day >= pd.Timestamp(start)) & (day <= pd.Timestamp(end)))
+        cube_days = in_window.groupby(DAY_KEY)[VALUE].sum()
+        cube_days.index = cube_days.index.date
+        state_days = self.daily.groupby(level=DAY_KEY).sum()
+        difference = cube_days.sub(state_days, fill_value=0).abs()
+        return set(difference[difference > DRIFT_TOLERANCE].index)
+
+    def update(self, cube, changed_days=None, end=None):
+        # cube: the cost cube after this run's update_cube; changed_days: the days update_cube re-aggregated
+        # (RefreshResult.days). end: last day of the window, today by default.
+        end = end or pd.Timestamp.now(tz='UTC').date()
+        start = first_day(end, self.days)
+        window_days = {start + timedelta(days=i) for i in range((end - start).days + 1)}
+
+        if self.start is None:
+            old_days = set()
+            read = window_days
+        else:
+            old_days = {self.start + timedelta(days=i) for i in range((self.end - self.start).days + 1)}
+            changed = set(changed_days or ()) | self._drifted(cube, max(start, self.start), min(end, self.end))
+            # Days that changed inside the new window and days that entered it are read from the cube
+            read = (changed & window_days) | (window_days - old_days)
+        touched = read | (old_days - window_days)
+
+        # Old and new per-series values of only the touched days
+        day_level = self.daily.index.get_level_values(DAY_KEY)
+        before = self.daily[day_level.isin(touched)]
+        fresh = self._cube_days(cube, read)
+        kept = self.daily[~day_level.isin(touched)]
+        self.daily = pd.concat([kept, fresh]) if len(kept) else fresh
+        self.daily.name = VALUE
+
+        old = before.groupby(level=self.keys).agg(['sum', 'count'])
+        new = fresh.groupby(level=self.keys).agg(['sum', 'count'])
+        delta = new.sub(old, fill_value=0)
+        delta = delta[(delta['sum'] != 0) | (delta['count'] != 0)]
+
+        # Sufficient statistics: each affected series swaps its old total for its new one
+        previous = self.totals.reindex(delta.index)
+        old_cost, old_present = previous[VALUE].fillna(0.0), previous['days'].fillna(0) > 0
+        new_cost = old_cost + delta['sum']
+        new_days = previous['days'].fillna(0) + delta['count']
+        present = new_days > 0
+        self.count += int(present.sum()) - int(old_present.sum())
+        self.total += float(new_cost[present].sum() - old_cost[old_present].sum())
+        self.total_squares += float((new_cost[present] ** 2).sum() - (old_cost[old_present] ** 2).sum())
+
+        updated = pd.DataFrame({VALUE: new_cost[present], 'days': new_days[present].astype(np.int64)})
+        totals = self.totals.drop(index=delta.index, errors='ignore')[[VALUE, 'days']]
+        totals = pd.concat([totals, updated]) if len(totals) else updated
+        flagged_before = self.totals['is_anomaly']
+
+        # Every z-score moves with the mean and deviation, recomputing them is one pass over the series
+        mean = self.total / self.count if self.count else 0.0
+        std = np.sqrt(max(self.total_squares / self.count - mean ** 2, 0.0)) if self.count else 0.0
+        totals['z_score'] = (totals[VALUE] - mean) / std if std else 0.0
+        totals['is_anomaly'] = totals['z_score'].abs() > self.threshold
+        self.totals = totals.sort_index()
+        self.start, self.end = start, end
+
+        flipped = self.totals['is_anomaly'].ne(flagged_before.reindex(self.totals.index, fill_value=False))
+        affected = self.totals.index[flipped].union(delta.index)
+        anomalies = self.totals[self.totals['is_anomaly']]
+        changed = bool(flipped.any()) or bool(anomalies.index.intersection(delta.index).size) or \
+            bool(flagged_before.index[flagged_before].difference(self.totals.index).size)
+        return WindowUpdate(
+            affected=self.totals.reindex(affected).reset_index(),
+            anomalies=anomalies[[VALUE, 'z_score']].reset_index(),
+            changed=changed,
+            days_read=len(read),
+        )
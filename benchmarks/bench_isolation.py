@@ -0,0 +1,142 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from anomaly_forest import ForestModel, build_features, score_features
+
+from bench_memory import peak_rss_mb
+
+# Feature building, fitting and sharded scoring of anomaly_forest.py at a large number of series.
+# Synthetic daily cost rows (keys + SkuId + BillingDay + EffectiveCost, as daily_rows returns them) are
+# generated once, with a known set of series given a ramp, a spike in the last week or a SKU mix
+# shift. Generation and each stage run in their own process so a stage's peak RSS is its own (a child
+# starts with the peak RSS of the process it was forked from):
+#   features  build_features over the daily rows
+#   fit       IsolationForest fit and save
+#   score     load the saved model and score every series, once per --jobs value
+
+KEYS = ['ServiceName', 'Region']
+STAGES = ['generate', 'features', 'fit', 'score']
+
+
+def generate_rows(series, days, end, seed=0, presence=0.5, injected=0.01):
+    rng = np.random.default_rng(seed)
+    skus = rng.integers(1, 4, series)
+    level = rng.lognormal(1.0, 1.5, series)
+    # One row per series, SKU and day, of which `presence` have cost
+    sid = np.repeat(np.arange(series), skus)
+    sku = np.concatenate([np.arange(k) for k in skus])
+    day = np.tile(np.arange(days), len(sid))
+    sid, sku = np.repeat(sid, days), np.repeat(sku, days)
+    keep = rng.random(len(sid)) < presence
+    sid, sku, day = sid[keep], sku[keep], day[keep]
+    cost = level[sid] / skus[sid] * rng.gamma(4.0, 0.25, len(sid)) * (1.0 + 0.5 * (sku == 0))
+
+    # Injected anomalies: a steady ramp, a spike in the last week, or a new dominant SKU
+    flagged = rng.choice(series, int(series * injected), replace=False)
+    kind = np.full(series, -1)
+    kind[flagged] = rng.integers(0, 3, len(flagged))
+    cost = np.where(kind[sid] == 0, cost * (1 + 4 * day / days), cost)
+    cost = np.where((kind[sid] == 1) & (day >= days - 7), cost * 8, cost)
+    cost = np.where((kind[sid] == 2) & (sku == skus[sid] - 1) & (day >= days // 2), cost * 20, cost)
+
+    start = end - timedelta(days=days)
+    rows = pd.DataFrame({
+        'ServiceName': pd.Categorical.from_codes(sid // 50, [f"SERVICE_{i}" for i in range((series - 1) // 50 + 1)]),
+        'Region': pd.Categorical.from_codes(sid % 50, [f"region-{i}" for i in range(50)]),
+        'SkuId': pd.Categorical.from_codes(sku, ['B00000', 'B00001', 'B00002']),
+        'BillingDay': pd.Timestamp(start) + pd.to_timedelta(day, unit='D'),
+        'EffectiveCost': cost,
+    })
+    truth = pd.DataFrame({'ServiceName': [f"SERVICE_{i // 50}" for i in flagged],
+                          'Region': [f"region-{i % 50}" for i in flagged]})
+    return rows, truth
+
+
+def run_stage(stage, args):
+    work = args.work
+    end = date.fromisoformat(args.end)
+    start = end - timedelta(days=args.days)
+    if stage == 'generate':
+        rows, truth = generate_rows(args.series, args.days, end)
+        rows.to_parquet(os.path.join(work, 'rows.parquet'), index=False)
+        truth.to_parquet(os.path.join(work, 'truth.parquet'), index=False)
+        return {'seconds': 0.0, 'input_rows': len(rows), 'input_rss_mb': 0.0}
+    if stage == 'features':
+        rows = pd.read_parquet(os.path.join(work, 'rows.parquet'))
+        loaded = peak_rss_mb()
+        started = time.perf_counter()
+        features = build_features(rows, KEYS, start, end)
+        seconds = time.perf_counter() - started
+        features.to_parquet(os.path.join(work, 'features.parquet'), index=False)
+        return {'seconds': seconds, 'input_rows': len(rows), 'series': len(features), 'input_rss_mb': loaded}
+
+    features = pd.read_parquet(os.path.join(work, 'features.parquet'))
+    loaded = peak_rss_mb()
+    model_path = os.path.join(work, 'model.joblib')
+    if stage == 'fit':
+        started = time.perf_counter()
+        ForestModel.fit(features).save(model_path)
+        return {'seconds': time.perf_counter() - started, 'series': len(features), 'input_rss_mb': loaded,
+                'model_mb': os.path.getsize(model_path) / (1024 * 1024)}
+
+    started = time.perf_counter()
+    scored = score_features(ForestModel.load(model_path), model_path, features, n_jobs=args.jobs)
+    seconds = time.perf_counter() - started
+    truth = pd.read_parquet(os.path.join(work, 'truth.parquet'))
+    found = truth.merge(scored[scored['is_anomaly']][KEYS].astype(str), on=KEYS)
+    return {'seconds': seconds, 'series': len(scored), 'jobs': args.jobs, 'input_rss_mb': loaded,
+            'series_per_sec': len(scored) / seconds, 'flagged': int(scored['is_anomaly'].sum()),
+            'injected_found': f"{len(found)}/{len(truth)}"}
+
+
+def run_child(stage, args, jobs=None):
+    command = [sys.executable, os.path.abspath(__file__), '--run', stage, '--work', args.work,
+               '--series', str(args.series), '--days', str(args.days), '--end', args.end]
+    if jobs is not None:
+        command += ['--jobs', str(jobs)]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark IsolationForest features, fit and sharded scoring')
+    parser.add_argument('--work', help='working directory for the synthetic rows and the model, a temp dir if omitted')
+    parser.add_argument('--series', type=int, default=100_000)
+    parser.add_argument('--days', type=int, default=120)
+    parser.add_argument('--end', default=date.today().isoformat(), help='day after the last day of the window')
+    parser.add_argument('--jobs', type=int, nargs='+', default=None,
+                        help='scoring processes to compare, 1 and all cores by default')
+    parser.add_argument('--run', choices=STAGES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        args.jobs = args.jobs[0] if args.jobs else 1
+        result = run_stage(args.run, args)
+        result['peak_rss_mb'] = peak_rss_mb()
+        print(json.dumps(result))
+        sys.exit(0)
+
+    args.work = args.work or tempfile.mkdtemp(prefix='focus-bench-isolation-')
+    os.makedirs(args.work, exist_ok=True)
+    if not os.path.exists(os.path.join(args.work, 'rows.parquet')):
+        generated = run_child('generate', args)
+        print(f"Generated {generated['input_rows']} daily rows for {args.series} series in {args.work}")
+
+    runs = [('features', None), ('fit', None)] + [('score', j) for j in (args.jobs or sorted({1, os.cpu_count() or 1}))]
+    for stage, jobs in runs:
+        result = run_child(stage, args, jobs)
+        label = stage if jobs is None else f"score x{jobs}"
+        extra = ', '.join(f"{k}={v:.1f}" if isinstance(v, float) else f"{k}={v}" for k, v in result.items()
+                          if k not in ('seconds', 'peak_rss_mb', 'input_rss_mb'))
+        print(f"{label:10} {result['seconds']:8.2f}s  peak RSS {result['peak_rss_mb']:8.1f} MB "
+              f"(inputs {result['input_rss_mb']:.1f} MB)  {extra}")
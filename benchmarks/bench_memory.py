@@ -0,0 +1,93 @@
+import argparse
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from focus_schema import concat_frames, memory_bytes
+from focus_stream import read_report_chunks
+
+from synthetic_focus import generate_reports
+
+# Resident size of a multi-day FOCUS history held as one DataFrame:
+#   legacy:  pd.read_csv(low_memory=False) per report and pd.concat, as the analysis scripts used to do
+#   compact: read_report_chunks with the focus_schema types and concat_frames
+# Each mode runs in its own process so peak RSS is measured independently.
+
+
+def report_names(report_dir):
+    return sorted(os.path.join(dirpath, f) for dirpath, _, files in os.walk(report_dir) for f in files
+                  if f.endswith('.gz'))
+
+
+def load_legacy(paths):
+    return pd.concat([pd.read_csv(p, low_memory=False) for p in paths], ignore_index=True)
+
+
+def load_compact(paths):
+    frames = []
+    for p in paths:
+        with gzip.open(p) as gz:
+            frames.extend(read_report_chunks(gz))
+    return concat_frames(frames)
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def measure(mode, report_dir):
+    started = time.perf_counter()
+    frame = (load_legacy if mode == 'legacy' else load_compact)(report_names(report_dir))
+    return {
+        'mode': mode,
+        'rows': len(frame),
+        'frame_mb': memory_bytes(frame) / (1024 * 1024),
+        'peak_rss_mb': peak_rss_mb(),
+        'seconds': time.perf_counter() - started,
+        'object_columns': int((frame.dtypes == object).sum()),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the memory footprint of parsed FOCUS reports')
+    parser.add_argument('--dir', help='directory of synthetic reports, generated into a temp dir if omitted')
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--parts', type=int, default=2)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--measure', choices=['legacy', 'compact'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.dir)))
+        sys.exit(0)
+
+    report_dir = args.dir or tempfile.mkdtemp(prefix='focus-bench-')
+    if not os.path.isdir(os.path.join(report_dir, 'FOCUS Reports')):
+        generate_reports(report_dir, args.days, args.parts, args.rows)
+
+    results = {}
+    for mode in ('legacy', 'compact'):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--dir', report_dir, '--measure', mode],
+                                check=True, capture_output=True, text=True).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+        r = results[mode]
+        print(f"{mode:8} {r['rows']:>10,} rows  frame {r['frame_mb']:8.1f} MB  peak RSS {r['peak_rss_mb']:8.1f} MB"
+              f"  {r['seconds']:6.2f}s  {r['object_columns']} object column(s)")
+
+    legacy, compact = results['legacy'], results['compact']
+    print(f"frame {legacy['frame_mb'] / compact['frame_mb']:.1f}x smaller, "
+          f"peak RSS {legacy['peak_rss_mb'] / compact['peak_rss_mb']:.1f}x smaller")
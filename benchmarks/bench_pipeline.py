@@ -0,0 +1,78 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from focus_pipeline import aggregate_payload, combine_aggregates, run_pipeline
+
+from synthetic_focus import generate_reports
+
+# Serial download-then-parse loop vs the prefetch + process-pool pipeline over a local directory
+# of synthetic reports. --latency adds a per-object delay to stand in for the Object Storage round trip.
+
+KEYS = ['ServiceName', 'Region']
+COLUMNS = ['BillingPeriodStart', 'EffectiveCost', 'Region', 'ServiceName']
+
+
+def fetch(report_dir, latency, name):
+    time.sleep(latency)
+    with open(os.path.join(report_dir, *name.split('/')), 'rb') as f:
+        return f.read()
+
+
+def run_serial(names, fetcher, process):
+    frames = []
+    for name in names:
+        frames.append(process(name, fetcher(name)))
+    return combine_aggregates(frames, KEYS)
+
+
+def run_parallel(names, fetcher, process, prefetch, processes):
+    frames = []
+    for name, frame, error in run_pipeline(names, fetcher, process, prefetch=prefetch, processes=processes):
+        if error is not None:
+            raise error
+        frames.append(frame)
+    return combine_aggregates(frames, KEYS)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the report download/parse pipeline')
+    parser.add_argument('--dir', help='directory of synthetic reports, generated into a temp dir if omitted')
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--parts', type=int, default=2)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--latency', type=float, default=0.05, help='simulated seconds per object fetch')
+    parser.add_argument('--prefetch', type=int, default=8)
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args()
+
+    report_dir = args.dir or tempfile.mkdtemp(prefix='focus-bench-')
+    if not os.path.isdir(os.path.join(report_dir, 'FOCUS Reports')):
+        generate_reports(report_dir, args.days, args.parts, args.rows)
+    names = sorted(
+        os.path.relpath(os.path.join(dirpath, f), report_dir).replace(os.sep, '/')
+        for dirpath, _, files in os.walk(report_dir) for f in files if f.endswith('.gz')
+    )
+    total_mb = sum(os.path.getsize(os.path.join(report_dir, *n.split('/'))) for n in names) / (1024 * 1024)
+    print(f"{len(names)} report parts, {total_mb:.1f} MB compressed, {args.latency * 1000:.0f} ms simulated latency")
+
+    fetcher = partial(fetch, report_dir, args.latency)
+    process = partial(aggregate_payload, keys=KEYS, columns=COLUMNS)
+
+    started = time.perf_counter()
+    serial = run_serial(names, fetcher, process)
+    serial_seconds = time.perf_counter() - started
+    print(f"serial:   {serial_seconds:7.2f}s  {len(names) / serial_seconds:7.1f} objects/s  {total_mb / serial_seconds:7.1f} MB/s")
+
+    started = time.perf_counter()
+    parallel = run_parallel(names, fetcher, process, args.prefetch, args.processes)
+    parallel_seconds = time.perf_counter() - started
+    print(f"pipeline: {parallel_seconds:7.2f}s  {len(names) / parallel_seconds:7.1f} objects/s  {total_mb / parallel_seconds:7.1f} MB/s"
+          f"  ({serial_seconds / parallel_seconds:.1f}x)")
+
+    difference = (serial.set_index(KEYS)['EffectiveCost'] - parallel.set_index(KEYS)['EffectiveCost']).abs().max()
+    print(f"max difference between results: {difference:.3e}")
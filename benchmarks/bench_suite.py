@@ -0,0 +1,235 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'copy-cost-reports'))
+from local_object_storage import LocalObjectStorageClient
+
+from bench_memory import peak_rss_mb
+from synthetic_focus import REGIONS, SERVICES, generate_reports, scaled
+
+# Repeatable end-to-end benchmarks over synthetic reports served by LocalObjectStorageClient with
+# simulated latency and bandwidth:
+#   copy       CopyEngine stream copy of every report into another bucket
+#   ingest     refresh_cache of every report into an empty cache
+#   aggregate  the analysis aggregations over the cache: window totals, monthly history, cost cube build
+#   anomaly    AnomalyEngine over the daily series of the whole history
+#   excel      Excel export of the daily cost per series with the monthly history and its formatting
+# Each benchmark runs in its own process so its peak RSS is its own. Results can be saved as a baseline
+# and later runs compared against it; a slowdown beyond --tolerance exits with status 1.
+
+NAMESPACE = 'bench'
+BUCKET = 'reports'
+BENCHMARKS = ['copy', 'ingest', 'aggregate', 'anomaly', 'excel']
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def _client(args):
+    return LocalObjectStorageClient(os.path.join(args.work, 'store'), latency=args.latency,
+                                    bandwidth=args.bandwidth * 1024 * 1024 if args.bandwidth else None)
+
+
+def _tree_bytes(path):
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+
+def _report_objects(client):
+    from sync_manifest import list_objects_since
+    return list_objects_since(client, NAMESPACE, BUCKET)
+
+
+def bench_copy(args):
+    from copy_engine import CopyEngine
+
+    client = _client(args)
+    shutil.rmtree(os.path.join(args.work, 'store', NAMESPACE, 'copy'), ignore_errors=True)
+    objects = _report_objects(client)
+    started = time.perf_counter()
+    summary = CopyEngine(client, workers=args.workers, mode='stream').copy(NAMESPACE, BUCKET, NAMESPACE, 'copy', objects)
+    if summary.failed:
+        raise RuntimeError(f"{len(summary.failed)} copies failed")
+    return {'seconds': time.perf_counter() - started, 'mb': summary.bytes / (1024 * 1024), 'objects': len(objects)}
+
+
+def bench_ingest(args):
+    from focus_cache import refresh_cache
+
+    cache_dir = os.path.join(args.work, 'ingest-cache')
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    client = _client(args)
+    mb = sum(o.size for o in _report_objects(client)) / (1024 * 1024)
+    started = time.perf_counter()
+    result = refresh_cache(client, NAMESPACE, BUCKET, cache_dir, processes=args.processes)
+    if result.failed:
+        raise RuntimeError(f"{len(result.failed)} reports failed")
+    return {'seconds': time.perf_counter() - started, 'mb': mb, 'objects': len(result.ingested)}
+
+
+def _cache_dir(args):
+    return os.path.join(args.work, 'cache')
+
+
+def bench_aggregate(args):
+    import pandas as pd
+    from focus_cache import iter_cache
+    from focus_cube import update_cube
+    from focus_history import monthly_history
+    from focus_stream import aggregate_chunks
+
+    cache_dir = _cache_dir(args)
+    columns = ['BillingPeriodStart', 'EffectiveCost', 'Region', 'ServiceName']
+    window_start = pd.Timestamp.now(tz='UTC') - pd.Timedelta(days=120)
+    started = time.perf_counter()
+    totals = aggregate_chunks(iter_cache(cache_dir, columns=columns, start=window_start.date()),
+                              keys=['ServiceName', 'Region'], start=window_start)
+    monthly = aggregate_chunks(iter_cache(cache_dir, columns=columns), keys=['ServiceName', 'Region', 'BillingMonth'])
+    history = monthly_history(monthly)
+    cube = update_cube(cache_dir, os.path.join(args.work, 'cube.parquet'))
+    cube.query(filters={'ServiceName': SERVICES[0]}, start=window_start.date())
+    return {'seconds': time.perf_counter() - started, 'mb': _tree_bytes(cache_dir) / (1024 * 1024),
+            'series': len(totals), 'history_rows': len(history), 'cube_rows': len(cube.frame)}
+
+
+def _totals(args, keys):
+    from focus_cache import iter_cache
+    from focus_stream import DERIVED_KEYS, aggregate_chunks
+
+    columns = ['BillingPeriodStart', 'EffectiveCost'] + [k for k in keys if k not in DERIVED_KEYS]
+    return aggregate_chunks(iter_cache(_cache_dir(args), columns=columns), keys=keys)
+
+
+def bench_anomaly(args):
+    from anomaly_engine import AnomalyEngine
+
+    keys = ['ServiceName', 'Region', 'SkuId']
+    daily = _totals(args, keys + ['BillingDay'])
+    started = time.perf_counter()
+    engine = AnomalyEngine(keys=keys)
+    scores = engine.update(daily)
+    return {'seconds': time.perf_counter() - started, 'mb': None, 'series': len(engine.state),
+            'scored_rows': len(scores), 'flagged': int(scores['is_anomaly'].sum())}
+
+
+def bench_excel(args):
+    from focus_export import export_report
+    from focus_history import add_monthly_history
+
+    keys = ['ServiceName', 'Region']
+    daily = _totals(args, keys + ['SkuId', 'BillingDay'])
+    monthly = _totals(args, keys + ['BillingMonth'])
+    report = add_monthly_history(daily, monthly, keys)
+    output = os.path.join(args.work, 'export.xlsx')
+
+    # The export path of main.py: one streamed pass with conditional formatting rules
+    started = time.perf_counter()
+    export_report(report, output, sheet_name='Anomalies')
+    return {'seconds': time.perf_counter() - started, 'mb': os.path.getsize(output) / (1024 * 1024),
+            'rows': len(report), 'columns': len(report.columns)}
+
+
+def prepare(args):
+    # Untimed: the synthetic reports and the cache the analysis benchmarks read
+    from focus_cache import refresh_cache
+
+    report_dir = os.path.join(args.work, 'store', NAMESPACE, BUCKET)
+    if not os.path.isdir(report_dir):
+        services = scaled(SERVICES, args.services, 'SERVICE_{}')
+        regions = scaled(REGIONS, args.regions, 'region-{}')
+        names = generate_reports(report_dir, args.days, args.parts, args.rows, services=services, regions=regions)
+        print(f"Generated {len(names)} report parts ({_tree_bytes(report_dir) / (1024 * 1024):.1f} MB) in {report_dir}")
+    refresh_cache(LocalObjectStorageClient(os.path.join(args.work, 'store')), NAMESPACE, BUCKET, _cache_dir(args),
+                  processes=args.processes)
+
+
+def run_one(name, args):
+    # Runs a benchmark in a child process and returns its metrics
+    command = [sys.executable, os.path.abspath(__file__), '--run', name] + [
+        a for key, value in vars(args).items() if key in SCALE + NETWORK + ('work', 'processes', 'workers') and value is not None
+        for a in (f"--{key.replace('_', '-')}", str(value))]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    if result.get('mb') is not None:
+        result['mb_per_sec'] = result['mb'] / result['seconds'] if result['seconds'] else 0.0
+    return result
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            continue
+        for metric in ('seconds', 'peak_rss_mb'):
+            ratio = result[metric] / base[metric] if base.get(metric) else 1.0
+            marker = ''
+            if ratio > 1 + tolerance:
+                marker = '  REGRESSION'
+                regressions.append(f"{name}.{metric}")
+            print(f"  {name:10} {metric:12} {base[metric]:10.2f} -> {result[metric]:10.2f}  ({ratio:5.2f}x){marker}")
+    return regressions
+
+
+SCALE = ('days', 'parts', 'rows', 'services', 'regions')
+NETWORK = ('latency', 'bandwidth')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the benchmark suite over synthetic reports')
+    parser.add_argument('--work', help='working directory for reports, caches and outputs, a temp dir if omitted')
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--parts', type=int, default=2, help='report parts per day')
+    parser.add_argument('--rows', type=int, default=20000, help='rows per report part')
+    parser.add_argument('--services', type=int, default=len(SERVICES))
+    parser.add_argument('--regions', type=int, default=len(REGIONS))
+    parser.add_argument('--latency', type=float, default=0.02, help='simulated seconds per Object Storage call')
+    parser.add_argument('--bandwidth', type=float, default=50.0, help='simulated MB/s per transfer, 0 for unthrottled')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--only', help=f"comma separated subset of {','.join(BENCHMARKS)}")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown against the baseline')
+    parser.add_argument('--run', choices=BENCHMARKS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        result = globals()[f"bench_{args.run}"](args)
+        result['peak_rss_mb'] = peak_rss_mb()
+        print(json.dumps(result))
+        sys.exit(0)
+
+    args.work = args.work or tempfile.mkdtemp(prefix='focus-bench-suite-')
+    prepare(args)
+
+    results = {}
+    for name in (args.only.split(',') if args.only else BENCHMARKS):
+        result = results[name] = run_one(name, args)
+        rate = f"{result['mb_per_sec']:8.1f} MB/s" if result.get('mb') is not None else ' ' * 13
+        extra = ', '.join(f"{k}={v}" for k, v in result.items()
+                          if k not in ('seconds', 'mb', 'mb_per_sec', 'peak_rss_mb'))
+        print(f"{name:10} {result['seconds']:8.2f}s  {rate}  peak RSS {result['peak_rss_mb']:8.1f} MB  {extra}")
+
+    run = {
+        'scale': {k: getattr(args, k) for k in SCALE + NETWORK + ('workers', 'processes')},
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'results': results,
+    }
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('scale') != run['scale']:
+            print(f"Baseline was recorded at another scale: {baseline.get('scale')}")
+        print(f"Compared with {args.baseline}:")
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
@@ -0,0 +1,91 @@
+import argparse
+import gzip
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+# Generator of synthetic FOCUS cost reports laid out like the OCI report bucket:
+#   <out_dir>/FOCUS Reports/YYYY/MM/DD/<part>.csv.gz
+# Point out_dir at <root>/<namespace>/<bucket> to serve the files through LocalObjectStorageClient.
+
+SERVICES = ['COMPUTE', 'BLOCK_STORAGE', 'OBJECT_STORAGE', 'NETWORK', 'DATABASE', 'BIG_DATA',
+            'LOAD_BALANCER', 'LOGGING', 'MONITORING', 'FUNCTIONS']
+REGIONS = ['us-ashburn-1', 'us-phoenix-1', 'ca-toronto-1', 'eu-frankfurt-1', 'uk-london-1', 'ap-tokyo-1']
+
+
+def scaled(names, count, template):
+    # The real names first, made-up ones beyond them when a larger scale is asked for
+    return list(names[:count]) + [template.format(i) for i in range(len(names), count)]
+
+
+def generate_part(rng, day, rows, services=SERVICES, regions=REGIONS):
+    hours = rng.integers(0, 24, rows)
+    start = pd.to_datetime(day) + pd.to_timedelta(hours, unit='h')
+    service = rng.choice(services, rows)
+    region = rng.choice(regions, rows)
+    quantity = rng.gamma(2.0, 5.0, rows)
+    unit_price = rng.choice([0.0015, 0.025, 0.05, 0.1275], rows)
+    cost = quantity * unit_price
+    return pd.DataFrame({
+        'AvailabilityZone': rng.choice(['AD-1', 'AD-2', 'AD-3'], rows),
+        'BilledCost': cost.round(6),
+        'BillingAccountId': 'ocid1.tenancy.oc1..synthetic',
+        'BillingCurrency': 'USD',
+        'BillingPeriodEnd': (start + pd.Timedelta(hours=1)).strftime('%Y-%m-%dT%H:%MZ'),
+        'BillingPeriodStart': start.strftime('%Y-%m-%dT%H:%MZ'),
+        'ChargeCategory': 'Usage',
+        'ChargeDescription': service + ' usage',
+        'ChargePeriodEnd': (start + pd.Timedelta(hours=1)).strftime('%Y-%m-%dT%H:%MZ'),
+        'ChargePeriodStart': start.strftime('%Y-%m-%dT%H:%MZ'),
+        'EffectiveCost': cost.round(6),
+        'ListCost': (cost * 1.1).round(6),
+        'ListUnitPrice': unit_price,
+        'PricingQuantity': quantity.round(4),
+        'PricingUnit': 'HOURS',
+        'Provider': 'Oracle',
+        'Region': region,
+        'ResourceId': [f"ocid1.instance.oc1..{i:08d}" for i in rng.integers(0, 5000, rows)],
+        'ServiceName': service,
+        'SkuId': [f"B{i:05d}" for i in rng.integers(88000, 88040, rows)],
+        'SubAccountId': [f"ocid1.compartment.oc1..{i:04d}" for i in rng.integers(0, 40, rows)],
+        'UsageQuantity': quantity.round(4),
+        'UsageUnit': 'HOURS',
+    })
+
+
+def generate_reports(out_dir, days=30, parts_per_day=2, rows_per_part=5000, end=None, seed=0,
+                     services=SERVICES, regions=REGIONS):
+    # Returns the object names written, oldest day first
+    rng = np.random.default_rng(seed)
+    end = end or datetime.now(timezone.utc).date()
+    names = []
+    for offset in range(days, 0, -1):
+        day = end - timedelta(days=offset)
+        for part in range(parts_per_day):
+            name = f"FOCUS Reports/{day:%Y/%m/%d}/{part:04d}.csv.gz"
+            path = os.path.join(out_dir, *name.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            df = generate_part(rng, day, rows_per_part, services, regions)
+            with gzip.open(path, 'wt', compresslevel=6) as f:
+                df.to_csv(f, index=False)
+            names.append(name)
+    return names
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write synthetic FOCUS .csv.gz reports to a directory')
+    parser.add_argument('out_dir')
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--parts', type=int, default=2, help='report parts per day')
+    parser.add_argument('--rows', type=int, default=5000, help='rows per report part')
+    parser.add_argument('--services', type=int, default=len(SERVICES))
+    parser.add_argument('--regions', type=int, default=len(REGIONS))
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    names = generate_reports(args.out_dir, args.days, args.parts, args.rows, seed=args.seed,
+                             services=scaled(SERVICES, args.services, 'SERVICE_{}'),
+                             regions=scaled(REGIONS, args.regions, 'region-{}'))
+    print(f"Wrote {len(names)} report parts to {args.out_dir}")
@@ -0,0 +1,377 @@
+import io
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+
+from instrumentation import METRICS, count, log_event, span, timed
+
+# Parallel object copy engine used by the report copy functions.
+# The engine only relies on the object, multipart and copy_object calls of the client, so it
+# runs the same way against a real ObjectStorageClient or a local stand-in (see local_object_storage.py).
+# Requests are timed as get/put/copy spans and the source body reads as 'read' (see instrumentation.py).
+
+DEFAULT_WORKERS = 8
+DEFAULT_RETRIES = 4
+DEFAULT_BACKOFF = 1.0
+MAX_BACKOFF = 30.0
+CHUNK_SIZE = 1024 * 1024
+# Objects up to one part are sent with a single put_object, larger ones as multipart.
+# A worker holds at most inflight_parts parts (a part is read only once a slot is free) plus, while a
+# part is assembled from its chunks, one more, so peak buffer memory in stream mode is bounded by
+# workers * (inflight_parts + 1) * part_size. Object Storage requires parts of at least 10 MiB.
+PART_SIZE = 10 * 1024 * 1024
+INFLIGHT_PARTS = 1
+WORK_REQUEST_TIMEOUT = 600
+
+# spool: download to a temp file then upload it
+# stream: pipe the download straight into put_object / multipart upload, nothing touches disk
+# server: ask Object Storage to copy_object, falling back to stream when not permitted
+COPY_MODES = ('spool', 'stream', 'server')
+
+
+def create_object_storage_client(config=None, signer=None, pool_size=DEFAULT_WORKERS):
+    import oci
+
+    # Retries are handled per object by the engine, so the SDK must not retry on its own
+    client = oci.object_storage.ObjectStorageClient(
+        config or {}, signer=signer, retry_strategy=oci.retry.NoneRetryStrategy()
+    )
+
+    # One keep-alive connection per worker instead of the default pool of 10 shared by all hosts
+    import requests
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    client.base_client.session.mount('https://', adapter)
+    return client
+
+
+def workers_for_memory(memory_budget, workers=DEFAULT_WORKERS, part_size=PART_SIZE, inflight_parts=INFLIGHT_PARTS):
+    # The most stream workers whose part buffers fit in memory_budget bytes, at least one
+    per_worker = (max(1, inflight_parts) + 1) * part_size
+    return max(1, min(workers, memory_budget // per_worker))
+
+
+def _model(name, **kwargs):
+    # Request models come from the SDK when present; the local stand-in accepts plain namespaces
+    try:
+        from oci.object_storage import models
+    except ImportError:
+        return SimpleNamespace(**kwargs)
+    return getattr(models, name)(**kwargs)
+
+
+def is_retryable(ex):
+    status = getattr(ex, 'status', None)
+    if status is None:
+        # Connection resets, timeouts and other transport errors
+        return True
+    return status == 429 or status >= 500
+
+
+@dataclass
+class CopyResult:
+    source_name: str
+    destination_name: str
+    bytes: int = 0
+    seconds: float = 0.0
+    attempts: int = 0
+    method: str = None
+    error: str = None
+    # HTTP status of the last failed attempt, None for transport errors
+    status: int = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    @property
+    def mb_per_sec(self):
+        return self.bytes / (1024 * 1024) / self.seconds if self.seconds else 0.0
+
+
+@dataclass
+class CopySummary:
+    results: list = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def copied(self):
+        return [r for r in self.results if r.ok]
+
+    @property
+    def failed(self):
+        return [r for r in self.results if not r.ok]
+
+    @property
+    def bytes(self):
+        return sum(r.bytes for r in self.copied)
+
+    @property
+    def mb_per_sec(self):
+        return self.bytes / (1024 * 1024) / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {
+            "objects": len(self.results),
+            "copied": len(self.copied),
+            "failed": [r.source_name for r in self.failed],
+            "bytes": self.bytes,
+            "seconds": round(self.seconds, 3),
+            "mb_per_sec": round(self.mb_per_sec, 2),
+        }
+
+
+class CopyEngine:
+    def __init__(self, client, workers=DEFAULT_WORKERS, retries=DEFAULT_RETRIES,
+                 backoff=DEFAULT_BACKOFF, tmp_dir=None, chunk_size=CHUNK_SIZE, mode='stream',
+                 part_size=PART_SIZE, inflight_parts=INFLIGHT_PARTS, destination_region=None, memory_budget=None):
+        # memory_budget (bytes) caps the workers so stream buffers stay within it; spool mode only holds
+        # chunk_size per worker and is not capped
+        if mode not in COPY_MODES:
+            raise ValueError(f"Unknown copy mode {mode}, expected one of {COPY_MODES}")
+        self.client = client
+        self.workers = max(1, workers)
+        if memory_budget is not None and mode != 'spool':
+            self.workers = workers_for_memory(memory_budget, self.workers, part_size, inflight_parts)
+        self.retries = retries
+        self.backoff = backoff
+        self.tmp_dir = tmp_dir or tempfile.gettempdir()
+        self.chunk_size = chunk_size
+        self.mode = mode
+        self.part_size = part_size
+        self.inflight_parts = max(1, inflight_parts)
+        self.destination_region = destination_region
+        self._server_copy_allowed = mode == 'server'
+        self._part_pool = None
+
+    def copy(self, source_namespace, source_bucket, dest_namespace, dest_bucket,
+             objects, destination_name=None):
+        # objects are object names or listing summaries (with .name and optionally .size)
+        destination_name = destination_name or (lambda name: name)
+        summary = CopySummary()
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool, \
+                ThreadPoolExecutor(max_workers=self.workers * self.inflight_parts) as part_pool:
+            self._part_pool = part_pool
+            futures = []
+            for obj in objects:
+                name = getattr(obj, 'name', obj)
+                futures.append(pool.submit(self._copy_with_retry, source_namespace, source_bucket,
+                                           dest_namespace, dest_bucket, name, destination_name(name),
+                                           getattr(obj, 'size', None)))
+            for future in as_completed(futures):
+                result = future.result()
+                summary.results.append(result)
+                if result.ok:
+                    count('objects_copied')
+                    count('bytes_copied', result.bytes)
+                    log_event('object_copied', source=result.source_name, destination=result.destination_name,
+                              method=result.method, bytes=result.bytes, seconds=round(result.seconds, 3),
+                              attempts=result.attempts)
+                else:
+                    count('copy_failures')
+                    log_event('object_failed', level=logging.ERROR, source=result.source_name,
+                              attempts=result.attempts, error=result.error)
+
+        summary.seconds = time.perf_counter() - started
+        return summary
+
+    def _copy_with_retry(self, source_namespace, source_bucket, dest_namespace, dest_bucket,
+                         source_name, dest_name, size=None):
+        result = CopyResult(source_name, dest_name)
+        started = time.perf_counter()
+
+        while True:
+            result.attempts += 1
+            try:
+                args = (source_namespace, source_bucket, dest_namespace, dest_bucket, source_name, dest_name)
+                if self._server_copy_allowed and self._server_copy(*args):
+                    result.method = 'server'
+                    result.bytes = size or 0
+                elif self.mode == 'spool':
+                    result.method = 'spool'
+                    result.bytes = self._spool_one(*args)
+                else:
+                    result.method = 'stream'
+                    result.bytes = self._stream_one(*args)
+                result.error = result.status = None
+                break
+            except Exception as ex:
+                result.error = str(ex)
+                result.status = getattr(ex, 'status', None)
+                if result.attempts > self.retries or not is_retryable(ex):
+                    break
+                count('copy_retries')
+                log_event('copy_retry', level=logging.WARNING, source=source_name, attempt=result.attempts,
+                          error=result.error)
+                # Exponential backoff with full jitter so workers don't retry in lockstep
+                delay = min(MAX_BACKOFF, self.backoff * 2 ** (result.attempts - 1))
+                time.sleep(random.uniform(0, delay))
+
+        result.seconds = time.perf_counter() - started
+        return result
+
+    def _spool_one(self, source_namespace, source_bucket, dest_namespace, dest_bucket,
+                   source_name, dest_name):
+        with span('get'):
+            object_details = self.client.get_object(source_namespace, source_bucket, source_name)
+
+        # Each worker spools to its own temp file, report parts share file names across days
+        fd, local_file_path = tempfile.mkstemp(dir=self.tmp_dir, suffix='.part')
+        try:
+            size = 0
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in timed(object_details.data.raw.stream(self.chunk_size, decode_content=False), 'read'):
+                    f.write(chunk)
+                    size += len(chunk)
+
+            with open(local_file_path, 'rb') as file_content, span('put'):
+                self.client.put_object(
+                    namespace_name=dest_namespace,
+                    bucket_name=dest_bucket,
+                    object_name=dest_name,
+                    put_object_body=file_content
+                )
+            return size
+        finally:
+            os.remove(local_file_path)
+
+    def _server_copy(self, source_namespace, source_bucket, dest_namespace, dest_bucket,
+                     source_name, dest_name):
+        details = _model('CopyObjectDetails',
+                         source_object_name=source_name,
+                         destination_region=self.destination_region,
+                         destination_namespace=dest_namespace,
+                         destination_bucket=dest_bucket,
+                         destination_object_name=dest_name)
+        try:
+            with span('copy'):
+                copy_response = self.client.copy_object(source_namespace, source_bucket, details)
+        except Exception as ex:
+            if getattr(ex, 'status', None) in (400, 401, 403, 404):
+                # The service can't read the source or write the destination (e.g. cross-tenancy
+                # report buckets without a policy), so every object goes through the function instead
+                log_event('server_copy_not_permitted', level=logging.WARNING, error=str(ex),
+                          detail='falling back to streaming')
+                self._server_copy_allowed = False
+                return False
+            raise
+
+        work_request_id = copy_response.headers['opc-work-request-id']
+        deadline = time.monotonic() + WORK_REQUEST_TIMEOUT
+        delay = 0.5
+        while time.monotonic() < deadline:
+            status = self.client.get_work_request(work_request_id).data.status
+            if status == 'COMPLETED':
+                return True
+            if status in ('FAILED', 'CANCELED'):
+                raise RuntimeError(f"copy_object work request {work_request_id} {status.lower()}")
+            time.sleep(delay)
+            delay = min(delay * 2, 5.0)
+        raise TimeoutError(f"copy_object work request {work_request_id} still running after {WORK_REQUEST_TIMEOUT}s")
+
+    def _read_part(self, raw):
+        # Up to part_size bytes read straight off the response body; the chunks are joined once into the
+        # part, b'' at the end of the body
+        chunks = []
+        remaining = self.part_size
+        started = time.perf_counter()
+        while remaining:
+            chunk = raw.read(min(self.chunk_size, remaining), decode_content=False)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        METRICS.observe('read', time.perf_counter() - started)
+        part = chunks[0] if len(chunks) == 1 else b''.join(chunks)
+        del chunks
+        return part
+
+    def _stream_one(self, source_namespace, source_bucket, dest_namespace, dest_bucket,
+                    source_name, dest_name):
+        with span('get'):
+            object_details = self.client.get_object(source_namespace, source_bucket, source_name)
+        raw = object_details.data.raw
+
+        # The semaphore caps the parts held in memory for this object; a slot is taken before a part is
+        # read and given back once that part is uploaded
+        inflight = threading.BoundedSemaphore(self.inflight_parts)
+        inflight.acquire()
+        first = self._read_part(raw)
+        if len(first) < self.part_size:
+            # Fits in one part, a plain put_object avoids the multipart round trips
+            try:
+                with span('put'):
+                    self.client.put_object(
+                        namespace_name=dest_namespace,
+                        bucket_name=dest_bucket,
+                        object_name=dest_name,
+                        put_object_body=io.BytesIO(first)
+                    )
+                return len(first)
+            finally:
+                inflight.release()
+
+        upload_id = self.client.create_multipart_upload(
+            dest_namespace, dest_bucket, _model('CreateMultipartUploadDetails', object=dest_name)
+        ).data.upload_id
+        try:
+            # The first part is handed over in a one-item list the uploader empties, so no reference to
+            # it outlives its upload
+            head = [first]
+            del first
+            size, committed = self._upload_parts(dest_namespace, dest_bucket, dest_name, upload_id,
+                                                 head, raw, inflight)
+            with span('put'):
+                self.client.commit_multipart_upload(
+                    dest_namespace, dest_bucket, dest_name, upload_id,
+                    _model('CommitMultipartUploadDetails', parts_to_commit=committed)
+                )
+            return size
+        except Exception:
+            try:
+                self.client.abort_multipart_upload(dest_namespace, dest_bucket, dest_name, upload_id)
+            except Exception as ex:
+                log_event('multipart_abort_failed', level=logging.WARNING, upload_id=upload_id,
+                          destination=dest_name, error=str(ex))
+            raise
+
+    def _upload_parts(self, dest_namespace, dest_bucket, dest_name, upload_id, head, raw, inflight):
+        # head holds the first part, already read under a slot of inflight; every later part is read
+        # only after a slot is free. Each body travels in a one-item list its upload empties, and the
+        # slot is given back only once the last reference to the body is gone.
+        def upload(part_num, holder):
+            body = holder.pop()
+            try:
+                with span('put'):
+                    part_response = self.client.upload_part(dest_namespace, dest_bucket, dest_name,
+                                                            upload_id, part_num, body)
+                return _model('CommitMultipartUploadPartDetails', part_num=part_num,
+                              etag=part_response.headers['etag'])
+            finally:
+                del body
+                inflight.release()
+
+        size = len(head[0])
+        futures = [self._part_pool.submit(upload, 1, head)]
+        try:
+            while True:
+                inflight.acquire()
+                body = self._read_part(raw)
+                if not body:
+                    inflight.release()
+                    break
+                size += len(body)
+                futures.append(self._part_pool.submit(upload, len(futures) + 1, [body]))
+                del body
+        finally:
+            # Parts already submitted finish before returning, also when reading failed, so none is left
+            # running against an upload that is about to be aborted
+            wait(futures)
+        return size, [f.result() for f in futures]
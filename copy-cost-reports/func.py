@@ -1,52 +1,197 @@
+import time
+
+_LOAD_STARTED = time.perf_counter()
+
 import io
 import json
 import logging
-import oci
+import os
+import threading
 from datetime import datetime, timedelta
+from types import SimpleNamespace
+
 from fdk import response
 
+from copy_engine import CopyEngine, create_object_storage_client
+from instrumentation import METRICS, configure_logging, log_event, log_metrics, span
+from sync_manifest import ObjectManifestStore, SyncManifest, list_objects_since
+
+# The function runs in two modes:
+#  - scheduled (no payload): copy every report part that is new or changed since the manifest watermark
+#  - event-driven: an Object Storage "object created" event in `data` copies just that one object,
+#    so a report is available seconds after it is published instead of on the next daily run
+# The oci SDK is imported and the signer and client are built on the first invocation only; a warm
+# container reuses them, refreshing the resource principal token when it is about to expire.
+
+# Number of parallel copy workers, settable through the function configuration
+COPY_WORKERS = int(os.environ.get('COPY_WORKERS', 8))
+COPY_RETRIES = int(os.environ.get('COPY_RETRIES', 4))
+# stream (default) pipes each report straight into the upload, server tries copy_object first,
+# spool keeps the old download-to-/tmp behaviour
+COPY_MODE = os.environ.get('COPY_MODE', 'stream')
+# Manifest of the report parts already copied, kept in the destination bucket
+MANIFEST_OBJECT = os.environ.get('MANIFEST_OBJECT', 'sync-manifests/copy-cost-reports.json')
+# Optional YYYY-MM-DD override of the day the listing starts from
+SYNC_SINCE = os.environ.get('SYNC_SINCE')
+# Memory the stream buffers may use: the function's memory (FN_MEMORY, MB) less what the runtime and
+# SDK need. The engine runs fewer workers than COPY_WORKERS when their parts would not fit.
+RUNTIME_MEMORY_MB = 128
+COPY_MEMORY_MB = int(os.environ.get('COPY_MEMORY_MB', max(int(os.environ.get('FN_MEMORY', 256)) - RUNTIME_MEMORY_MB, 32)))
+
+REPORTING_NAMESPACE = 'bling'
+REPORTING_BUCKET = 'ocid1.tenancy.oc1..aaaaaaaaa3qmjxr43tjexx75r6gwk6vjw22ermohbw2vbxyhczksgjir7xdq'
+REPORT_PREFIX = "FOCUS Reports"
+DEST_NAMESPACE = 'ociateam'
+UPLOAD_BUCKET_NAME = 'cost_and_usage_reports'
+DESTINATION_PATH = '/tmp'
+OBJECT_EVENT_TYPES = ('com.oraclecloud.objectstorage.createobject', 'com.oraclecloud.objectstorage.updateobject')
+
+# One JSON object per log line, with the per-invocation metrics logged at the end
+configure_logging()
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def object_storage():
+    # Built on the first invocation and kept for the life of the container
+    with _clients_lock:
+        if not _clients:
+            from oci.auth.signers import get_resource_principals_signer
+
+            with span('client_init'):
+                signer = get_resource_principals_signer()
+                _clients['signer'] = signer
+                _clients['object_storage'] = create_object_storage_client(signer=signer, pool_size=COPY_WORKERS)
+        else:
+            # The SDK refreshes an expired token while signing; refreshing here keeps it off the copy path
+            signer = _clients['signer']
+            token = getattr(signer, 'security_token', None)
+            if token is not None and not token.valid_with_jitter():
+                with span('signer_refresh'):
+                    signer.refresh_security_token()
+        return _clients['object_storage'], _clients['signer']
+
+
+def reset_clients():
+    # After an authentication failure the next invocation starts from a new signer
+    with _clients_lock:
+        _clients.clear()
+
+
+def parse_object_event(data):
+    # Returns (namespace, bucket, object name) of an object created/updated event, None for other payloads
+    body = data.getvalue() if hasattr(data, 'getvalue') else data
+    if not body:
+        return None
+    try:
+        event = json.loads(body)
+    except ValueError:
+        return None
+    if not isinstance(event, dict) or event.get('eventType') not in OBJECT_EVENT_TYPES:
+        return None
+    details = event.get('data') or {}
+    additional = details.get('additionalDetails') or {}
+    return additional.get('namespace'), additional.get('bucketName'), details.get('resourceName')
+
+
+def copy_pending(client, signer):
+    manifest = SyncManifest(ObjectManifestStore(client, DEST_NAMESPACE, UPLOAD_BUCKET_NAME, MANIFEST_OBJECT))
+
+    # Start listing from the manifest watermark, or yesterday on the first run
+    yesterday = datetime.now() - timedelta(days=1)
+    since = datetime.strptime(SYNC_SINCE, '%Y-%m-%d').date() if SYNC_SINCE else manifest.since() or yesterday.date()
+    report_bucket_objects = list_objects_since(client, REPORTING_NAMESPACE, REPORTING_BUCKET, prefix=REPORT_PREFIX, since=since)
+    pending = manifest.pending(report_bucket_objects)
+    log_event('listed', prefix=REPORT_PREFIX, since=since, objects=len(report_bucket_objects), pending=len(pending))
+
+    engine = CopyEngine(client, workers=COPY_WORKERS, retries=COPY_RETRIES, tmp_dir=DESTINATION_PATH,
+                        mode=COPY_MODE, destination_region=signer.region,
+                        memory_budget=COPY_MEMORY_MB * 1024 * 1024)
+    # Source names already carry the FOCUS Reports/YYYY/MM/DD prefix, which is preserved in the destination bucket
+    summary = engine.copy(REPORTING_NAMESPACE, REPORTING_BUCKET, DEST_NAMESPACE, UPLOAD_BUCKET_NAME, pending)
+    _mark_copied(manifest, pending, summary)
+    return summary
+
+
+def copy_object(client, signer, namespace, bucket, object_name):
+    # Event-driven path: no listing, one head_object for the manifest entry and one copy
+    with span('get'):
+        headers = client.head_object(namespace, bucket, object_name).headers
+    obj = SimpleNamespace(name=object_name, etag=headers.get('etag'), md5=headers.get('content-md5'),
+                          size=int(headers.get('content-length', 0)))
+
+    engine = CopyEngine(client, workers=1, retries=COPY_RETRIES, tmp_dir=DESTINATION_PATH,
+                        mode=COPY_MODE, destination_region=signer.region,
+                        memory_budget=COPY_MEMORY_MB * 1024 * 1024)
+    summary = engine.copy(namespace, bucket, DEST_NAMESPACE, UPLOAD_BUCKET_NAME, [obj])
+    # Concurrent events can overwrite each other's manifest update; an entry lost that way only means
+    # the scheduled run copies that object once more
+    _mark_copied(SyncManifest(ObjectManifestStore(client, DEST_NAMESPACE, UPLOAD_BUCKET_NAME, MANIFEST_OBJECT)),
+                 [obj], summary)
+    return summary
+
+
+def _mark_copied(manifest, objects, summary):
+    # Parts that failed are left out of the manifest and their day is kept in the next run's listing,
+    # so they are retried
+    manifest.record(objects, summary)
+    manifest.save()
+
 
 def handler(ctx, data: io.BytesIO = None):
+    # Metrics are per invocation, a warm container keeps the module between calls
+    METRICS.reset()
+    cold_start = not _clients
+    summary = None
     try:
-        reporting_namespace = 'bling'
-        yesterday = datetime.now() - timedelta(days=1)
-        prefix_file = f"FOCUS Reports/{yesterday.year}/{yesterday.strftime('%m')}/{yesterday.strftime('%d')}"
-        print(f"prefix is {prefix_file}")
-        destination_path = '/tmp'
-        
-        dest_namespace = 'ociateam'
-        upload_bucket_name = 'cost_and_usage_reports'
-        reporting_bucket = 'ocid1.tenancy.oc1..aaaaaaaaa3qmjxr43tjexx75r6gwk6vjw22ermohbw2vbxyhczksgjir7xdq'
-        
-        Signer = oci.auth.signers.get_resource_principals_signer() 
-        object_storage = oci.object_storage.ObjectStorageClient(config={}, signer=Signer)
-        report_bucket_objects = oci.pagination.list_call_get_all_results(object_storage.list_objects, reporting_namespace, reporting_bucket, prefix=prefix_file)
-        
-        for o in report_bucket_objects.data.objects:
-            object_details = object_storage.get_object(reporting_namespace, reporting_bucket, o.name)
-            filename = o.name.rsplit('/', 1)[-1]
-            local_file_path = destination_path + '/' + filename
-            
-            with open(local_file_path, 'wb') as f:
-                for chunk in object_details.data.raw.stream(1024 * 1024, decode_content=False):
-                    f.write(chunk)
-            
-            # Preserve the prefix structure in the destination bucket
-            destination_object_name = f"{prefix_file}/{filename}"
-            
-            with open(local_file_path, 'rb') as file_content:
-                object_storage.put_object(
-                    namespace_name=dest_namespace,
-                    bucket_name=upload_bucket_name,
-                    object_name=destination_object_name,
-                    put_object_body=file_content
-                )
-                
-    except (Exception, ValueError) as ex:
-        logging.getLogger().info('error parsing payload: ' + str(ex))
-    
+        event = parse_object_event(data)
+        client, signer = object_storage()
+        if event is None:
+            summary = copy_pending(client, signer)
+        else:
+            namespace, bucket, object_name = event
+            # Only the reporting bucket is a source; an event from anywhere else, the destination bucket
+            # included, would otherwise copy the destination's own writes back into it
+            if (namespace, bucket) != (REPORTING_NAMESPACE, REPORTING_BUCKET):
+                log_event('event_ignored', namespace=namespace, bucket=bucket, object=object_name)
+                return _response(ctx, 200, f"Ignored {object_name}, not from the reporting bucket", summary,
+                                 cold_start)
+            if not object_name or not object_name.startswith(f"{REPORT_PREFIX}/"):
+                log_event('event_ignored', namespace=namespace, bucket=bucket, object=object_name)
+                return _response(ctx, 200, f"Ignored {object_name}, not a report", summary, cold_start)
+            log_event('object_event', namespace=namespace, bucket=bucket, object=object_name)
+            summary = copy_object(client, signer, namespace, bucket, object_name)
+
+    except Exception as ex:
+        if getattr(ex, 'status', None) == 401:
+            reset_clients()
+        log_event('copy_failed', level=logging.ERROR, exc_info=True, error=str(ex))
+        return _response(ctx, 500, f"Copy failed: {ex}", summary, cold_start)
+
+    if summary.failed:
+        # The engine catches per-object errors, a 401 among them means the signer's token is no longer valid
+        if any(r.status == 401 for r in summary.failed):
+            reset_clients()
+        log_event('copy_incomplete', level=logging.ERROR, failed=[r.source_name for r in summary.failed])
+        return _response(ctx, 500, f"Copied {len(summary.copied)} of {len(summary.results)} files, "
+                                   f"{len(summary.failed)} failed", summary, cold_start)
+    return _response(ctx, 200, "Processed Files successfully", summary, cold_start)
+
+
+def _response(ctx, status_code, message, summary, cold_start):
+    log_metrics('invocation_finished', status=status_code, cold_start=cold_start,
+                summary=summary.as_dict() if summary else None)
     return response.Response(
         ctx, response_data=json.dumps(
-            {"message": "Processed Files successfully"}
-        )
+            {"message": message,
+             "summary": summary.as_dict() if summary else None,
+             "cold_start": cold_start,
+             "metrics": METRICS.snapshot()}, default=str
+        ),
+        headers={"Content-Type": "application/json"},
+        status_code=status_code
     )
+
+
+log_event('function_loaded', seconds=round(time.perf_counter() - _LOAD_STARTED, 4))
@@ -0,0 +1,247 @@
+import atexit
+import io
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Lightweight instrumentation shared by the copy functions and the analysis scripts.
+#  - span(name) times a block; timed(iterable, name) times only the waits on an iterator, e.g. a
+#    response body consumed while it is uploaded. Both accumulate count/total/max per name.
+#  - count(name, value) bumps a counter (bytes, objects, rows, retries, failures ...).
+#  - log_event(event, **fields) writes one JSON object per line; configure_logging() installs the formatter.
+#  - install() sets up a script run: JSON logs, optional profiling (FOCUS_PROFILE=cprofile|tracemalloc)
+#    and a metrics summary logged at exit.
+# Worker processes have their own registry; worker_metrics() hands it back to the parent to merge().
+#
+# Span names used across the code: list, get, read (response body), put, copy, decompress, parse, read_cache,
+# aggregate, detect, export.
+
+LOG_LEVEL = os.environ.get('FOCUS_LOG_LEVEL', 'INFO')
+PROFILE_MODE = os.environ.get('FOCUS_PROFILE')
+PROFILE_OUTPUT = os.environ.get('FOCUS_PROFILE_OUTPUT')
+PROFILE_TOP = 25
+
+logger = logging.getLogger('focus')
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.timings = {}
+
+    def add(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, seconds):
+        with self._lock:
+            timing = self.timings.setdefault(name, {'count': 0, 'seconds': 0.0, 'max': 0.0})
+            timing['count'] += 1
+            timing['seconds'] += seconds
+            timing['max'] = max(timing['max'], seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {'counters': dict(self.counters),
+                    'timings': {name: dict(timing) for name, timing in self.timings.items()}}
+
+    def merge(self, snapshot):
+        if not snapshot:
+            return
+        with self._lock:
+            for name, value in snapshot['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for name, other in snapshot['timings'].items():
+                timing = self.timings.setdefault(name, {'count': 0, 'seconds': 0.0, 'max': 0.0})
+                timing['count'] += other['count']
+                timing['seconds'] += other['seconds']
+                timing['max'] = max(timing['max'], other['max'])
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.timings.clear()
+
+    def _after_fork(self):
+        # A forked worker starts empty, otherwise the parent's figures would be merged back twice.
+        # The lock may have been held by another thread at fork time, so it is replaced, not taken.
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.timings = {}
+
+
+METRICS = Metrics()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=METRICS._after_fork)
+
+
+def count(name, value=1):
+    METRICS.add(name, value)
+
+
+@contextmanager
+def span(name, **fields):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        METRICS.observe(name, seconds)
+        if logger.isEnabledFor(logging.DEBUG):
+            log_event('span', level=logging.DEBUG, span=name, seconds=round(seconds, 6), **fields)
+
+
+def timed(iterable, name):
+    # Times the waits for each item, not the work the consumer does between items
+    iterator = iter(iterable)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        METRICS.observe(name, time.perf_counter() - started)
+        yield item
+
+
+class TimedReader(io.BufferedIOBase):
+    # Binary file wrapper timing read() calls, e.g. a GzipFile handed to read_csv so decompression is
+    # measured apart from parsing. Closing the wrapper leaves the wrapped file open.
+    def __init__(self, fileobj, name):
+        super().__init__()
+        self._fileobj = fileobj
+        self.span = name
+        self.seconds = 0.0
+
+    def read(self, size=-1):
+        started = time.perf_counter()
+        try:
+            return self._fileobj.read(size)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.seconds += elapsed
+            METRICS.observe(self.span, elapsed)
+
+    read1 = read
+
+    def readable(self):
+        return True
+
+
+def worker_metrics():
+    # Called at the end of a pipeline work item: inside a worker process the metrics are collected and
+    # returned for the parent to merge; in the parent (thread workers) they are already in METRICS
+    if multiprocessing.parent_process() is None:
+        return None
+    snapshot = METRICS.snapshot()
+    METRICS.reset()
+    return snapshot
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        document = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.getMessage(),
+        }
+        document.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            document['exception'] = self.formatException(record.exc_info)
+        return json.dumps(document, default=str)
+
+
+def configure_logging(level=LOG_LEVEL, stream=None):
+    # Idempotent: the handler is installed once per process
+    if not any(isinstance(h.formatter, JsonFormatter) for h in logger.handlers):
+        handler = logging.StreamHandler(stream or sys.stderr)
+        handler.setFormatter(JsonFormatter())
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(level)
+    return logger
+
+
+def log_event(event, level=logging.INFO, exc_info=None, **fields):
+    logger.log(level, event, exc_info=exc_info, extra={'fields': fields})
+
+
+def log_metrics(event='metrics', **fields):
+    snapshot = METRICS.snapshot()
+    timings = {name: {'count': t['count'], 'seconds': round(t['seconds'], 4), 'max': round(t['max'], 4)}
+               for name, t in snapshot['timings'].items()}
+    log_event(event, counters=snapshot['counters'], timings=timings, **fields)
+
+
+class Profiler:
+    # cprofile: function-level CPU profile, dumped as .prof and summarised in the log
+    # tracemalloc: Python allocation peak and the allocating lines holding the most memory
+    def __init__(self, mode=PROFILE_MODE, output=PROFILE_OUTPUT):
+        if mode not in (None, '', 'cprofile', 'tracemalloc'):
+            raise ValueError(f"Unknown profile mode {mode}, expected cprofile or tracemalloc")
+        self.mode = mode or None
+        self.output = output
+        self._profile = None
+
+    def start(self):
+        if self.mode == 'cprofile':
+            import cProfile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        elif self.mode == 'tracemalloc':
+            import tracemalloc
+            tracemalloc.start(25)
+
+    def stop(self):
+        if self.mode == 'cprofile' and self._profile is not None:
+            import pstats
+            self._profile.disable()
+            if self.output:
+                self._profile.dump_stats(self.output)
+            text = io.StringIO()
+            pstats.Stats(self._profile, stream=text).sort_stats('cumulative').print_stats(PROFILE_TOP)
+            log_event('profile', mode='cprofile', output=self.output, top=text.getvalue().splitlines())
+            self._profile = None
+        elif self.mode == 'tracemalloc':
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                return
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            if self.output:
+                snapshot.dump(self.output)
+            top = [str(stat) for stat in snapshot.statistics('lineno')[:PROFILE_TOP]]
+            log_event('profile', mode='tracemalloc', output=self.output, current_mb=round(current / 2 ** 20, 1),
+                      peak_mb=round(peak / 2 ** 20, 1), top=top)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def install(run, **fields):
+    # One call at the top of a script's main block
+    configure_logging()
+    profiler = Profiler()
+    profiler.start()
+    started = time.perf_counter()
+    log_event('run_started', run=run, **fields)
+
+    def finish():
+        profiler.stop()
+        log_metrics('run_finished', run=run, seconds=round(time.perf_counter() - started, 3))
+
+    atexit.register(finish)
+    return profiler
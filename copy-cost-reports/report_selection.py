@@ -0,0 +1,78 @@
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+from instrumentation import count, span
+from sync_manifest import LIST_FIELDS, OVERLAP_DAYS, REPORT_PREFIX, report_day
+
+# Selection of the report objects a run needs, decided from listing metadata before any GET.
+# Report names are partitioned by day (FOCUS Reports/YYYY/MM/DD/<part>.csv.gz), so a time window becomes
+# a start/end key range the service applies while listing; objects whose name carries no day are kept
+# or dropped on timeCreated. The resulting plan says how many objects and bytes will be transferred.
+
+
+@dataclass
+class FetchPlan:
+    objects: list = field(default_factory=list)
+    listed: int = 0
+    pruned: int = 0
+
+    @property
+    def bytes(self):
+        return sum(o.size or 0 for o in self.objects)
+
+    def narrowed(self, objects):
+        # The same plan restricted to a subset of its objects, e.g. manifest.pending(plan.objects)
+        return FetchPlan(list(objects), listed=self.listed, pruned=self.pruned + len(self.objects) - len(objects))
+
+    def describe(self):
+        lines = [f"{len(self.objects)} object(s), {self.bytes / (1024 * 1024):.1f} MB to fetch "
+                 f"({self.listed} listed, {self.pruned} pruned)"]
+        days = Counter()
+        sizes = Counter()
+        for o in self.objects:
+            day = report_day(o.name) or 'undated'
+            days[day] += 1
+            sizes[day] += o.size or 0
+        for day in sorted(days, key=str):
+            lines.append(f"  {day}: {days[day]} object(s), {sizes[day] / (1024 * 1024):.1f} MB")
+        return '\n'.join(lines)
+
+
+def _key(prefix, day):
+    return f"{prefix}/{day:%Y/%m/%d}"
+
+
+def select_reports(client, namespace, bucket, prefix=REPORT_PREFIX, start=None, end=None, suffix='.gz'):
+    # start/end are report days, end exclusive. A report part can hold rows of the neighbouring day,
+    # so the key range is widened by OVERLAP_DAYS on both sides.
+    first = start - timedelta(days=OVERLAP_DAYS) if start else None
+    last = end + timedelta(days=OVERLAP_DAYS) if end else None
+    created_after = datetime.combine(start, datetime.min.time(), timezone.utc) if start else None
+
+    plan = FetchPlan()
+    start_key = _key(prefix, first) if prefix and first else None
+    end_key = _key(prefix, last) if prefix and last else None
+    while True:
+        with span('list', bucket=bucket, prefix=prefix):
+            page = client.list_objects(namespace, bucket, prefix=prefix, start=start_key, end=end_key, fields=LIST_FIELDS)
+        count('objects_listed', len(page.data.objects))
+        for o in page.data.objects:
+            plan.listed += 1
+            if suffix and not o.name.endswith(suffix):
+                plan.pruned += 1
+                continue
+            day = report_day(o.name)
+            if day is not None:
+                keep = (first is None or day >= first) and (last is None or day < last)
+            else:
+                # Without a day in the name, a part written before the window cannot hold rows in it
+                time_created = getattr(o, 'time_created', None)
+                keep = created_after is None or time_created is None or time_created >= created_after
+            if keep:
+                plan.objects.append(o)
+            else:
+                plan.pruned += 1
+        start_key = page.data.next_start_with
+        if not start_key:
+            return plan
@@ -0,0 +1,169 @@
+import json
+import os
+import tempfile
+import threading
+from datetime import date, datetime, timedelta, timezone
+
+from instrumentation import count, span
+
+# Persistent record of the report parts already transferred or parsed, keyed on object name
+# and compared on etag/md5/size, so each run only touches new or changed objects.
+# The watermark is the latest report day seen; listings restart from it with list_objects(start=...)
+# instead of walking the whole bucket history. Parts that failed are remembered with their day until
+# they go through, and listings restart no later than the oldest of those days so they are retried.
+
+MANIFEST_VERSION = 1
+LIST_FIELDS = 'name,size,etag,md5,timeCreated'
+REPORT_PREFIX = 'FOCUS Reports'
+OVERLAP_DAYS = 1
+
+
+def report_day(object_name):
+    # FOCUS Reports/YYYY/MM/DD/<part>.csv.gz
+    parts = object_name.split('/')
+    if len(parts) < 5:
+        return None
+    try:
+        return date(int(parts[-4]), int(parts[-3]), int(parts[-2]))
+    except ValueError:
+        return None
+
+
+def list_objects_since(client, namespace, bucket, prefix=REPORT_PREFIX, since=None):
+    # Object names sort by report day, so a start key skips every older day on the server side
+    start = f"{prefix}/{since:%Y/%m/%d}" if prefix and since else None
+    objects = []
+    while True:
+        with span('list', bucket=bucket, prefix=prefix):
+            page = client.list_objects(namespace, bucket, prefix=prefix, start=start, fields=LIST_FIELDS)
+        count('objects_listed', len(page.data.objects))
+        objects.extend(page.data.objects)
+        start = page.data.next_start_with
+        if not start:
+            return objects
+
+
+class LocalManifestStore:
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path) as f:
+            return json.load(f)
+
+    def save(self, document):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(document, f)
+        os.replace(tmp_path, self.path)
+
+
+class ObjectManifestStore:
+    # Keeps the manifest as an object, for functions whose local disk does not outlive the invocation
+    def __init__(self, client, namespace, bucket, object_name):
+        self.client = client
+        self.namespace = namespace
+        self.bucket = bucket
+        self.object_name = object_name
+
+    def load(self):
+        try:
+            return json.loads(self.client.get_object(self.namespace, self.bucket, self.object_name).data.content)
+        except Exception as ex:
+            if getattr(ex, 'status', None) == 404:
+                return None
+            raise
+
+    def save(self, document):
+        self.client.put_object(
+            namespace_name=self.namespace,
+            bucket_name=self.bucket,
+            object_name=self.object_name,
+            put_object_body=json.dumps(document).encode()
+        )
+
+
+class SyncManifest:
+    def __init__(self, store):
+        self.store = store
+        self.entries = {}
+        self.watermark = None
+        # object name -> report day (ISO) of the parts whose last transfer failed
+        self.failed = {}
+        self._lock = threading.Lock()
+
+        document = store.load()
+        if document and document.get('version') == MANIFEST_VERSION:
+            self.entries = document['entries']
+            self.failed = document.get('failed', {})
+            if document.get('watermark'):
+                self.watermark = date.fromisoformat(document['watermark'])
+
+    def save(self):
+        with self._lock:
+            document = {
+                'version': MANIFEST_VERSION,
+                'watermark': self.watermark.isoformat() if self.watermark else None,
+                'entries': dict(self.entries),
+                'failed': dict(self.failed),
+            }
+        self.store.save(document)
+
+    def is_current(self, obj):
+        entry = self.entries.get(obj.name)
+        if entry is None:
+            return False
+        if entry.get('size') != obj.size:
+            return False
+        etag = getattr(obj, 'etag', None)
+        if etag and entry.get('etag'):
+            return etag == entry['etag']
+        md5 = getattr(obj, 'md5', None)
+        return md5 is not None and md5 == entry.get('md5')
+
+    def pending(self, objects):
+        return [o for o in objects if not self.is_current(o)]
+
+    def mark(self, obj, **extra):
+        # extra keeps caller-specific details next to the entry, e.g. the cache partitions it produced
+        day = report_day(obj.name)
+        with self._lock:
+            self.entries[obj.name] = {
+                'etag': getattr(obj, 'etag', None),
+                'md5': getattr(obj, 'md5', None),
+                'size': obj.size,
+                'synced_at': datetime.now(timezone.utc).isoformat(),
+                **extra,
+            }
+            self.failed.pop(obj.name, None)
+            if day and (self.watermark is None or day > self.watermark):
+                self.watermark = day
+
+    def mark_failed(self, obj):
+        # Keeps the listing from moving past the part's day until a later run transfers it
+        day = report_day(obj.name)
+        if day:
+            with self._lock:
+                self.failed[obj.name] = day.isoformat()
+
+    def record(self, objects, summary):
+        # Marks the objects a CopySummary copied and remembers the ones that failed
+        copied = {r.source_name for r in summary.copied}
+        for o in objects:
+            if o.name in copied:
+                self.mark(o)
+            else:
+                self.mark_failed(o)
+
+    def since(self, overlap_days=OVERLAP_DAYS):
+        # Re-list a little before the watermark: late parts can still land in the last day.
+        # The oldest failed part pulls the start back to its own day.
+        starts = [date.fromisoformat(day) for day in self.failed.values()]
+        if self.watermark:
+            starts.append(self.watermark - timedelta(days=overlap_days))
+        return min(starts) if starts else None
+
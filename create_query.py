@@ -1,27 +1,56 @@
+import argparse
+import json
+from datetime import date, datetime, timedelta, timezone
+
 import oci
-from datetime import datetime, timedelta
+
+from usage_fetcher import TIMESTAMP_FIELDS, UsageFetcher, UsageQuery
+
+parser = argparse.ArgumentParser(description='Summarized usage from the Usage API, cached on disk per day')
+parser.add_argument('--start', type=date.fromisoformat, help='first day (YYYY-MM-DD), defaults to 4 weeks ago')
+parser.add_argument('--end', type=date.fromisoformat, help='day after the last one, defaults to today')
+parser.add_argument('--granularity', default='DAILY', choices=['DAILY', 'MONTHLY'])
+parser.add_argument('--query-type', default='COST', choices=['COST', 'USAGE'])
+parser.add_argument('--group-by', default='', help='comma separated, e.g. service,region')
+parser.add_argument('--filter', help='filter JSON, e.g. {"operator": "AND", "dimensions": [{"key": "service", "value": "COMPUTE"}]}')
+parser.add_argument('--workers', type=int, default=4)
+parser.add_argument('--rate', type=float, default=5.0, help='Usage API requests per second')
+parser.add_argument('--cache-dir', default=r'C:\Security\Blogs\Cost and Usage\Reports\usage_api_cache')
+parser.add_argument('--output', help='.csv, .xlsx or .parquet file, printed when omitted')
+args = parser.parse_args()
 
 # Initialize the UsageAPI client
 config = oci.config.from_file()  # Make sure the ~/.oci/config file is correctly configured
 
+# Retries are handled per request by the fetcher
+usage_api_client = oci.usage_api.UsageapiClient(config, retry_strategy=oci.retry.NoneRetryStrategy())
 
+today = datetime.now(timezone.utc).date()
+end = args.end or today
+start = args.start or end - timedelta(weeks=4)
 
-# Initialize service client with default config file
-usage_api_client = oci.usage_api.UsageapiClient(config)
+query = UsageQuery(
+    tenant_id="ocid1.tenancy.oc1..aaaaaaaaa3qmjxr43tjexx75r6gwk6vjw22ermohbw2vbxyhczksgjir7xdq",
+    granularity=args.granularity,
+    query_type=args.query_type,
+    group_by=tuple(g for g in args.group_by.split(',') if g),
+    filter=json.dumps(json.loads(args.filter), sort_keys=True) if args.filter else None,
+)
 
+# Days already cached for this query are read from disk, only the missing ones are requested
+fetcher = UsageFetcher(usage_api_client, args.cache_dir, workers=args.workers, rate=args.rate)
+usage = fetcher.fetch(query, start, end)
 
-# Send the request to service, some parameters are not required, see API
-# doc for more info
-request_summarized_usages_response = usage_api_client.request_summarized_usages(
-    request_summarized_usages_details=oci.usage_api.models.RequestSummarizedUsagesDetails(
-        tenant_id="ocid1.tenancy.oc1..aaaaaaaaa3qmjxr43tjexx75r6gwk6vjw22ermohbw2vbxyhczksgjir7xdq",
-        time_usage_started=datetime.strptime(
-            "2024-09-25T00:00:00.000Z",
-            "%Y-%m-%dT%H:%M:%S.%fZ"),
-        time_usage_ended=datetime.strptime(
-            "2024-10-21T00:00:00.000Z",
-            "%Y-%m-%dT%H:%M:%S.%fZ"),
-        granularity="DAILY", ))
+if args.output and args.output.endswith('.csv'):
+    usage.to_csv(args.output, index=False)
+elif args.output and args.output.endswith('.parquet'):
+    usage.to_parquet(args.output, index=False)
+elif args.output:
+    # Excel cannot store time zones, the timestamps are UTC
+    usage.assign(**{c: usage[c].dt.tz_localize(None) for c in TIMESTAMP_FIELDS}).to_excel(args.output, index=False)
+else:
+    print(usage.dropna(axis=1, how='all').to_string(index=False))
 
-# Get the data from response
-print(request_summarized_usages_response.data)
\ No newline at end of file
+stats = fetcher.stats
+print(f"{len(usage)} usage rows for {start} to {end}: {stats.cached_periods} period(s) from cache, "
+      f"{stats.fetched_periods} fetched in {stats.requests} request(s) ({stats.retries} retried), {stats.seconds:.1f}s")
@@ -1,23 +1,45 @@
+import argparse
+import os
+import sys
+from datetime import datetime
+
 import oci
-import oracledb
+
+from adw_loader import DEFAULT_BATCH_SIZE, DEFAULT_WORKERS, OracleBackend, SqliteBackend, load_reports
+
+# The sync manifest ships with the copy-cost-reports function
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'copy-cost-reports'))
+from sync_manifest import list_objects_since
+
+parser = argparse.ArgumentParser(description='Load new or changed FOCUS reports into Autonomous Database')
+parser.add_argument('--since', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(),
+                    help='first report day to list (YYYY-MM-DD), defaults to all reports')
+parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='rows per executemany')
+parser.add_argument('--sqlite', metavar='PATH', help='load into a local SQLite database instead of ADW')
+args = parser.parse_args()
 
 # Connect to OCI
 config = oci.config.from_file()
-identity_client = oci.identity.IdentityClient(config)
+object_storage = oci.object_storage.ObjectStorageClient(config)
+
+namespace_name = 'ociateam'
+bucket_name = 'cost_and_usage_reports'
 
 dsn ='''(description= (retry_count=20)(retry_delay=3)(address=(protocol=tcps)(port=1521)(host=adb.us-ashburn-1.oraclecloud.com))(connect_data=(service_name=gwtizid6xsmfvaf_u6vfaxcq64nyfskm_high.adb.oraclecloud.com))(security=(ssl_server_dn_match=yes)))'''
 user = "ADMIN"
-password = ""
-
-# Connect to ADB
-connection = oracledb.connect(user=user, password=password, dsn=dsn)
+password = os.environ.get('ADW_PASSWORD', "")
 
-# Execute a simple query
-with connection.cursor() as cursor:
-    cursor.execute("SELECT 1 FROM DUAL")
-    result = cursor.fetchone()
+# Connect to ADB through a session pool, or to the local stand-in
+if args.sqlite:
+    backend = SqliteBackend(args.sqlite)
+else:
+    backend = OracleBackend(user, password, dsn, workers=args.workers)
 
-print(result)
+objects = [o for o in list_objects_since(object_storage, namespace_name, bucket_name, since=args.since)
+           if o.name.endswith('.gz')]
+summary = load_reports(backend, object_storage, namespace_name, bucket_name, objects,
+                       workers=args.workers, batch_size=args.batch_size)
 
-# Close the connection
-connection.close()
\ No newline at end of file
+print(f"Loaded {summary.rows} rows from {len(summary.loaded)} reports in {summary.seconds:.1f}s "
+      f"({summary.rows_per_sec:,.0f} rows/s), {summary.skipped} skipped, {len(summary.failed)} failed")
@@ -0,0 +1,83 @@
+import argparse
+import os
+import sys
+from datetime import timedelta
+
+import oci
+import pandas as pd
+
+# Instrumentation ships with the copy-cost-reports function
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'copy-cost-reports'))
+from instrumentation import install
+
+from anomaly_engine import SCORERS, AnomalyEngine
+from focus_cache import iter_cache, latest_start, refresh_cache
+from focus_export import SIDECARS, export_report
+from focus_stream import aggregate_chunks
+
+# Daily anomaly run: folds the days that arrived since the last run into the persisted per-series state
+# and reports the (series, day) pairs flagged by any scorer. The first run backfills --backfill days.
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Score new daily costs per series against their baselines')
+    parser.add_argument('--keys', default='ServiceName,Region',
+                        help='comma separated series keys, e.g. ServiceName,Region,SubAccountName or ...,SkuId')
+    parser.add_argument('--scorers', default='mad,seasonal', help=f"comma separated, from {', '.join(SCORERS)}")
+    parser.add_argument('--backfill', type=int, default=120, help='days to fold in when there is no state yet')
+    parser.add_argument('--settle-hours', type=int, default=12,
+                        help='a day is complete once the cache has costs this many hours past its end')
+    parser.add_argument('--state', default=r'C:\Security\Blogs\Cost and Usage\Reports\anomaly_state.npz')
+    parser.add_argument('--output', default=r'C:\Security\Blogs\Cost and Usage\Logs\daily_anomalies.xlsx')
+    parser.add_argument('--sidecar', action='append', choices=SIDECARS, default=[],
+                        help='also write the anomalies as <output stem>.csv/.parquet, can be repeated')
+    parser.add_argument('--dry-run', action='store_true', help='only show the reports and bytes a run would fetch')
+    args = parser.parse_args()
+    install('detect_anomalies', keys=args.keys, scorers=args.scorers)
+
+    # OCI configuration
+    config = oci.config.from_file()
+    object_storage = oci.object_storage.ObjectStorageClient(config)
+
+    namespace_name = 'ociateam'
+    bucket_name = 'cost_and_usage_reports'
+    report_prefix = 'FOCUS Reports'
+    focus_cache_dir = r'C:\Security\Blogs\Cost and Usage\Reports\focus_cache'
+
+    keys = args.keys.split(',')
+    engine = AnomalyEngine.open(args.state, keys=keys, scorers=args.scorers.split(','))
+
+    # Only complete days are scored: today's reports are still arriving
+    today = pd.Timestamp.now(tz='UTC').date()
+    if engine.state.last_day:
+        start = engine.state.last_day + timedelta(days=1)
+    else:
+        start = today - timedelta(days=args.backfill)
+
+    # Reports of days before the first unscored one are neither listed nor downloaded
+    refresh = refresh_cache(object_storage, namespace_name, bucket_name, focus_cache_dir,
+                            prefix=report_prefix, start=start, dry_run=args.dry_run)
+    for file_name in refresh.failed:
+        print(f"File with missing columns or error: {file_name}")
+
+    if args.dry_run:
+        print("Dry run, nothing was downloaded or scored.")
+    elif start >= today:
+        print(f"No complete days after {engine.state.last_day} to score yet.")
+    else:
+        # Reports of a day keep arriving after it ends; a day is folded into the state only once later
+        # costs show its reports are in, until then it is scored again on every run
+        latest = latest_start(focus_cache_dir)
+        through = (latest - pd.Timedelta(hours=args.settle_hours)).floor('D').date() - timedelta(days=1) if latest else None
+        chunks = iter_cache(focus_cache_dir, columns=['BillingPeriodStart', 'EffectiveCost'] + keys, start=start, end=today)
+        daily = aggregate_chunks(chunks, keys=keys + ['BillingDay'])
+        scores = engine.update(daily, through=through)
+        engine.save(args.state)
+        print(f"Scored {len(engine.state)} series from {start} to {engine.state.last_day}, "
+              f"days after {through} wait for their reports")
+
+        anomalies = scores[scores['is_anomaly']]
+        if anomalies.empty:
+            print("No anomalies found in the new days.")
+        else:
+            export_report(anomalies, args.output, sheet_name='Anomalies', sidecars=args.sidecar)
+            print(f"{len(anomalies)} anomalies saved to: {args.output}")
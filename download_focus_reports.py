@@ -1,7 +1,26 @@
+import argparse
 import oci
 import os
+import sys
 from datetime import datetime, timedelta
 
+# The copy engine and sync manifest ship with the copy-cost-reports function
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'copy-cost-reports'))
+from copy_engine import CopyEngine, create_object_storage_client
+from instrumentation import install
+from report_selection import select_reports
+from sync_manifest import LocalManifestStore, SyncManifest
+
+parser = argparse.ArgumentParser(description='Copy new or changed FOCUS reports into the analysis bucket')
+parser.add_argument('--since', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(),
+                    help='first report day to list (YYYY-MM-DD), defaults to the manifest watermark or the last 10 days')
+parser.add_argument('--until', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(),
+                    help='day after the last report day to copy (YYYY-MM-DD), defaults to no limit')
+parser.add_argument('--workers', type=int, default=8)
+parser.add_argument('--dry-run', action='store_true', help='only show the reports and bytes that would be copied')
+args = parser.parse_args()
+install('download_focus_reports')
+
 # Set your namespace and bucket details
 reporting_namespace = 'bling'
 prefix_file = "FOCUS Reports"
@@ -11,70 +30,48 @@ destination_path = r'C:\Security\Blogs\Cost and Usage\Reports'
 dest_namespace = 'ociateam'
 upload_bucket_name = 'cost_and_usage_reports'
 
-# Make a directory to receive reports if it doesn't exist
+# Make a directory to keep the sync manifest if it doesn't exist
 if not os.path.exists(destination_path):
     os.mkdir(destination_path)
 
 # Set up OCI configuration
 config = oci.config.from_file(oci.config.DEFAULT_LOCATION, oci.config.DEFAULT_PROFILE)
-object_storage = oci.object_storage.ObjectStorageClient(config)
+object_storage = create_object_storage_client(config=config, pool_size=args.workers)
 reporting_bucket = config['tenancy']
 
-# Define date range for the last 10 days
-current_time = datetime.now()
-ten_days_ago = current_time - timedelta(days=10)
-
-# Get the list of reports
-report_bucket_objects = oci.pagination.list_call_get_all_results(
-    object_storage.list_objects,
-    reporting_namespace,
-    reporting_bucket,
-    prefix=prefix_file
-)
+# Reports already copied on earlier runs are recorded here
+manifest = SyncManifest(LocalManifestStore(os.path.join(destination_path, '.sync_manifest.json')))
 
-# Loop through each file in the bucket, filter by last 10 days, download, upload, and delete locally
-for o in report_bucket_objects.data.objects:
-    try:
-        # Parse the date from the object name (assuming format: "FOCUS Reports/YYYY/MM/DD/filename")
-        _, year, month, day, filename = o.name.split('/')
-        file_date = datetime(int(year), int(month), int(day))
-        
-        # Check if the file date is within the last 10 days
-        if file_date >= ten_days_ago:
-            print(f'Processing file {o.name} dated {file_date}')
+# List from --since, the manifest watermark, or the last 10 days on the first run
+ten_days_ago = (datetime.now() - timedelta(days=10)).date()
+since = args.since or manifest.since() or ten_days_ago
+print(f'Listing {prefix_file} from {since}')
 
-            # Download the file
-            object_details = object_storage.get_object(reporting_namespace, reporting_bucket, o.name)
-            local_file_path = os.path.join(destination_path, filename)
-            
-            # Ensure subdirectories are created
-            subdir_path = os.path.dirname(local_file_path)
-            if not os.path.exists(subdir_path):
-                os.makedirs(subdir_path)
-            
-            with open(local_file_path, 'wb') as f:
-                for chunk in object_details.data.raw.stream(1024 * 1024, decode_content=False):
-                    f.write(chunk)
-            print(f'----> File {o.name} Downloaded')
+# Get the list of reports, the listing is limited to the wanted days on the server side
+selection = select_reports(object_storage, reporting_namespace, reporting_bucket,
+                           prefix=prefix_file, start=since, end=args.until)
+plan = selection.narrowed(manifest.pending(selection.objects))
+pending = plan.objects
+print(f'{len(pending)} of {len(selection.objects)} files are new or changed')
+if args.dry_run:
+    print(plan.describe())
+    sys.exit(0)
 
-            # Format the destination object name with the year, month, and day
-            destination_object_name = f"FOCUS Reports/{year}/{month}/{day}/{filename}"
+# Copy each new file to the other bucket, keeping the "FOCUS Reports/YYYY/MM/DD/filename" structure
+engine = CopyEngine(object_storage, workers=args.workers, tmp_dir=destination_path,
+                    destination_region=config['region'])
+summary = engine.copy(reporting_namespace, reporting_bucket, dest_namespace, upload_bucket_name, pending)
 
-            # Upload the file to another bucket with the structured prefix
-            print(f'Uploading {destination_object_name} to bucket {upload_bucket_name}')
-            with open(local_file_path, 'rb') as file_content:
-                object_storage.put_object(
-                    namespace_name=dest_namespace,
-                    bucket_name=upload_bucket_name,
-                    object_name=destination_object_name,
-                    put_object_body=file_content
-                )
-            print(f'----> File {destination_object_name} Uploaded to {upload_bucket_name}')
+# Failed parts stay out of the manifest and keep their day in the next run's listing
+manifest.record(pending, summary)
+for result in summary.copied:
+    print(f'----> File {result.source_name} Uploaded to {upload_bucket_name}')
+for result in summary.failed:
+    print(f'----> File {result.source_name} failed: {result.error}')
+manifest.save()
 
-            # Delete the local file after uploading
-            os.remove(local_file_path)
-            print(f'----> File {filename} Deleted Locally')
-        else:
-            print(f'Skipping file {o.name} as it is older than 10 days')
-    except ValueError as e:
-        print(f"Skipping file {o.name} due to parsing error: {e}")
+print(f'Copied {len(summary.copied)}/{len(summary.results)} files, '
+      f'{summary.bytes} bytes in {summary.seconds:.1f}s ({summary.mb_per_sec:.2f} MB/s)')
+# A partial copy must not look like a successful run to the scheduler; the failed parts are retried next time
+if summary.failed:
+    sys.exit(1)
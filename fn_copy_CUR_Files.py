@@ -1,20 +1,37 @@
 import io
 import json
 import logging
+import os
+import sys
 import oci
 from datetime import datetime, timedelta
 from fdk import response
 
+# The copy engine and sync manifest ship with the copy-cost-reports function
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'copy-cost-reports'))
+from copy_engine import CopyEngine, create_object_storage_client
+from instrumentation import METRICS, configure_logging, log_event, log_metrics
+from sync_manifest import ObjectManifestStore, SyncManifest, list_objects_since
+
+COPY_WORKERS = int(os.environ.get('COPY_WORKERS', 8))
+COPY_MODE = os.environ.get('COPY_MODE', 'stream')
+MANIFEST_OBJECT = os.environ.get('MANIFEST_OBJECT', 'sync-manifests/fn-copy-cur-files.json')
+# Memory the stream buffers may use, the function's memory (FN_MEMORY, MB) less the runtime's share
+COPY_MEMORY_MB = int(os.environ.get('COPY_MEMORY_MB', max(int(os.environ.get('FN_MEMORY', 256)) - 128, 32)))
+
+# One JSON object per log line, with the per-invocation metrics logged at the end
+configure_logging()
+
 
 def handler(ctx, data: io.BytesIO = None):
-    name = "World"
+    # Metrics are per invocation, a warm container keeps the module between calls
+    METRICS.reset()
+    summary = None
     try:
         # Set your namespace and bucket details
         reporting_namespace = 'bling'
         yesterday = datetime.now() - timedelta(days=1)
-        prefix_file = f"FOCUS Reports/{yesterday.year}/{yesterday.strftime('%m')}/{yesterday.strftime('%d')}"
-        print(f"prefix is {prefix_file}")
-        #prefix_file = "FOCUS Reports"  
+        prefix_file = "FOCUS Reports"
         destination_path = '/tmp'        
 
         # OCI Bucket to upload the files to
@@ -23,43 +40,51 @@ def handler(ctx, data: io.BytesIO = None):
 
         # Set up OCI configuration
         Signer = oci.auth.signers.get_resource_principals_signer() # Get Resource Principal Credentials
-        object_storage = oci.object_storage.ObjectStorageClient(config={}, signer=Signer)
+        object_storage = create_object_storage_client(signer=Signer, pool_size=COPY_WORKERS)
         reporting_bucket = 'ocid1.tenancy.oc1..aaaaaaaaa3qmjxr43tjexx75r6gwk6vjw22ermohbw2vbxyhczksgjir7xdq'
 
+        # Only report parts that are new or changed since the last run are copied
+        manifest = SyncManifest(ObjectManifestStore(object_storage, dest_namespace, upload_bucket_name, MANIFEST_OBJECT))
+        since = manifest.since() or yesterday.date()
+
         # Get the list of reports
-        report_bucket_objects = oci.pagination.list_call_get_all_results(object_storage.list_objects, reporting_namespace, reporting_bucket, prefix=prefix_file)
+        report_bucket_objects = list_objects_since(object_storage, reporting_namespace, reporting_bucket, prefix=prefix_file, since=since)
+        pending = manifest.pending(report_bucket_objects)
+        log_event('listed', prefix=prefix_file, since=since, objects=len(report_bucket_objects),
+                  pending=[o.name for o in pending])
+
+        # Copy the reports in parallel, keeping the "FOCUS Reports/YYYY/MM/DD/filename" structure so parts
+        # of different days with the same file name do not overwrite each other.
+        # The engine logs an object_copied or object_failed event per file.
+        engine = CopyEngine(object_storage, workers=COPY_WORKERS, tmp_dir=destination_path,
+                            mode=COPY_MODE, destination_region=Signer.region,
+                            memory_budget=COPY_MEMORY_MB * 1024 * 1024)
+        summary = engine.copy(reporting_namespace, reporting_bucket, dest_namespace, upload_bucket_name,
+                              pending)
+
+        # Failed files stay out of the manifest and their day stays in the next run's listing, so they are retried
+        manifest.record(pending, summary)
+        manifest.save()
+
+    except Exception as ex:
+        log_event('copy_failed', level=logging.ERROR, exc_info=True, error=str(ex))
+        return _response(ctx, 500, f"Copy failed: {ex}", summary)
 
-        # Loop through each file in the bucket, download it, upload it to another bucket, and delete locally
-        for o in report_bucket_objects.data.objects:
-            print(f'Found file {o.name}',flush=True)
-            
-            # Download the file
-            object_details = object_storage.get_object(reporting_namespace, reporting_bucket, o.name)
-            filename = o.name.rsplit('/', 1)[-1]
-            local_file_path = destination_path+'/'+filename
-            print(f"local_file_path is  {local_file_path}")
-            
-            with open(local_file_path, 'wb') as f:
-                for chunk in object_details.data.raw.stream(1024 * 1024, decode_content=False):
-                    f.write(chunk)
-            print(f'----> File {o.name} Downloaded',flush=True)
+    if summary.failed:
+        log_event('copy_incomplete', level=logging.ERROR, failed=[r.source_name for r in summary.failed])
+        return _response(ctx, 500, f"Copied {len(summary.copied)} of {len(summary.results)} files, "
+                                   f"{len(summary.failed)} failed", summary)
+    return _response(ctx, 200, "Processed Files successfully", summary)
 
-            # Upload the file to another bucket
-            print(f'Uploading {filename} to bucket {upload_bucket_name}',flush=True)
-            with open(local_file_path, 'rb') as file_content:
-                object_storage.put_object(
-                    namespace_name=dest_namespace,
-                    bucket_name=upload_bucket_name,
-                    object_name=filename,
-                    put_object_body=file_content
-                )
-            print(f'----> File {filename} Uploaded to {upload_bucket_name}',flush=True)
-            print(f'----> File {filename} Deleted Locally',flush=True)
 
-    except (Exception, ValueError) as ex:
-        logging.getLogger().info('error parsing json payload: ' + str(ex))
+def _response(ctx, status_code, message, summary):
+    log_metrics('invocation_finished', status=status_code, summary=summary.as_dict() if summary else None)
     return response.Response(
         ctx, response_data=json.dumps(
-            {"message": "Processed Files sucessfully"}),
-        headers={"Content-Type": "application/json"}
+            {"message": message,
+             "summary": summary.as_dict() if summary else None,
+             "metrics": METRICS.snapshot()}, default=str
+        ),
+        headers={"Content-Type": "application/json"},
+        status_code=status_code
     )
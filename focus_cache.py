@@ -0,0 +1,229 @@
+import gzip
+import hashlib
+import io
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import date
+from functools import partial
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs
+import pyarrow.parquet as pq
+
+# The sync manifest and report selection ship with the copy-cost-reports function
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'copy-cost-reports'))
+from instrumentation import METRICS, count, log_event, span, worker_metrics
+from report_selection import FetchPlan, select_reports
+from sync_manifest import LocalManifestStore, SyncManifest
+
+from focus_pipeline import DEFAULT_PREFETCH, run_pipeline
+from focus_schema import NUMERIC_COLUMNS, TIMESTAMP_COLUMNS, apply_schema, concat_frames
+from focus_stream import DEFAULT_CHUNKSIZE, read_report_chunks
+
+# Local columnar cache of parsed FOCUS reports.
+# Every report is parsed once into typed Parquet files partitioned by BillingPeriodStart day:
+#   <cache_dir>/BillingDay=YYYY-MM-DD/<source key>.parquet
+# ledger.json records, per source object, the etag/md5/size it was parsed from and the days it wrote,
+# so a changed report replaces exactly its own partitions and unchanged ones are never parsed again.
+
+PARTITION_COLUMN = 'BillingDay'
+LEDGER_FILE = 'ledger.json'
+
+
+def arrow_type(column):
+    # Column types are fixed by name so every partition file shares one schema
+    if column in TIMESTAMP_COLUMNS:
+        return pa.timestamp('ns', tz='UTC')
+    if column in NUMERIC_COLUMNS:
+        return pa.float64()
+    return pa.string()
+
+
+def source_key(object_name):
+    return hashlib.sha1(object_name.encode()).hexdigest()[:16]
+
+
+def _partition_path(cache_dir, day, key):
+    return os.path.join(cache_dir, f"{PARTITION_COLUMN}={day}", f"{key}.parquet")
+
+
+def write_partitions(chunks, cache_dir, key):
+    # Chunks are appended to one open writer per day, so a report is never held in memory whole
+    writers = {}
+    schema = None
+    try:
+        for chunk in chunks:
+            # Rows without a billing start can never match a time filter, so they are not cached
+            chunk = chunk[chunk['BillingPeriodStart'].notna()]
+            if schema is None:
+                schema = pa.schema([pa.field(c, arrow_type(c)) for c in chunk.columns])
+            for day, part in chunk.groupby(chunk['BillingPeriodStart'].dt.date):
+                day = day.isoformat()
+                if day not in writers:
+                    path = _partition_path(cache_dir, day, key)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    writers[day] = pq.ParquetWriter(f"{path}.tmp", schema)
+                writers[day].write_table(pa.Table.from_pandas(part, schema=schema, preserve_index=False))
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    for day in writers:
+        path = _partition_path(cache_dir, day, key)
+        os.replace(f"{path}.tmp", path)
+    return sorted(writers)
+
+
+@dataclass
+class RefreshResult:
+    ingested: list = field(default_factory=list)
+    failed: dict = field(default_factory=dict)
+    cached: int = 0
+    # Days whose partitions were written or removed, for rollups maintained from the cache
+    days: set = field(default_factory=set)
+    # The objects selected for parsing and their size
+    plan: FetchPlan = None
+
+
+def cache_payload(name, payload, cache_dir, chunksize=DEFAULT_CHUNKSIZE):
+    # Runs in a pipeline worker process: gunzip, parse and write the day partitions of one report.
+    # Returns the days written and the worker's metrics for the parent to merge.
+    with gzip.GzipFile(fileobj=io.BytesIO(payload)) as gz:
+        # Quantities are written float64, the float32 of in-memory analysis would lose digits on disk
+        days = write_partitions(read_report_chunks(gz, chunksize=chunksize, stored=True), cache_dir, source_key(name))
+    return days, worker_metrics()
+
+
+def refresh_cache(client, namespace, bucket, cache_dir, prefix=None, start=None, end=None, dry_run=False,
+                  prefetch=DEFAULT_PREFETCH, processes=None, chunksize=DEFAULT_CHUNKSIZE):
+    # Parses only the report objects that are new or changed since they were last cached.
+    # start/end (report days, end exclusive) limit the refresh to a time window, objects outside it
+    # are pruned from the listing and never downloaded. dry_run only builds and prints the plan.
+    # Downloads are prefetched in threads while worker processes parse (see focus_pipeline.py).
+    ledger = SyncManifest(LocalManifestStore(os.path.join(cache_dir, LEDGER_FILE)))
+    selection = select_reports(client, namespace, bucket, prefix=prefix, start=start, end=end)
+    plan = selection.narrowed(ledger.pending(selection.objects))
+    pending = {o.name: o for o in plan.objects}
+    result = RefreshResult(cached=len(selection.objects) - len(pending), plan=plan)
+    print(f"{len(pending)} of {len(selection.objects)} reports are new or changed, {result.cached} already cached, "
+          f"{plan.bytes / (1024 * 1024):.1f} MB to fetch")
+    if dry_run:
+        print(plan.describe())
+        return result
+
+    def fetch(name):
+        with span('get', object=name):
+            content = client.get_object(namespace, bucket, name).data.content
+        count('bytes_downloaded', len(content))
+        return content
+
+    try:
+        for name, output, error in run_pipeline(pending, fetch, partial(cache_payload, cache_dir=cache_dir, chunksize=chunksize),
+                                              prefetch=prefetch, processes=processes):
+            if error is not None:
+                print(f"Error processing file {name}: {error}")
+                count('reports_failed')
+                log_event('report_failed', object=name, error=str(error))
+                result.failed[name] = str(error)
+                continue
+            days, metrics = output
+            METRICS.merge(metrics)
+            count('reports_cached')
+            key = source_key(name)
+            stale = set(ledger.entries.get(name, {}).get('partitions', [])) - set(days)
+            for day in stale:
+                os.remove(_partition_path(cache_dir, day, key))
+            result.days.update(date.fromisoformat(d) for d in stale | set(days))
+            ledger.mark(pending[name], partitions=days)
+            result.ingested.append(name)
+            print(f"Cached {name} into {len(days)} day partition(s)")
+    finally:
+        ledger.save()
+    return result
+
+
+def _partition_files(cache_dir, start=None, end=None):
+    # Partition pruning happens on directory names, files outside [start, end) are never opened
+    if not os.path.isdir(cache_dir):
+        return []
+    files = []
+    for entry in sorted(os.listdir(cache_dir)):
+        if not entry.startswith(f"{PARTITION_COLUMN}="):
+            continue
+        day = date.fromisoformat(entry.split('=', 1)[1])
+        if (start and day < start) or (end and day >= end):
+            continue
+        partition = os.path.join(cache_dir, entry)
+        files.extend(os.path.join(partition, f) for f in sorted(os.listdir(partition)) if f.endswith('.parquet'))
+    return files
+
+
+def partition_state(cache_dir):
+    # Fingerprint per day of the partition files (name, size and mtime), so a rollup can tell which days
+    # changed since it was built whichever script refreshed the cache
+    state = {}
+    for path in _partition_files(cache_dir):
+        stat = os.stat(path)
+        day = os.path.basename(os.path.dirname(path)).split('=', 1)[1]
+        state.setdefault(day, hashlib.sha1()).update(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return {day: digest.hexdigest()[:16] for day, digest in state.items()}
+
+
+def latest_start(cache_dir):
+    # Newest BillingPeriodStart in the cache, read from the files of the last day partition only
+    files = _partition_files(cache_dir)
+    if not files:
+        return None
+    newest = os.path.dirname(files[-1])
+    table = pa.concat_tables(pq.read_table(path, columns=['BillingPeriodStart'])
+                             for path in files if os.path.dirname(path) == newest)
+    latest = pc.max(table['BillingPeriodStart']).as_py()
+    return pd.Timestamp(latest) if latest is not None else None
+
+
+def _dataset(cache_dir, columns, start, end):
+    files = _partition_files(cache_dir, start, end)
+    if columns is None:
+        columns = []
+        for path in files:
+            columns.extend(c for c in pq.read_schema(path).names if c not in columns)
+    schema = pa.schema([pa.field(c, arrow_type(c)) for c in columns])
+    if not files:
+        return None, schema
+
+    # Memory-mapped reads let Arrow page in only the column chunks that are used
+    dataset = ds.dataset(files, schema=schema, format='parquet',
+                         filesystem=pyarrow.fs.LocalFileSystem(use_mmap=True))
+    return dataset, schema
+
+
+def read_cache(cache_dir, columns=None, start=None, end=None):
+    # start/end are dates on BillingPeriodStart, end exclusive.
+    # Batches are converted to the compact types one at a time, the text columns are never all in memory at once.
+    frames = list(iter_cache(cache_dir, columns, start, end))
+    if not frames:
+        return apply_schema(_dataset(cache_dir, columns, start, end)[1].empty_table().to_pandas())
+    return concat_frames(frames)
+
+
+def iter_cache(cache_dir, columns=None, start=None, end=None, batch_size=DEFAULT_CHUNKSIZE):
+    # Same selection as read_cache, yielded as bounded DataFrame chunks for streaming aggregation
+    dataset, schema = _dataset(cache_dir, columns, start, end)
+    if dataset is None:
+        return
+    batches = dataset.to_batches(columns=schema.names, batch_size=batch_size)
+    while True:
+        started = time.perf_counter()
+        batch = next(batches, None)
+        if batch is None:
+            return
+        if batch.num_rows:
+            chunk = apply_schema(batch.to_pandas())
+            METRICS.observe('read_cache', time.perf_counter() - started)
+            count('rows_read', len(chunk))
+            yield chunk
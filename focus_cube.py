@@ -0,0 +1,195 @@
+import argparse
+import json
+import os
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from focus_cache import iter_cache, partition_state
+from focus_stream import aggregate_chunks
+
+# Pre-aggregated cost cube over the local report cache.
+# One row per (BillingDay, dimensions...) with the cost measures summed, kept in a single small Parquet
+# file. The file metadata holds the partition fingerprints (partition_state) the cube was built from, so
+# an update re-aggregates every day whose partitions changed since, also when another script refreshed
+# the cache, and queries (filters, group-bys, time ranges) run in memory on the cube, never on the
+# reports themselves.
+
+CUBE_PATH = r'C:\Security\Blogs\Cost and Usage\Reports\focus_cube.parquet'
+FOCUS_CACHE_DIR = r'C:\Security\Blogs\Cost and Usage\Reports\focus_cache'
+DEFAULT_DIMENSIONS = ['ServiceName', 'Region']
+MEASURES = ['EffectiveCost', 'BilledCost']
+DAY_KEY = 'BillingDay'
+MONTH_KEY = 'BillingMonth'
+
+
+def _fill_missing(chunk, dimensions):
+    # Rows with an empty dimension are kept under '' instead of being dropped by the group-by
+    for column in dimensions:
+        values = chunk[column]
+        if isinstance(values.dtype, pd.CategoricalDtype) and '' not in values.cat.categories:
+            values = values.cat.add_categories([''])
+        chunk[column] = values.fillna('')
+    return chunk
+
+
+def _aggregate(cache_dir, dimensions, start=None, end=None):
+    chunks = iter_cache(cache_dir, columns=['BillingPeriodStart'] + MEASURES + dimensions, start=start, end=end)
+    chunks = (_fill_missing(chunk, dimensions) for chunk in chunks)
+    return aggregate_chunks(chunks, keys=[DAY_KEY] + dimensions, value=MEASURES)
+
+
+class CostCube:
+    def __init__(self, frame, dimensions, partitions=None):
+        self.dimensions = list(dimensions)
+        self.frame = frame
+        # Day -> fingerprint of the cache partitions aggregated into the cube, None when unknown
+        self.partitions = partitions
+        # Days re-aggregated by the update_cube that returned this cube
+        self.updated = set()
+
+    @classmethod
+    def from_rows(cls, rows, dimensions):
+        # rows: keys + measures as returned by aggregate_chunks, BillingDay as dates
+        frame = rows.copy()
+        frame[DAY_KEY] = pd.to_datetime(frame[DAY_KEY]).astype('datetime64[ns]')
+        for column in dimensions:
+            frame[column] = frame[column].astype('category')
+        for column in MEASURES:
+            frame[column] = frame[column].astype(float)
+        frame = frame.sort_values([DAY_KEY] + list(dimensions), ignore_index=True)
+        return cls(frame[[DAY_KEY] + list(dimensions) + MEASURES], dimensions)
+
+    @classmethod
+    def load(cls, path=CUBE_PATH):
+        table = pq.read_table(path)
+        metadata = table.schema.metadata
+        dimensions = json.loads(metadata[b'dimensions'])
+        partitions = json.loads(metadata[b'partitions']) if b'partitions' in metadata else None
+        frame = table.to_pandas(date_as_object=False)
+        frame[DAY_KEY] = frame[DAY_KEY].astype('datetime64[ns]')
+        return cls(frame, dimensions, partitions)
+
+    def save(self, path=CUBE_PATH):
+        table = pa.Table.from_pandas(self.frame, preserve_index=False)
+        metadata = {b'dimensions': json.dumps(self.dimensions).encode()}
+        if self.partitions is not None:
+            metadata[b'partitions'] = json.dumps(self.partitions, sort_keys=True).encode()
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+        tmp_path = f"{path}.tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+
+    @property
+    def days(self):
+        if self.frame.empty:
+            return None, None
+        return self.frame[DAY_KEY].min().date(), self.frame[DAY_KEY].max().date()
+
+    def query(self, group_by=(DAY_KEY,), filters=None, start=None, end=None, measures=('EffectiveCost',)):
+        # filters maps column -> value or list of values; start/end are dates, end exclusive.
+        # group_by may use any dimension, BillingDay or BillingMonth; an empty group_by returns the grand total.
+        frame = self.frame
+        mask = np.ones(len(frame), dtype=bool)
+        if start is not None:
+            mask &= frame[DAY_KEY] >= pd.Timestamp(start)
+        if end is not None:
+            mask &= frame[DAY_KEY] < pd.Timestamp(end)
+        for column, wanted in (filters or {}).items():
+            if isinstance(wanted, (list, tuple, set)):
+                mask &= frame[column].isin(list(wanted))
+            else:
+                mask &= frame[column] == wanted
+        selected = frame[mask]
+
+        group_by, measures = list(group_by), list(measures)
+        if MONTH_KEY in group_by:
+            selected = selected.assign(**{MONTH_KEY: selected[DAY_KEY].dt.to_period('M')})
+        if not group_by:
+            return selected[measures].sum().to_frame().T
+        result = selected.groupby(group_by, as_index=False, observed=True)[measures].sum()
+        if DAY_KEY in group_by:
+            result[DAY_KEY] = result[DAY_KEY].dt.date
+        return result
+
+
+def update_cube(cache_dir=FOCUS_CACHE_DIR, path=CUBE_PATH, days=None, dimensions=None, rebuild=False):
+    # Re-aggregates every day whose cache partitions differ from the fingerprints stored with the cube.
+    # days: dates known to have changed (RefreshResult.days), re-aggregated as well. A cube without
+    # fingerprints, changing its dimensions or rebuild=True re-aggregates the whole cache.
+    # The returned cube's updated holds the days re-aggregated.
+    existing = CostCube.load(path) if os.path.exists(path) else None
+    dimensions = list(dimensions or (existing.dimensions if existing else DEFAULT_DIMENSIONS))
+    partitions = partition_state(cache_dir)
+    if rebuild or existing is None or existing.dimensions != dimensions or existing.partitions is None:
+        days = None
+    else:
+        known = existing.partitions
+        days = set(days or ()) | {date.fromisoformat(day) for day in known.keys() | partitions.keys()
+                                  if known.get(day) != partitions.get(day)}
+        if not days:
+            return existing
+
+    if days is None:
+        rows = _aggregate(cache_dir, dimensions)
+    else:
+        days = sorted(days)
+        print(f"Re-aggregating {len(days)} changed day(s) into the cost cube")
+        fresh = [_aggregate(cache_dir, dimensions, day, day + timedelta(days=1)) for day in days]
+        kept = existing.frame[~existing.frame[DAY_KEY].isin(pd.to_datetime(days))].copy()
+        kept[DAY_KEY] = kept[DAY_KEY].dt.date
+        for column in dimensions:
+            kept[column] = kept[column].astype(str)
+        rows = pd.concat([kept] + [f for f in fresh if not f.empty], ignore_index=True)
+
+    cube = CostCube.from_rows(rows, dimensions)
+    cube.partitions = partitions
+    cube.save(path)
+    cube.updated = set(days) if days is not None else {date.fromisoformat(day) for day in partitions}
+    return cube
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Query daily cost from the pre-aggregated cost cube')
+    parser.add_argument('--cube', default=CUBE_PATH)
+    parser.add_argument('--cache', default=FOCUS_CACHE_DIR, help='report cache the cube is built from')
+    parser.add_argument('--rebuild', action='store_true', help='re-aggregate the whole cube from the cache first')
+    parser.add_argument('--dimensions', help='comma separated cube dimensions for --rebuild, e.g. ServiceName,Region,SkuId')
+    parser.add_argument('--group-by', default=DAY_KEY, help='comma separated, empty for the grand total')
+    parser.add_argument('--filter', action='append', default=[], metavar='COLUMN=VALUE[,VALUE...]')
+    parser.add_argument('--days', type=int, help='last N days, ending today')
+    parser.add_argument('--start', type=date.fromisoformat)
+    parser.add_argument('--end', type=date.fromisoformat, help='exclusive')
+    parser.add_argument('--measures', default='EffectiveCost')
+    parser.add_argument('--output', help='.xlsx or .csv file, printed when omitted')
+    args = parser.parse_args()
+
+    # The cube is brought up to date with the cache first, only changed days are re-aggregated
+    cube = update_cube(args.cache, args.cube, dimensions=args.dimensions.split(',') if args.dimensions else None,
+                       rebuild=args.rebuild)
+
+    filters = {}
+    for item in args.filter:
+        column, _, values = item.partition('=')
+        values = values.split(',')
+        filters[column] = values if len(values) > 1 else values[0]
+    start = args.start
+    if args.days:
+        start = pd.Timestamp.now(tz='UTC').date() - timedelta(days=args.days)
+
+    began = time.perf_counter()
+    result = cube.query(group_by=[g for g in args.group_by.split(',') if g], filters=filters, start=start,
+                        end=args.end, measures=args.measures.split(','))
+    elapsed_ms = (time.perf_counter() - began) * 1000
+
+    if args.output and args.output.endswith('.csv'):
+        result.to_csv(args.output, index=False)
+    elif args.output:
+        result.to_excel(args.output, index=False)
+    else:
+        print(result.to_string(index=False))
+    print(f"{len(result)} rows from {len(cube.frame)} cube rows in {elapsed_ms:.1f} ms")
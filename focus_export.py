@@ -0,0 +1,200 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Instrumentation ships with the copy-cost-reports function
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'copy-cost-reports'))
+from instrumentation import count, span
+
+# Single-pass report export.
+# The workbook is streamed row by row (xlsxwriter in constant_memory mode, or an openpyxl write-only
+# workbook when xlsxwriter is not installed) and never reopened: number formats are set per column and
+# the month-over-month columns are coloured by native conditional formatting rules evaluated by Excel,
+# not by styling cells one at a time. Memory stays flat however many rows are written.
+# Optional CSV/Parquet sidecars carry the same rows for tools that do not read Excel.
+
+# Excel's sheet limit, less the header row; longer reports continue on further sheets
+EXCEL_MAX_ROWS = 1_048_575
+BATCH_ROWS = 50_000
+SIDECARS = ('csv', 'parquet')
+
+POSITIVE_COLOR = '#00FF00'
+NEGATIVE_COLOR = '#FF0000'
+DATE_FORMAT = 'yyyy-mm-dd'
+DATETIME_FORMAT = 'yyyy-mm-dd hh:mm:ss'
+COST_FORMAT = '#,##0.00'
+PCT_CHANGE_FORMAT = '0.00"%"'
+
+
+def change_columns(frame):
+    # Month-over-month changes from focus_history.py, coloured green when up and red when down
+    return [c for c in frame.columns if str(c).endswith('_PctChange')]
+
+
+def number_formats(frame):
+    formats = {}
+    for column in frame.columns:
+        name = str(column)
+        if name.endswith('_PctChange'):
+            formats[column] = PCT_CHANGE_FORMAT
+        elif name.endswith('Cost'):
+            formats[column] = COST_FORMAT
+        elif pd.api.types.is_datetime64_any_dtype(frame[column]):
+            formats[column] = DATETIME_FORMAT
+    return formats
+
+
+def _column_values(series):
+    # Plain Python values a workbook writer accepts, with None for missing cells. Infinite values (a
+    # _PctChange from a month without cost) have no cell value in Excel and are left empty as well
+    missing = series.isna().to_numpy()
+    if pd.api.types.is_float_dtype(series.dtype):
+        missing = missing | np.isinf(series.to_numpy())
+    if isinstance(series.dtype, pd.PeriodDtype):
+        series = series.astype(str)
+    elif isinstance(series.dtype, pd.DatetimeTZDtype):
+        series = series.dt.tz_localize(None)
+    values = series.astype(object).tolist()
+    if missing.any():
+        for i in missing.nonzero()[0]:
+            values[i] = None
+    return values
+
+
+def _batches(frame):
+    # Rows are converted a batch at a time, never the whole frame as Python objects
+    for start in range(0, len(frame), BATCH_ROWS):
+        part = frame.iloc[start:start + BATCH_ROWS]
+        yield zip(*(_column_values(part[c]) for c in part.columns))
+
+
+def _sheet_names(sheet_name, rows):
+    sheets = max(1, -(-rows // EXCEL_MAX_ROWS))
+    return [sheet_name if i == 0 else f"{sheet_name} ({i + 1})" for i in range(sheets)]
+
+
+def _write_xlsxwriter(frame, path, sheet_name, formats, changes):
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'remove_timezone': True,
+                                          'default_date_format': DATE_FORMAT})
+    try:
+        header = workbook.add_format({'bold': True})
+        cell_formats = {f: workbook.add_format({'num_format': f}) for f in set(formats.values())}
+        positive = workbook.add_format({'font_color': POSITIVE_COLOR})
+        negative = workbook.add_format({'font_color': NEGATIVE_COLOR})
+        positions = {c: i for i, c in enumerate(frame.columns)}
+        # Dates and times written by write_row take the workbook's default date format, not the column's
+        timestamps = [(i, cell_formats[formats[c]]) for c, i in positions.items()
+                      if c in formats and pd.api.types.is_datetime64_any_dtype(frame[c])]
+
+        sheets = iter(_sheet_names(sheet_name, len(frame)))
+        sheet, row = None, EXCEL_MAX_ROWS
+        for batch in _batches(frame):
+            for values in batch:
+                if row == EXCEL_MAX_ROWS:
+                    # constant_memory writes rows strictly in order, so formats and rules go in first
+                    sheet, row = workbook.add_worksheet(next(sheets)), 0
+                    for column, i in positions.items():
+                        sheet.set_column(i, i, max(10, len(str(column)) + 2), cell_formats.get(formats.get(column)))
+                    for column in changes:
+                        i = positions[column]
+                        sheet.conditional_format(1, i, EXCEL_MAX_ROWS, i,
+                                                 {'type': 'cell', 'criteria': '>', 'value': 0, 'format': positive})
+                        sheet.conditional_format(1, i, EXCEL_MAX_ROWS, i,
+                                                 {'type': 'cell', 'criteria': '<', 'value': 0, 'format': negative})
+                    sheet.write_row(0, 0, [str(c) for c in frame.columns], header)
+                    sheet.freeze_panes(1, 0)
+                row += 1
+                sheet.write_row(row, 0, values)
+                for i, cell_format in timestamps:
+                    if values[i] is not None:
+                        sheet.write_datetime(row, i, values[i], cell_format)
+        if sheet is None:
+            workbook.add_worksheet(sheet_name).write_row(0, 0, [str(c) for c in frame.columns], header)
+    finally:
+        workbook.close()
+
+
+def _write_openpyxl(frame, path, sheet_name, formats, changes):
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.formatting.rule import CellIsRule
+    from openpyxl.styles import Font
+    from openpyxl.utils import get_column_letter
+
+    workbook = Workbook(write_only=True)
+    letters = {c: get_column_letter(i + 1) for i, c in enumerate(frame.columns)}
+    column_formats = [formats.get(c) for c in frame.columns]
+
+    def new_sheet(title):
+        sheet = workbook.create_sheet(title)
+        for column in changes:
+            cells = f"{letters[column]}2:{letters[column]}{EXCEL_MAX_ROWS + 1}"
+            sheet.conditional_formatting.add(cells, CellIsRule(operator='greaterThan', formula=['0'],
+                                                               font=Font(color=POSITIVE_COLOR[1:])))
+            sheet.conditional_formatting.add(cells, CellIsRule(operator='lessThan', formula=['0'],
+                                                               font=Font(color=NEGATIVE_COLOR[1:])))
+        sheet.freeze_panes = 'A2'
+        header = []
+        for column in frame.columns:
+            cell = WriteOnlyCell(sheet, value=str(column))
+            cell.font = Font(bold=True)
+            header.append(cell)
+        sheet.append(header)
+        return sheet
+
+    sheets = iter(_sheet_names(sheet_name, len(frame)))
+    sheet, row = new_sheet(next(sheets)), 0
+    for batch in _batches(frame):
+        for values in batch:
+            if row == EXCEL_MAX_ROWS:
+                sheet, row = new_sheet(next(sheets)), 0
+            cells = []
+            for value, number_format in zip(values, column_formats):
+                if number_format is None or value is None:
+                    cells.append(value)
+                else:
+                    cell = WriteOnlyCell(sheet, value=value)
+                    cell.number_format = number_format
+                    cells.append(cell)
+            sheet.append(cells)
+            row += 1
+    workbook.save(path)
+
+
+def write_sidecar(frame, path, kind):
+    if kind == 'csv':
+        frame.to_csv(path, index=False)
+    elif kind == 'parquet':
+        # Periods (BillingMonth) have no Parquet type, they are stored as their YYYY-MM text
+        periods = [c for c in frame.columns if isinstance(frame[c].dtype, pd.PeriodDtype)]
+        frame.astype({c: str for c in periods}).to_parquet(path, index=False)
+    else:
+        raise ValueError(f"Unknown sidecar {kind}, expected one of {SIDECARS}")
+
+
+def export_report(frame, path, sheet_name='Sheet1', sidecars=(), formats=None, changes=None):
+    # Writes frame to the .xlsx at path in one pass, plus a <path stem>.<kind> file per sidecar.
+    # formats maps column -> Excel number format, changes lists the columns coloured by sign;
+    # both default to the conventions of the anomaly reports. Returns the paths written.
+    formats = number_formats(frame) if formats is None else formats
+    changes = change_columns(frame) if changes is None else changes
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    with span('export', path=path, rows=len(frame), columns=len(frame.columns)):
+        try:
+            import xlsxwriter  # noqa: F401
+            write = _write_xlsxwriter
+        except ImportError:
+            write = _write_openpyxl
+        write(frame, path, sheet_name, formats, changes)
+        written = [path]
+        for kind in sidecars:
+            sidecar_path = f"{os.path.splitext(path)[0]}.{kind}"
+            write_sidecar(frame, sidecar_path, kind)
+            written.append(sidecar_path)
+    count('rows_exported', len(frame))
+    return written
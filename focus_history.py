@@ -0,0 +1,29 @@
+# Monthly cost history for anomaly reports, computed once for every series instead of per anomaly.
+# The history is a single group-by on (keys, month) pivoted into wide columns named by full
+# year-month, e.g. 2024-10_Cost and 2024-10_PctChange, so multi-year histories never collide.
+
+MONTH_KEY = 'BillingMonth'
+
+
+def monthly_history(monthly, keys=('ServiceName', 'Region'), value='EffectiveCost'):
+    # monthly is a long frame of keys + BillingMonth + value, e.g. from
+    # aggregate_chunks(..., keys=['ServiceName', 'Region', 'BillingMonth'])
+    keys = list(keys)
+    monthly = monthly.sort_values(keys + [MONTH_KEY])
+    # Change against the previous month the series has data for
+    monthly['PctChange'] = monthly.groupby(keys, observed=True)[value].pct_change(fill_method=None) * 100
+    monthly['Cost'] = monthly[value].round(2)
+
+    wide = monthly.set_index(keys + [MONTH_KEY])[['Cost', 'PctChange']].unstack(MONTH_KEY)
+    months = sorted(wide.columns.get_level_values(1).unique())
+    wide = wide.reindex(columns=[(measure, month) for month in months for measure in ('Cost', 'PctChange')])
+    wide.columns = [f"{month}_{measure}" for measure, month in wide.columns]
+    return wide.reset_index()
+
+
+def add_monthly_history(anomalies, monthly, keys=('ServiceName', 'Region'), value='EffectiveCost'):
+    keys = list(keys)
+    wanted = monthly.merge(anomalies[keys].drop_duplicates(), on=keys)
+    if wanted.empty:
+        return anomalies
+    return anomalies.merge(monthly_history(wanted, keys, value), on=keys, how='left')
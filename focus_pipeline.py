@@ -0,0 +1,76 @@
+import gzip
+import io
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import pandas as pd
+
+from focus_stream import DEFAULT_CHUNKSIZE, aggregate_chunks, read_report_chunks
+
+# Download/parse pipeline for report objects.
+# A thread pool prefetches the next objects while a process pool gunzips and parses the ones already
+# downloaded, so network and CPU overlap and parsing scales with the number of cores.
+# Only compressed payloads are held between the stages and at most prefetch + processes of them
+# are in flight at once.
+#
+# Scripts that run the pipeline must keep their top-level code under `if __name__ == '__main__':`,
+# worker processes are spawned (not forked) on Windows and re-import the main module.
+
+DEFAULT_PREFETCH = 8
+
+
+def run_pipeline(names, fetch, process, prefetch=DEFAULT_PREFETCH, processes=None):
+    # fetch(name) -> payload runs in threads; process(name, payload) -> result runs in worker processes
+    # and must be picklable (a module-level function or a functools.partial of one).
+    # processes=0 parses in threads instead, for hosts where spawning processes is not possible.
+    # Yields (name, result, error) as each object completes.
+    processes = (os.cpu_count() or 1) if processes is None else processes
+    limit = prefetch + max(processes, 1)
+    names = iter(names)
+    downloading = {}
+    parsing = {}
+
+    parser_pool = ProcessPoolExecutor(processes) if processes else ThreadPoolExecutor(prefetch)
+    with ThreadPoolExecutor(prefetch) as fetch_pool, parser_pool:
+        exhausted = False
+        while True:
+            while not exhausted and len(downloading) + len(parsing) < limit:
+                name = next(names, None)
+                if name is None:
+                    exhausted = True
+                    break
+                downloading[fetch_pool.submit(fetch, name)] = name
+            if not downloading and not parsing:
+                return
+
+            done, _ = wait(list(downloading) + list(parsing), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in downloading:
+                    name = downloading.pop(future)
+                    try:
+                        payload = future.result()
+                    except Exception as e:
+                        yield name, None, e
+                        continue
+                    parsing[parser_pool.submit(process, name, payload)] = name
+                else:
+                    name = parsing.pop(future)
+                    try:
+                        yield name, future.result(), None
+                    except Exception as e:
+                        yield name, None, e
+
+
+def aggregate_payload(name, payload, keys, columns=None, start=None, end=None, filters=None,
+                      chunksize=DEFAULT_CHUNKSIZE):
+    # Worker side: returns only the per-group sums of one report, not its rows
+    with gzip.GzipFile(fileobj=io.BytesIO(payload)) as gz:
+        return aggregate_chunks(read_report_chunks(gz, columns=columns, chunksize=chunksize),
+                                keys, start=start, end=end, filters=filters)
+
+
+def combine_aggregates(frames, keys, value='EffectiveCost'):
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=list(keys) + [value])
+    return pd.concat(frames, ignore_index=True).groupby(keys, as_index=False, observed=True)[value].sum()
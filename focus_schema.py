@@ -0,0 +1,94 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Compact in-memory representation of FOCUS columns, shared by everything that builds DataFrames from
+# reports or from the cache.
+#  - timestamps: datetime64[ns, UTC], 8 bytes a value instead of a Python string
+#  - cost columns: float64, they are summed over millions of rows and must stay exact to the cent
+#  - quantities and unit prices: float32 for analysis in memory; frames that are stored (the Parquet
+#    cache, the database loader) are typed with stored=True and keep them float64
+#  - every other column: a categorical over one vocabulary per column shared by all files in the process.
+#    Categories are only ever appended, so a value keeps its code for the life of the process and frames
+#    from different files can be concatenated without falling back to object strings (see concat_frames).
+
+TIMESTAMP_COLUMNS = ['BillingPeriodStart', 'BillingPeriodEnd', 'ChargePeriodStart', 'ChargePeriodEnd']
+COST_COLUMNS = ['BilledCost', 'EffectiveCost', 'ListCost', 'ContractedCost']
+QUANTITY_COLUMNS = ['ListUnitPrice', 'ContractedUnitPrice', 'PricingQuantity', 'UsageQuantity']
+NUMERIC_COLUMNS = COST_COLUMNS + QUANTITY_COLUMNS
+
+
+class Vocabulary:
+    def __init__(self):
+        self.categories = {}
+        self.codes = {}
+        self.dtypes = {}
+        self._lock = threading.Lock()
+
+    def dtype(self, column):
+        with self._lock:
+            if column not in self.dtypes:
+                self.dtypes[column] = pd.CategoricalDtype(list(self.categories.get(column, [])))
+            return self.dtypes[column]
+
+    def encode(self, column, values):
+        # Factorize the chunk locally, then translate its few distinct values to vocabulary codes
+        local_codes, uniques = pd.factorize(values)
+        uniques = np.asarray(uniques, dtype=object).tolist()
+        with self._lock:
+            categories = self.categories.setdefault(column, [])
+            codes = self.codes.setdefault(column, {})
+            new = [v for v in uniques if v not in codes]
+            for value in new:
+                codes[value] = len(categories)
+                categories.append(value)
+            if new or column not in self.dtypes:
+                self.dtypes[column] = pd.CategoricalDtype(list(categories))
+            dtype = self.dtypes[column]
+            translate = np.array([codes[v] for v in uniques], dtype=np.int32)
+        mapped = np.where(local_codes >= 0, translate[np.maximum(local_codes, 0)] if len(translate) else -1, -1)
+        return pd.Series(pd.Categorical.from_codes(mapped, dtype=dtype), index=values.index, name=values.name)
+
+
+VOCABULARY = Vocabulary()
+
+
+def apply_schema(frame, vocabulary=VOCABULARY, stored=False):
+    # Types a frame of report or cache columns in place; columns already in their compact type are left alone.
+    # stored=True keeps the quantities float64, for frames that are written to the cache or a database.
+    quantity_dtype = np.float64 if stored else np.float32
+    for column in frame.columns:
+        values = frame[column]
+        if column in TIMESTAMP_COLUMNS:
+            if not isinstance(values.dtype, pd.DatetimeTZDtype):
+                frame[column] = pd.to_datetime(values, utc=True, errors='coerce', format='ISO8601')
+        elif column in COST_COLUMNS:
+            if values.dtype != np.float64:
+                frame[column] = pd.to_numeric(values, errors='coerce').astype(np.float64)
+        elif column in QUANTITY_COLUMNS:
+            if values.dtype != quantity_dtype:
+                frame[column] = pd.to_numeric(values, errors='coerce').astype(quantity_dtype)
+        elif not isinstance(values.dtype, pd.CategoricalDtype):
+            frame[column] = vocabulary.encode(column, values)
+    return frame
+
+
+def concat_frames(frames, vocabulary=VOCABULARY):
+    # Earlier frames carry a shorter category list of the same vocabulary; re-labelling their codes
+    # with the current list is free because existing codes never change
+    frames = [f for f in frames if len(f.columns)]
+    if not frames:
+        return pd.DataFrame()
+    aligned = []
+    for frame in frames:
+        frame = frame.copy(deep=False)
+        for column in frame.columns:
+            if isinstance(frame[column].dtype, pd.CategoricalDtype) and column in vocabulary.categories:
+                frame[column] = pd.Categorical.from_codes(frame[column].cat.codes, dtype=vocabulary.dtype(column))
+        aligned.append(frame)
+    return pd.concat(aligned, ignore_index=True)
+
+
+def memory_bytes(frame):
+    return int(frame.memory_usage(index=True, deep=True).sum())
@@ -0,0 +1,82 @@
+import gzip
+import os
+import sys
+import time
+
+import pandas as pd
+
+from focus_schema import apply_schema
+
+# Instrumentation ships with the copy-cost-reports function
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'copy-cost-reports'))
+from instrumentation import METRICS, TimedReader, count
+
+# Streaming, chunked reading of FOCUS reports with bounded memory.
+# Reports are decompressed incrementally straight from the HTTP body and parsed a chunk at a time,
+# reading only the columns asked for, and each chunk is converted to the compact types of focus_schema.py
+# as it is read. Aggregations fold each chunk into running partial sums, so peak memory depends on the
+# chunk size and the number of groups rather than on the size of the history.
+
+DEFAULT_CHUNKSIZE = 250_000
+REQUIRED_COLUMNS = ['BillingPeriodEnd', 'BillingPeriodStart', 'EffectiveCost', 'Region', 'ServiceName']
+
+# Group-by keys that are derived from BillingPeriodStart rather than read from the report
+DERIVED_KEYS = {
+    'BillingDay': lambda chunk: chunk['BillingPeriodStart'].dt.date,
+    'BillingMonth': lambda chunk: chunk['BillingPeriodStart'].dt.tz_localize(None).dt.to_period('M'),
+}
+
+
+def read_report_chunks(fileobj, columns=None, chunksize=DEFAULT_CHUNKSIZE, stored=False):
+    # Everything is read as text first and typed per chunk, so a malformed value
+    # becomes NaN/NaT instead of failing the whole report. stored: see apply_schema.
+    # Time spent inside the decompressor is recorded as 'decompress', the rest of the CSV and
+    # typing work as 'parse'; the consumer's time between chunks is not counted.
+    source = TimedReader(fileobj, 'decompress')
+    reader = pd.read_csv(source, usecols=columns, dtype=str, chunksize=chunksize)
+    with reader:
+        resumed, decompressed = time.perf_counter(), source.seconds
+        for i, chunk in enumerate(reader):
+            if i == 0:
+                wanted = columns or REQUIRED_COLUMNS
+                missing = [c for c in REQUIRED_COLUMNS if c in wanted and c not in chunk.columns]
+                if missing:
+                    raise ValueError(f"missing required columns {missing}")
+            chunk = apply_schema(chunk, stored=stored)
+            METRICS.observe('parse', time.perf_counter() - resumed - (source.seconds - decompressed))
+            count('rows_parsed', len(chunk))
+            yield chunk
+            resumed, decompressed = time.perf_counter(), source.seconds
+
+
+def stream_object_chunks(client, namespace, bucket, object_name, columns=None, chunksize=DEFAULT_CHUNKSIZE,
+                         stored=False):
+    object_details = client.get_object(namespace, bucket, object_name)
+    with gzip.GzipFile(fileobj=object_details.data.raw) as gz:
+        yield from read_report_chunks(gz, columns=columns, chunksize=chunksize, stored=stored)
+
+
+def aggregate_chunks(chunks, keys, value='EffectiveCost', start=None, end=None, filters=None):
+    # start/end are UTC timestamps on BillingPeriodStart (end exclusive), filters maps column -> value.
+    # value is one column or a list of columns to sum.
+    totals = None
+    for chunk in chunks:
+        started = time.perf_counter()
+        count('rows_aggregated', len(chunk))
+        mask = pd.Series(True, index=chunk.index)
+        if start is not None:
+            mask &= chunk['BillingPeriodStart'] >= start
+        if end is not None:
+            mask &= chunk['BillingPeriodStart'] < end
+        for column, wanted in (filters or {}).items():
+            mask &= chunk[column] == wanted
+        chunk = chunk[mask]
+        if not chunk.empty:
+            by = [DERIVED_KEYS[k](chunk).rename(k) if k in DERIVED_KEYS else chunk[k] for k in keys]
+            partial = chunk[value].groupby(by, observed=True).sum()
+            totals = partial if totals is None else totals.add(partial, fill_value=0)
+        METRICS.observe('aggregate', time.perf_counter() - started)
+
+    if totals is None:
+        return pd.DataFrame(columns=list(keys) + (value if isinstance(value, list) else [value]))
+    return totals.reset_index() if isinstance(value, list) else totals.rename(value).reset_index()
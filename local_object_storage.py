@@ -0,0 +1,231 @@
+import base64
+import hashlib
+import io
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+# Local stand-in for oci.object_storage.ObjectStorageClient.
+# Objects live on disk under <root>/<namespace>/<bucket>/<object name>, so the copy
+# functions and analysis scripts can be exercised without an OCI tenancy.
+# latency (seconds per call) and bandwidth (bytes per second per transfer) simulate the network
+# for benchmarks; both default to a local disk.
+
+
+class LocalServiceError(Exception):
+    def __init__(self, status, code, message):
+        super().__init__(f"{status} {code}: {message}")
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+def _throttle(size, bandwidth):
+    if bandwidth and size:
+        time.sleep(size / bandwidth)
+
+
+class _RawStream:
+    def __init__(self, path, bandwidth=None):
+        self._file = open(path, 'rb')
+        self._bandwidth = bandwidth
+
+    def stream(self, amt=1024 * 1024, decode_content=False):
+        try:
+            while True:
+                chunk = self.read(amt)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            self._file.close()
+
+    def read(self, amt=None, decode_content=False):
+        chunk = self._file.read(amt if amt is not None else -1)
+        _throttle(len(chunk), self._bandwidth)
+        return chunk
+
+    def close(self):
+        self._file.close()
+
+
+class _ObjectData:
+    # Mirrors the SDK response body: .content reads the whole object, .raw streams it
+    def __init__(self, path, bandwidth=None):
+        self.raw = _RawStream(path, bandwidth)
+
+    @property
+    def content(self):
+        return self.raw.read()
+
+
+def _md5(path):
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return base64.b64encode(digest.digest()).decode()
+
+
+class LocalObjectStorageClient:
+    def __init__(self, root, latency=0.0, bandwidth=None):
+        self.root = root
+        self.latency = latency
+        self.bandwidth = bandwidth
+        # In-flight uploads are staged outside the namespace tree so listings never see them
+        self._staging = os.path.join(root, '.uploads')
+
+    def _round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _path(self, namespace_name, bucket_name, object_name=''):
+        return os.path.join(self.root, namespace_name, bucket_name, *object_name.split('/'))
+
+    def _summary(self, namespace_name, bucket_name, object_name):
+        path = self._path(namespace_name, bucket_name, object_name)
+        stat = os.stat(path)
+        md5 = _md5(path)
+        return SimpleNamespace(
+            name=object_name,
+            size=stat.st_size,
+            md5=md5,
+            etag=md5,
+            time_created=datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+            time_modified=datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+        )
+
+    def list_objects(self, namespace_name, bucket_name, prefix=None, start=None, end=None,
+                     limit=1000, fields=None, **kwargs):
+        self._round_trip()
+        bucket_path = self._path(namespace_name, bucket_name)
+        names = []
+        for dirpath, _, filenames in os.walk(bucket_path):
+            for filename in filenames:
+                relative = os.path.relpath(os.path.join(dirpath, filename), bucket_path)
+                names.append(relative.replace(os.sep, '/'))
+        names.sort()
+
+        names = [n for n in names
+                 if (prefix is None or n.startswith(prefix))
+                 and (start is None or n >= start)
+                 and (end is None or n < end)]
+        page, rest = names[:limit], names[limit:]
+        data = SimpleNamespace(
+            objects=[self._summary(namespace_name, bucket_name, n) for n in page],
+            prefixes=[],
+            next_start_with=rest[0] if rest else None,
+        )
+        return SimpleNamespace(status=200, headers={}, data=data, next_page=None, has_next_page=False)
+
+    def head_object(self, namespace_name, bucket_name, object_name, **kwargs):
+        self._round_trip()
+        path = self._path(namespace_name, bucket_name, object_name)
+        if not os.path.exists(path):
+            raise LocalServiceError(404, 'ObjectNotFound', object_name)
+        summary = self._summary(namespace_name, bucket_name, object_name)
+        headers = {'etag': summary.etag, 'content-md5': summary.md5, 'content-length': str(summary.size)}
+        return SimpleNamespace(status=200, headers=headers, data=None)
+
+    def get_object(self, namespace_name, bucket_name, object_name, **kwargs):
+        self._round_trip()
+        path = self._path(namespace_name, bucket_name, object_name)
+        if not os.path.exists(path):
+            raise LocalServiceError(404, 'ObjectNotFound', object_name)
+        summary = self._summary(namespace_name, bucket_name, object_name)
+        headers = {'etag': summary.etag, 'content-md5': summary.md5, 'content-length': str(summary.size)}
+        return SimpleNamespace(status=200, headers=headers, data=_ObjectData(path, self.bandwidth))
+
+    def put_object(self, namespace_name, bucket_name, object_name, put_object_body, **kwargs):
+        self._round_trip()
+        path = self._path(namespace_name, bucket_name, object_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        if isinstance(put_object_body, (bytes, bytearray)):
+            put_object_body = io.BytesIO(put_object_body)
+        os.makedirs(self._staging, exist_ok=True)
+        tmp_path = os.path.join(self._staging, f"{threading.get_ident()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            for chunk in iter(lambda: put_object_body.read(1024 * 1024), b''):
+                f.write(chunk)
+                _throttle(len(chunk), self.bandwidth)
+        os.replace(tmp_path, path)
+        return SimpleNamespace(status=200, headers={'etag': _md5(path)}, data=None)
+
+    def delete_object(self, namespace_name, bucket_name, object_name, **kwargs):
+        self._round_trip()
+        path = self._path(namespace_name, bucket_name, object_name)
+        if not os.path.exists(path):
+            raise LocalServiceError(404, 'ObjectNotFound', object_name)
+        os.remove(path)
+        return SimpleNamespace(status=204, headers={}, data=None)
+
+    def create_multipart_upload(self, namespace_name, bucket_name, create_multipart_upload_details, **kwargs):
+        self._round_trip()
+        upload_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(self._staging, upload_id))
+        data = SimpleNamespace(upload_id=upload_id, namespace=namespace_name, bucket=bucket_name,
+                               object=create_multipart_upload_details.object)
+        return SimpleNamespace(status=200, headers={}, data=data)
+
+    def upload_part(self, namespace_name, bucket_name, object_name, upload_id, upload_part_num,
+                    upload_part_body, **kwargs):
+        self._round_trip()
+        upload_dir = os.path.join(self._staging, upload_id)
+        if not os.path.isdir(upload_dir):
+            raise LocalServiceError(404, 'NoSuchUpload', upload_id)
+        if isinstance(upload_part_body, (bytes, bytearray)):
+            upload_part_body = io.BytesIO(upload_part_body)
+        part_path = os.path.join(upload_dir, f"{upload_part_num:05d}")
+        with open(part_path, 'wb') as f:
+            shutil.copyfileobj(upload_part_body, f)
+        _throttle(os.path.getsize(part_path), self.bandwidth)
+        return SimpleNamespace(status=200, headers={'etag': _md5(part_path)}, data=None)
+
+    def commit_multipart_upload(self, namespace_name, bucket_name, object_name, upload_id,
+                                commit_multipart_upload_details, **kwargs):
+        self._round_trip()
+        upload_dir = os.path.join(self._staging, upload_id)
+        if not os.path.isdir(upload_dir):
+            raise LocalServiceError(404, 'NoSuchUpload', upload_id)
+        path = self._path(namespace_name, bucket_name, object_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        parts = sorted(commit_multipart_upload_details.parts_to_commit, key=lambda p: p.part_num)
+        tmp_path = os.path.join(upload_dir, 'assembled')
+        with open(tmp_path, 'wb') as out:
+            for part in parts:
+                part_path = os.path.join(upload_dir, f"{part.part_num:05d}")
+                if _md5(part_path) != part.etag:
+                    raise LocalServiceError(400, 'InvalidPart', f"etag mismatch for part {part.part_num}")
+                with open(part_path, 'rb') as f:
+                    shutil.copyfileobj(f, out)
+        os.replace(tmp_path, path)
+        shutil.rmtree(upload_dir)
+        return SimpleNamespace(status=200, headers={'etag': _md5(path)}, data=None)
+
+    def abort_multipart_upload(self, namespace_name, bucket_name, object_name, upload_id, **kwargs):
+        self._round_trip()
+        shutil.rmtree(os.path.join(self._staging, upload_id), ignore_errors=True)
+        return SimpleNamespace(status=204, headers={}, data=None)
+
+    def copy_object(self, namespace_name, bucket_name, copy_object_details, **kwargs):
+        self._round_trip()
+        # Completes synchronously; the work request is reported as done straight away
+        source = self._path(namespace_name, bucket_name, copy_object_details.source_object_name)
+        if not os.path.exists(source):
+            raise LocalServiceError(404, 'ObjectNotFound', copy_object_details.source_object_name)
+        destination = self._path(copy_object_details.destination_namespace,
+                                 copy_object_details.destination_bucket,
+                                 copy_object_details.destination_object_name)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.copyfile(source, destination)
+        return SimpleNamespace(status=202, headers={'opc-work-request-id': f"local-{uuid.uuid4().hex}"}, data=None)
+
+    def get_work_request(self, work_request_id, **kwargs):
+        self._round_trip()
+        return SimpleNamespace(status=200, headers={}, data=SimpleNamespace(id=work_request_id, status='COMPLETED'))
@@ -1,115 +1,116 @@
+import argparse
+import os
+import sys
+
 import oci
 import pandas as pd
-import gzip
-import io
 from scipy import stats
 import numpy as np
-from openpyxl import load_workbook
-from openpyxl.styles import Font, PatternFill
-
-# OCI configuration
-config = oci.config.from_file()
-object_storage = oci.object_storage.ObjectStorageClient(config)
-
-namespace_name = 'ociateam'
-bucket_name = 'cost_and_usage_reports'
-
-object_list = object_storage.list_objects(namespace_name, bucket_name)
-objects = object_list.data.objects
-
-dataframes = []
-missing_column_files = []
-
-for obj in objects:
-    object_name = obj.name
-    
-    # Process only files with a .gz extension
-    if not object_name.endswith('.gz'):
-        print(f"Skipping non-gz file: {object_name}")
-        continue
-
-    obj_data = object_storage.get_object(namespace_name, bucket_name, object_name)
-    print(f"Processing Object {object_name}")
-    
-    # Read and process the .gz file
-    with gzip.GzipFile(fileobj=io.BytesIO(obj_data.data.content)) as gz:
-        try:
-            df = pd.read_csv(gz, low_memory=False, usecols=['BillingPeriodEnd', 'BillingPeriodStart', 'EffectiveCost', 'Region', 'ServiceName'])
-
-            # Optimize data types
-            df['BillingPeriodStart'] = pd.to_datetime(df['BillingPeriodStart'], utc=True, errors='coerce')
-            df['BillingPeriodEnd'] = pd.to_datetime(df['BillingPeriodEnd'], utc=True, errors='coerce')
-            df['EffectiveCost'] = pd.to_numeric(df['EffectiveCost'], errors='coerce')
-            df['Region'] = df['Region'].astype('category')
-            df['ServiceName'] = df['ServiceName'].astype('category')
-            
-            # Check for required columns
-            if df.columns.isin(['BillingPeriodEnd', 'BillingPeriodStart', 'EffectiveCost', 'Region', 'ServiceName']).all():
-                dataframes.append(df)
-            else:
-                print(f"Missing required columns in file: {object_name}")
-                missing_column_files.append(object_name)
-                
-        except Exception as e:
-            print(f"Error processing file {object_name}: {e}")
-            missing_column_files.append(object_name)
-
-# Display files missing required columns
-if missing_column_files:
-    for file_name in missing_column_files:
-        print(f"File with missing columns or error: {file_name}")
-
-# Continue with further processing if valid data is found
-if dataframes:
-    final_df = pd.concat(dataframes, ignore_index=True)
-    
-    # Filter rows within the last 120 days
-    current_time_utc = pd.Timestamp.now(tz='UTC')
-    filtered_df = final_df.query("BillingPeriodStart >= @current_time_utc - pd.Timedelta(days=120)")
 
-    # Proceed with further processing only if filtered_df is not empty
-    if not filtered_df.empty:
-        grouped_data = filtered_df.groupby(['ServiceName', 'Region'], as_index=False)['EffectiveCost'].sum()
+# Instrumentation ships with the copy-cost-reports function
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'copy-cost-reports'))
+from instrumentation import install, span
+
+from anomaly_window import DEFAULT_DAYS, AnomalyWindow, first_day
+from focus_cache import iter_cache, refresh_cache
+from focus_cube import update_cube
+from focus_export import export_report
+from focus_history import add_monthly_history
+from focus_stream import aggregate_chunks
+
+
+def window_zscores(focus_cache_dir, window_start):
+    # Sum the window per service and region chunk by chunk, only the group totals are kept in memory,
+    # and score every total against the others
+    chunks = iter_cache(focus_cache_dir, columns=['BillingPeriodStart', 'EffectiveCost', 'Region', 'ServiceName'],
+                        start=window_start.date())
+    grouped_data = aggregate_chunks(chunks, keys=['ServiceName', 'Region'], start=window_start)
+    if not grouped_data.empty:
         grouped_data['z_score'] = stats.zscore(grouped_data['EffectiveCost'])
-
-        anomalies = grouped_data[np.abs(grouped_data['z_score']) > 3]
-
-        # Processing anomalies further if they exist
-        if not anomalies.empty:
-            for index, row in anomalies.iterrows():
-                service = row['ServiceName']
-                region = row['Region']
-                historical_data = final_df[(final_df['ServiceName'] == service) & (final_df['Region'] == region)]
-                historical_data['month'] = historical_data['BillingPeriodStart'].dt.to_period('M')
-                monthly_cost = historical_data.groupby('month')['EffectiveCost'].sum().reset_index()
-                monthly_cost['pct_change'] = monthly_cost['EffectiveCost'].pct_change() * 100
-
-                for i, month in enumerate(monthly_cost['month'].unique()):
-                    month_cost = monthly_cost.loc[monthly_cost['month'] == month, 'EffectiveCost'].values[0]
-                    pct_change = monthly_cost.loc[monthly_cost['month'] == month, 'pct_change'].values[0]
-                    anomalies.loc[index, f"{month.strftime('%b')}_Cost"] = f"{month_cost:.2f}"
-                    anomalies.loc[index, f"{month.strftime('%b')}_PctChange"] = pct_change
-
-            # Save to Excel and apply conditional formatting
-            anomaly_output_file = r'C:\Security\Blogs\Cost and Usage\Logs\usage_anomalies_with_history.xlsx'
-            anomalies.to_excel(anomaly_output_file, index=False)
-
-            # Apply conditional formatting in Excel
-            wb = load_workbook(anomaly_output_file)
-            ws = wb.active
-
-            for col in ws.iter_cols(min_col=ws.max_column - len(monthly_cost['month'].unique()) + 1, max_col=ws.max_column):
-                for cell in col:
-                    if isinstance(cell.value, (int, float)):
-                        if cell.value > 0:
-                            cell.font = Font(color="00FF00")  # Green for positive
-                        elif cell.value < 0:
-                            cell.font = Font(color="FF0000")  # Red for negative
-
-            wb.save(anomaly_output_file)
-
-            print(f"Anomalies with historical data and formatting saved to: {anomaly_output_file}")
-        else:
+    return grouped_data
+
+# Parsing runs in worker processes, which re-import this module on Windows
+if __name__ == '__main__':
+    # JSON logs, a metrics summary at exit and FOCUS_PROFILE=cprofile|tracemalloc profiling
+    install('main')
+
+    parser = argparse.ArgumentParser(description='Flag services and regions whose 120-day cost is an outlier')
+    parser.add_argument('--incremental', action='store_true',
+                        help='update the persisted window with only the changed and new days instead of re-reading it')
+    parser.add_argument('--state', default=r'C:\Security\Blogs\Cost and Usage\Reports\anomaly_window',
+                        help='directory of the persisted window used by --incremental')
+    args = parser.parse_args()
+
+    # OCI configuration
+    config = oci.config.from_file()
+    object_storage = oci.object_storage.ObjectStorageClient(config)
+
+    namespace_name = 'ociateam'
+    bucket_name = 'cost_and_usage_reports'
+    report_prefix = 'FOCUS Reports'
+    focus_cache_dir = r'C:\Security\Blogs\Cost and Usage\Reports\focus_cache'
+    cube_path = r'C:\Security\Blogs\Cost and Usage\Reports\focus_cube.parquet'
+    anomaly_output_file = r'C:\Security\Blogs\Cost and Usage\Logs\usage_anomalies_with_history.xlsx'
+    # Copies of the anomaly report next to the workbook, e.g. ('csv', 'parquet')
+    anomaly_sidecars = ()
+
+    # Only report days inside the 120-day window are listed and downloaded,
+    # and of those only the ones that are new or changed are parsed into the local columnar cache
+    # The window is the last 120 whole UTC days up to today, the same days --incremental keeps
+    current_time_utc = pd.Timestamp.now(tz='UTC')
+    window_start = pd.Timestamp(first_day(current_time_utc.date(), DEFAULT_DAYS), tz='UTC')
+    refresh = refresh_cache(object_storage, namespace_name, bucket_name, focus_cache_dir,
+                            prefix=report_prefix, start=window_start.date())
+    missing_column_files = list(refresh.failed)
+
+    # Display files missing required columns
+    if missing_column_files:
+        for file_name in missing_column_files:
+            print(f"File with missing columns or error: {file_name}")
+
+    if args.incremental:
+        # The cost cube holds the per-(day, service, region) totals; only the days whose partitions changed
+        # since the cube was built are re-aggregated, whichever script refreshed the cache, and the window
+        # reads just those and the day that entered it
+        cube = update_cube(focus_cache_dir, cube_path, days=refresh.days)
+        window = AnomalyWindow.open(args.state)
+        with span('detect'):
+            result = window.update(cube, cube.updated)
+        window.save(args.state)
+        print(f"Read {result.days_read} day(s), {len(result.affected)} series changed, "
+              f"{len(result.anomalies)} anomalies")
+
+        if not result.changed and os.path.exists(anomaly_output_file):
+            print(f"Anomalies unchanged, {anomaly_output_file} left as is")
+        elif result.anomalies.empty:
             print("No anomalies found after filtering.")
+        else:
+            monthly_cost = cube.query(group_by=['ServiceName', 'Region', 'BillingMonth'])
+            anomalies = add_monthly_history(result.anomalies, monthly_cost)
+            export_report(anomalies, anomaly_output_file, sheet_name='Anomalies', sidecars=anomaly_sidecars)
+            print(f"Anomalies with historical data and formatting saved to: {anomaly_output_file}")
     else:
-        print("No valid data found within the last 120 days.")
+        with span('detect'):
+            grouped_data = window_zscores(focus_cache_dir, window_start)
+
+        # Proceed with further processing only if the window has data
+        if not grouped_data.empty:
+            anomalies = grouped_data[np.abs(grouped_data['z_score']) > 3]
+
+            # Processing anomalies further if they exist
+            if not anomalies.empty:
+                # Monthly totals for every series in one streaming pass over the cache, joined onto the anomalies
+                # as <YYYY-MM>_Cost / <YYYY-MM>_PctChange columns. Months before the window come from earlier runs.
+                chunks = iter_cache(focus_cache_dir, columns=['BillingPeriodStart', 'EffectiveCost', 'Region', 'ServiceName'])
+                monthly_cost = aggregate_chunks(chunks, keys=['ServiceName', 'Region', 'BillingMonth'])
+                anomalies = add_monthly_history(anomalies, monthly_cost)
+
+                # Save to Excel in one pass, the month-over-month change columns are coloured
+                # green/red by conditional formatting rules written with the sheet
+                export_report(anomalies, anomaly_output_file, sheet_name='Anomalies', sidecars=anomaly_sidecars)
+
+                print(f"Anomalies with historical data and formatting saved to: {anomaly_output_file}")
+            else:
+                print("No anomalies found after filtering.")
+        else:
+            print("No valid data found within the last 120 days.")
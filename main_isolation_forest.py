@@ -1,92 +1,84 @@
+import argparse
+import os
+import sys
+
 import oci
 import pandas as pd
-import gzip
-import io
-from sklearn.ensemble import IsolationForest
-import numpy as np
-from openpyxl import load_workbook
-from openpyxl.styles import Font
-
-# OCI configuration
-config = oci.config.from_file()
-object_storage = oci.object_storage.ObjectStorageClient(config)
-
-namespace_name = 'ociateam'
-bucket_name = 'cost_and_usage_reports'
-
-object_list = object_storage.list_objects(namespace_name, bucket_name)
-objects = object_list.data.objects
-
-dataframes = []
-missing_column_files = []
-
-for obj in objects:
-    object_name = obj.name
-    obj_data = object_storage.get_object(namespace_name, bucket_name, object_name)
-    print(f"Processing Object {object_name}")
-    with gzip.GzipFile(fileobj=io.BytesIO(obj_data.data.content)) as gz:
-        df = pd.read_csv(gz, low_memory=False)
-        
-        required_columns = ['BillingPeriodEnd', 'BillingPeriodStart', 'EffectiveCost', 'Region', 'ServiceName']
-        if all(col in df.columns for col in required_columns):
-            dataframes.append(df)
-        else:
-            missing_column_files.append(object_name)
-
-if missing_column_files:
-    for file_name in missing_column_files:
-        print(file_name)
-
-if dataframes:
-    final_df = pd.concat(dataframes, ignore_index=True)
-    final_df['BillingPeriodStart'] = pd.to_datetime(final_df['BillingPeriodStart'], utc=True, errors='coerce')
-    final_df['BillingPeriodEnd'] = pd.to_datetime(final_df['BillingPeriodEnd'], utc=True, errors='coerce')
 
+# Instrumentation ships with the copy-cost-reports function
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'copy-cost-reports'))
+from instrumentation import install, span
+
+from anomaly_forest import DEFAULT_MAX_AGE, build_features, daily_rows, load_or_fit, score_features
+from focus_cache import iter_cache, refresh_cache
+from focus_export import export_report
+from focus_history import add_monthly_history
+from focus_stream import aggregate_chunks
+
+# Parsing runs in worker processes, which re-import this module on Windows
+if __name__ == '__main__':
+    # JSON logs, a metrics summary at exit and FOCUS_PROFILE=cprofile|tracemalloc profiling
+    install('main_isolation_forest')
+
+    parser = argparse.ArgumentParser(description='Flag services and regions whose last 120 days look unusual')
+    parser.add_argument('--model', default=r'C:\Security\Blogs\Cost and Usage\Reports\isolation_forest.joblib',
+                        help='fitted model, reused by later runs until it is older than --max-age days')
+    parser.add_argument('--max-age', type=int, default=DEFAULT_MAX_AGE)
+    parser.add_argument('--retrain', action='store_true', help='refit the model even if the saved one is fresh')
+    parser.add_argument('--jobs', type=int, default=None, help='worker processes scoring the series, all cores by default')
+    args = parser.parse_args()
+
+    # OCI configuration
+    config = oci.config.from_file()
+    object_storage = oci.object_storage.ObjectStorageClient(config)
+
+    namespace_name = 'ociateam'
+    bucket_name = 'cost_and_usage_reports'
+    report_prefix = 'FOCUS Reports'
+    focus_cache_dir = r'C:\Security\Blogs\Cost and Usage\Reports\focus_cache'
+    # Copies of the anomaly report next to the workbook, e.g. ('csv', 'parquet')
+    anomaly_sidecars = ()
+
+    # Only report days inside the 120-day window are listed and downloaded,
+    # and of those only the ones that are new or changed are parsed into the local columnar cache
     current_time_utc = pd.Timestamp.now(tz='UTC')
-    last_120_days = final_df[final_df['BillingPeriodStart'] >= current_time_utc - pd.Timedelta(days=120)]
-
-    # Group by Service and Region for cost analysis
-    grouped_data = last_120_days.groupby(['ServiceName', 'Region'])['EffectiveCost'].sum().reset_index()
-
-    # Anomaly detection with Isolation Forest
-    model = IsolationForest(contamination=0.05, random_state=42)
-    grouped_data['anomaly'] = model.fit_predict(grouped_data[['EffectiveCost']])
-    anomalies = grouped_data[grouped_data['anomaly'] == -1]
-
-    # Adding monthly history and percentage change for each anomaly
-    for index, row in anomalies.iterrows():
-        service = row['ServiceName']
-        region = row['Region']
-        historical_data = final_df[(final_df['ServiceName'] == service) & (final_df['Region'] == region)]
-        historical_data['month'] = historical_data['BillingPeriodStart'].dt.to_period('M')
-        monthly_cost = historical_data.groupby('month')['EffectiveCost'].sum().reset_index()
-        monthly_cost['pct_change'] = monthly_cost['EffectiveCost'].pct_change() * 100
-
-        for i, month in enumerate(monthly_cost['month'].unique()):
-            month_cost = monthly_cost.loc[monthly_cost['month'] == month, 'EffectiveCost'].values[0]
-            pct_change = monthly_cost.loc[monthly_cost['month'] == month, 'pct_change'].values[0]
-            anomalies.loc[index, f"{month.strftime('%b')}_Cost"] = f"{month_cost:.2f}"
-            anomalies.loc[index, f"{month.strftime('%b')}_PctChange"] = pct_change
-
-    # Save anomalies to Excel with conditional formatting
-    anomaly_output_file = r'C:\Security\Blogs\Cost and Usage\Logs\isolation_usage_anomalies_with_history.xlsx'
-    anomalies.to_excel(anomaly_output_file, index=False)
-
-    # Apply conditional formatting in Excel
-    wb = load_workbook(anomaly_output_file)
-    ws = wb.active
-
-    # Apply color formatting for percentage change columns
-    for col in ws.iter_cols(min_col=ws.max_column - len(monthly_cost['month'].unique()), max_col=ws.max_column):
-        for cell in col:
-            if isinstance(cell.value, (int, float)):
-                if cell.value > 0:
-                    cell.font = Font(color="00FF00")  # Green for positive
-                elif cell.value < 0:
-                    cell.font = Font(color="FF0000")  # Red for negative
-
-    wb.save(anomaly_output_file)
-
-    print(f"Anomalies with historical data and formatting saved to: {anomaly_output_file}")
-else:
-    print("No valid data found with required columns.")
+    window_start = current_time_utc - pd.Timedelta(days=120)
+    refresh = refresh_cache(object_storage, namespace_name, bucket_name, focus_cache_dir,
+                            prefix=report_prefix, start=window_start.date())
+    missing_column_files = list(refresh.failed)
+
+    if missing_column_files:
+        for file_name in missing_column_files:
+            print(file_name)
+
+    # Daily cost per service, region and SKU over the last 120 whole days in one pass over the cache,
+    # turned into per-series features (mean, trend, week-over-week change, volatility, SKU mix).
+    # The window ends before today, whose reports are still arriving and would read as a drop in cost
+    keys = ['ServiceName', 'Region']
+    series_end = current_time_utc.date()
+    series_start = series_end - pd.Timedelta(days=120)
+    daily_cost = daily_rows(focus_cache_dir, keys, series_start, series_end)
+    features = build_features(daily_cost, keys, series_start, series_end)
+
+    if not features.empty:
+
+        # Anomaly detection with Isolation Forest, fitted once and reused by the daily runs in between
+        with span('detect', series=len(features)):
+            model = load_or_fit(args.model, features, max_age=args.max_age, retrain=args.retrain)
+            scored = score_features(model, args.model, features, n_jobs=args.jobs)
+            anomalies = scored[scored['is_anomaly']].drop(columns='is_anomaly')
+            anomalies = anomalies.sort_values('anomaly_score', ascending=False)
+
+        # Adding monthly history and percentage change for each anomaly, computed for all series at once.
+        # Months before the window come from earlier runs.
+        chunks = iter_cache(focus_cache_dir, columns=['BillingPeriodStart', 'EffectiveCost', 'Region', 'ServiceName'])
+        monthly_cost = aggregate_chunks(chunks, keys=['ServiceName', 'Region', 'BillingMonth'])
+        anomalies = add_monthly_history(anomalies, monthly_cost)
+
+        # Save anomalies to Excel in one pass, with conditional formatting rules for the percentage change columns
+        anomaly_output_file = r'C:\Security\Blogs\Cost and Usage\Logs\isolation_usage_anomalies_with_history.xlsx'
+        export_report(anomalies, anomaly_output_file, sheet_name='Anomalies', sidecars=anomaly_sidecars)
+
+        print(f"Anomalies with historical data and formatting saved to: {anomaly_output_file}")
+    else:
+        print("No valid data found within the last 120 days.")
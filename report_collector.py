@@ -0,0 +1,414 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+
+# The copy engine, sync manifest and report selection ship with the copy-cost-reports function
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'copy-cost-reports'))
+from copy_engine import CopyEngine, create_object_storage_client
+from instrumentation import install, log_event, span
+from report_selection import select_reports
+from sync_manifest import REPORT_PREFIX, LocalManifestStore, SyncManifest
+
+from usage_fetcher import RateLimiter
+
+# Config-driven report collection for many tenancies in one run.
+# Every tenancy gets a plan job (list its reports, diff them against its manifest), copy jobs of up to
+# --batch-size report parts into the destination bucket and, when a cache_dir is configured, an ingest job
+# that parses the copied reports into that local cache (focus_cache.py). Jobs of all tenancies share one
+# worker pool and are handed out round-robin across tenancies, each tenancy limited to --per-tenancy jobs
+# at a time and to its own Object Storage request rate, so a tenancy with a long backlog cannot starve
+# the others or trip their throttling limits.
+# Each copied batch is checkpointed into the tenancy's manifest under --state; an interrupted or
+# --deadline-limited run is resumed by running it again, already copied parts are not copied twice.
+# progress.json in the state directory shows where every tenancy stands.
+#
+# Config (JSON), every tenancy entry may override the defaults and its destination:
+# {
+#   "destination": {"profile": "DEFAULT", "namespace": "ociateam", "bucket": "cost_and_usage_reports", "rate": 20},
+#   "defaults": {"source_namespace": "bling", "prefix": "FOCUS Reports", "since_days": 10, "rate": 10,
+#                "copy_workers": 4},
+#   "tenancies": [
+#     {"name": "prod", "profile": "PROD", "destination": {"prefix": "prod/"},
+#      "cache_dir": "C:\\Reports\\prod\\focus_cache"},
+#     {"name": "dev", "profile": "DEV", "tenancy": "ocid1.tenancy.oc1..", "destination": {"prefix": "dev/"}}
+#   ]
+# }
+# The source bucket is the tenancy OCID ("tenancy", or the tenancy of the profile). Copies run with the
+# tenancy's profile, which needs write access to the destination; ingest reads the destination with the
+# destination profile.
+
+DEFAULTS = {
+    'source_namespace': 'bling',
+    'prefix': REPORT_PREFIX,
+    'since_days': 10,
+    'rate': 10.0,
+    'copy_workers': 4,
+}
+DESTINATION_DEFAULTS = {'profile': 'DEFAULT', 'namespace': 'ociateam', 'bucket': 'cost_and_usage_reports',
+                        'prefix': '', 'rate': 20.0}
+DEFAULT_WORKERS = 8
+DEFAULT_PER_TENANCY = 2
+DEFAULT_BATCH_SIZE = 50
+STATE_DIR = r'C:\Security\Blogs\Cost and Usage\Reports\collector'
+PROGRESS_FILE = 'progress.json'
+
+
+@dataclass
+class Tenancy:
+    name: str
+    profile: str
+    source_namespace: str
+    prefix: str
+    since_days: int
+    rate: float
+    copy_workers: int
+    destination: dict
+    tenancy: str = None
+    cache_dir: str = None
+
+    @property
+    def destination_key(self):
+        return self.destination['namespace'], self.destination['bucket'], self.destination['prefix']
+
+
+def load_config(path):
+    with open(path) as f:
+        config = json.load(f)
+    defaults = {**DEFAULTS, **config.get('defaults', {})}
+    destination = {**DESTINATION_DEFAULTS, **config.get('destination', {})}
+
+    tenancies = []
+    for entry in config['tenancies']:
+        entry = {**defaults, **entry, 'destination': {**destination, **entry.get('destination', {})}}
+        entry.setdefault('profile', entry['name'])
+        tenancies.append(Tenancy(**entry))
+
+    names = Counter(t.name for t in tenancies)
+    targets = Counter(t.destination_key for t in tenancies)
+    duplicated = [n for n, c in names.items() if c > 1] + [f"{k[1]}/{k[2]}" for k, c in targets.items() if c > 1]
+    if duplicated:
+        raise ValueError(f"tenancy names and destination bucket/prefix pairs must be unique: {duplicated}")
+    return tenancies
+
+
+class RateLimitedClient:
+    # Every request through the client first takes a token from the limiter of the tenancy it belongs to
+    def __init__(self, client, limiter):
+        self.client = client
+        self.limiter = limiter
+
+    def __getattr__(self, name):
+        attribute = getattr(self.client, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            self.limiter.acquire()
+            return attribute(*args, **kwargs)
+        return call
+
+
+def oci_client(profile, pool_size):
+    import oci
+
+    config = oci.config.from_file(oci.config.DEFAULT_LOCATION, profile)
+    return create_object_storage_client(config=config, pool_size=pool_size), config
+
+
+@dataclass
+class Job:
+    tenancy: str
+    kind: str
+    run: object
+    description: str = ''
+
+
+class FairScheduler:
+    # Jobs queue per tenancy. A free worker takes the next job of the next tenancy in turn that is below
+    # its per-tenancy limit (and below the limit of the job's kind, e.g. one ingest at a time), so all
+    # tenancies progress together. Jobs may submit follow-up jobs while they run.
+    # After the deadline no new job starts; queued jobs are returned as deferred.
+    def __init__(self, workers=DEFAULT_WORKERS, per_tenancy=DEFAULT_PER_TENANCY, kind_limits=None, deadline=None,
+                 on_done=None):
+        self.workers = max(1, workers)
+        self.per_tenancy = max(1, per_tenancy)
+        self.kind_limits = kind_limits or {}
+        self.deadline = deadline
+        self.on_done = on_done
+        self._queues = {}
+        self._turn = 0
+        self._lock = threading.Lock()
+        self._running = Counter()
+        self._running_kinds = Counter()
+
+    def submit(self, job):
+        with self._lock:
+            self._queues.setdefault(job.tenancy, deque()).append(job)
+
+    def _next(self):
+        tenancies = list(self._queues)
+        for offset in range(len(tenancies)):
+            tenancy = tenancies[(self._turn + offset) % len(tenancies)]
+            queue = self._queues[tenancy]
+            if not queue or self._running[tenancy] >= self.per_tenancy:
+                continue
+            for job in queue:
+                if self._running_kinds[job.kind] < self.kind_limits.get(job.kind, self.workers):
+                    queue.remove(job)
+                    self._turn = (self._turn + offset + 1) % len(tenancies)
+                    self._running[tenancy] += 1
+                    self._running_kinds[job.kind] += 1
+                    return job
+        return None
+
+    def run(self):
+        running = {}
+        with ThreadPoolExecutor(self.workers) as pool:
+            while True:
+                with self._lock:
+                    while len(running) < self.workers and not self.expired():
+                        job = self._next()
+                        if job is None:
+                            break
+                        running[pool.submit(job.run)] = job
+                if not running:
+                    break
+
+                # The timeout picks up jobs submitted by running jobs while no other job has finished
+                done, _ = wait(list(running), timeout=1.0, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = running.pop(future)
+                    with self._lock:
+                        self._running[job.tenancy] -= 1
+                        self._running_kinds[job.kind] -= 1
+                    if self.on_done:
+                        self.on_done(job, future.exception())
+
+        with self._lock:
+            deferred = [job for queue in self._queues.values() for job in queue]
+            self._queues.clear()
+        return deferred
+
+    def expired(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+
+@dataclass
+class TenancyProgress:
+    status: str = 'queued'
+    since: str = None
+    listed: int = 0
+    pending: int = 0
+    copied: int = 0
+    bytes: int = 0
+    failed: list = field(default_factory=list)
+    batches_left: int = 0
+    ingested: int = None
+    errors: list = field(default_factory=list)
+    updated: str = None
+
+
+class Collector:
+    def __init__(self, tenancies, state_dir=STATE_DIR, workers=DEFAULT_WORKERS, per_tenancy=DEFAULT_PER_TENANCY,
+                 batch_size=DEFAULT_BATCH_SIZE, since=None, ingest=True, dry_run=False, deadline=None,
+                 client_factory=oci_client):
+        self.tenancies = {t.name: t for t in tenancies}
+        self.state_dir = state_dir
+        self.batch_size = max(1, batch_size)
+        self.since = since
+        self.ingest = ingest
+        self.dry_run = dry_run
+        self.client_factory = client_factory
+        self.progress = {t.name: TenancyProgress() for t in tenancies}
+        self.previous = self._load_progress()
+        self.manifests = {}
+        self._clients = {}
+        self._lock = threading.Lock()
+        # CPU-bound parsing runs one tenancy at a time, its worker processes already use every core
+        self.scheduler = FairScheduler(workers, per_tenancy, kind_limits={'ingest': 1},
+                                       deadline=time.monotonic() + deadline * 60 if deadline else None,
+                                       on_done=self._job_done)
+
+    def client(self, profile, rate, pool_size):
+        # One client and one rate limiter per profile, shared by every job that uses the profile
+        with self._lock:
+            if profile not in self._clients:
+                client, config = self.client_factory(profile, pool_size)
+                self._clients[profile] = (RateLimitedClient(client, RateLimiter(rate, burst=max(1, int(rate)))), config)
+            return self._clients[profile]
+
+    def run(self):
+        os.makedirs(self.state_dir, exist_ok=True)
+        for name in self.tenancies:
+            self.scheduler.submit(Job(name, 'plan', lambda name=name: self.plan(name), 'plan'))
+        deferred = self.scheduler.run()
+        for job in deferred:
+            progress = self.progress[job.tenancy]
+            progress.status = 'deferred'
+            progress.errors.append(f"{job.description} not started before the deadline")
+        self.save_progress()
+        return self.progress, deferred
+
+    def plan(self, name):
+        tenancy = self.tenancies[name]
+        progress = self.progress[name]
+        progress.status = 'planning'
+        client, config = self.client(tenancy.profile, tenancy.rate, tenancy.copy_workers)
+        manifest = SyncManifest(LocalManifestStore(os.path.join(self.state_dir, f"{name}.manifest.json")))
+        self.manifests[name] = manifest
+
+        since = (self.since or self._resume_since(name) or manifest.since()
+                 or datetime.now(timezone.utc).date() - timedelta(days=tenancy.since_days))
+        source_bucket = tenancy.tenancy or config['tenancy']
+        with span('collect_plan', tenancy=name):
+            selection = select_reports(client, tenancy.source_namespace, source_bucket, prefix=tenancy.prefix, start=since)
+        plan = selection.narrowed(manifest.pending(selection.objects))
+        progress.since = since.isoformat()
+        progress.listed = len(selection.objects)
+        progress.pending = len(plan.objects)
+        log_event('tenancy_planned', tenancy=name, since=since, listed=progress.listed, pending=progress.pending,
+                  mb=round(plan.bytes / (1024 * 1024), 1))
+        if self.dry_run:
+            print(f"[{name}] {plan.describe()}")
+            progress.status = 'planned'
+            return
+
+        batches = [plan.objects[i:i + self.batch_size] for i in range(0, len(plan.objects), self.batch_size)]
+        progress.batches_left = len(batches)
+        progress.status = 'copying'
+        for number, batch in enumerate(batches, start=1):
+            self.scheduler.submit(Job(name, 'copy', lambda batch=batch: self.copy(name, source_bucket, batch),
+                                      f"copy batch {number}/{len(batches)}"))
+        if not batches:
+            self._copied_all(name, since)
+
+    def copy(self, name, source_bucket, batch):
+        tenancy = self.tenancies[name]
+        progress = self.progress[name]
+        destination = tenancy.destination
+        client, config = self.client(tenancy.profile, tenancy.rate, tenancy.copy_workers)
+        engine = CopyEngine(client, workers=tenancy.copy_workers, destination_region=config.get('region'))
+        with span('collect_copy', tenancy=name, objects=len(batch)):
+            summary = engine.copy(tenancy.source_namespace, source_bucket, destination['namespace'],
+                                  destination['bucket'], batch,
+                                  destination_name=lambda object_name: destination['prefix'] + object_name)
+
+        # Checkpoint: the batch's copied parts are recorded before the next batch starts
+        manifest = self.manifests[name]
+        manifest.record(batch, summary)
+        manifest.save()
+
+        with self._lock:
+            progress.copied += len(summary.copied)
+            progress.bytes += summary.bytes
+            progress.failed.extend(r.source_name for r in summary.failed)
+            progress.batches_left -= 1
+            last = progress.batches_left == 0
+        if last:
+            self._copied_all(name, date.fromisoformat(progress.since))
+
+    def _copied_all(self, name, since):
+        tenancy = self.tenancies[name]
+        if self.ingest and tenancy.cache_dir:
+            self.progress[name].status = 'ingesting'
+            self.scheduler.submit(Job(name, 'ingest', lambda: self.ingest_reports(name, since), 'ingest'))
+        else:
+            self._finish(name)
+
+    def ingest_reports(self, name, since):
+        from focus_cache import refresh_cache
+
+        tenancy = self.tenancies[name]
+        destination = tenancy.destination
+        client, _ = self.client(destination['profile'], destination['rate'], DEFAULT_WORKERS)
+        with span('collect_ingest', tenancy=name):
+            result = refresh_cache(client, destination['namespace'], destination['bucket'], tenancy.cache_dir,
+                                   prefix=destination['prefix'] + tenancy.prefix, start=since)
+        progress = self.progress[name]
+        progress.ingested = len(result.ingested)
+        progress.failed.extend(result.failed)
+        self._finish(name)
+
+    def _finish(self, name):
+        progress = self.progress[name]
+        progress.status = 'failed' if progress.failed or progress.errors else 'done'
+        log_event('tenancy_finished', tenancy=name, status=progress.status, copied=progress.copied,
+                  failed=len(progress.failed), ingested=progress.ingested)
+
+    def _job_done(self, job, error):
+        progress = self.progress[job.tenancy]
+        if error is not None:
+            progress.status = 'failed'
+            progress.errors.append(f"{job.description}: {error}")
+            log_event('job_failed', tenancy=job.tenancy, job=job.description, error=str(error))
+        progress.updated = datetime.now(timezone.utc).isoformat()
+        self.save_progress()
+
+    def _load_progress(self):
+        path = os.path.join(self.state_dir, PROGRESS_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def _resume_since(self, name):
+        # A run that did not finish (deadline, failures) may have advanced the manifest watermark past
+        # parts it never copied, so the next run lists again from where that run started
+        previous = self.previous.get(name)
+        if previous and previous['status'] not in ('done', 'planned') and previous.get('since'):
+            return date.fromisoformat(previous['since'])
+        return None
+
+    def save_progress(self):
+        with self._lock:
+            document = {name: vars(p) for name, p in self.progress.items()}
+            fd, tmp_path = tempfile.mkstemp(dir=self.state_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(document, f, indent=1, default=str)
+            os.replace(tmp_path, os.path.join(self.state_dir, PROGRESS_FILE))
+
+
+# Parsing runs in worker processes, which re-import this module on Windows
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Collect FOCUS reports of many tenancies into their destinations')
+    parser.add_argument('--config', required=True, help='JSON collector config, see the top of this file')
+    parser.add_argument('--only', help='comma separated tenancy names to collect')
+    parser.add_argument('--state', default=STATE_DIR, help='directory for manifests and progress.json')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='jobs running at once, all tenancies')
+    parser.add_argument('--per-tenancy', type=int, default=DEFAULT_PER_TENANCY, help='jobs running at once per tenancy')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='report parts per copy job')
+    parser.add_argument('--since', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(),
+                        help='first report day to list (YYYY-MM-DD), defaults to each manifest watermark')
+    parser.add_argument('--deadline', type=float, help='minutes after which no new job starts')
+    parser.add_argument('--no-ingest', action='store_true', help='only copy, even where a cache_dir is configured')
+    parser.add_argument('--dry-run', action='store_true', help='only show the reports and bytes each tenancy would copy')
+    args = parser.parse_args()
+    install('report_collector')
+
+    tenancies = load_config(args.config)
+    if args.only:
+        wanted = set(args.only.split(','))
+        tenancies = [t for t in tenancies if t.name in wanted]
+
+    collector = Collector(tenancies, state_dir=args.state, workers=args.workers, per_tenancy=args.per_tenancy,
+                          batch_size=args.batch_size, since=args.since, ingest=not args.no_ingest,
+                          dry_run=args.dry_run, deadline=args.deadline)
+    progress, deferred = collector.run()
+
+    for name, p in progress.items():
+        print(f"{name}: {p.status}, {p.copied} of {p.pending} parts copied ({p.bytes} bytes)"
+              + (f", {p.ingested} ingested" if p.ingested is not None else '')
+              + (f", {len(p.failed)} failed" if p.failed else '')
+              + (f", {'; '.join(p.errors)}" if p.errors else ''))
+    if deferred:
+        print(f"{len(deferred)} job(s) deferred past the deadline, run again to resume")
+    if any(p.status not in ('done', 'planned') for p in progress.values()):
+        sys.exit(1)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The scripts import each other from the repository root, the copy engine ships with the function
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'copy-cost-reports'))
@@ -0,0 +1,76 @@
+import gzip
+import sqlite3
+
+import pytest
+
+from adw_loader import LEDGER_TABLE, TARGET_TABLE, SqliteBackend, load_reports
+from local_object_storage import LocalObjectStorageClient
+
+NAMESPACE, BUCKET = 'bling', 'reports'
+HEADER = 'BillingPeriodStart,BillingPeriodEnd,EffectiveCost,BilledCost,UsageQuantity,Region,ServiceName\n'
+
+
+def report(rows, cost=1.25):
+    lines = [f"2026-10-01T{h:02}:00Z,2026-10-01T{h:02}:59Z,{cost},{cost},1234567.891234,us-ashburn-1,COMPUTE\n"
+             for h in range(rows)]
+    return gzip.compress((HEADER + ''.join(lines)).encode())
+
+
+@pytest.fixture
+def client(tmp_path):
+    client = LocalObjectStorageClient(str(tmp_path / 'store'))
+    client.put_object(NAMESPACE, BUCKET, 'FOCUS Reports/2026/10/01/0001.csv.gz', report(10))
+    client.put_object(NAMESPACE, BUCKET, 'FOCUS Reports/2026/10/01/0002.csv.gz', report(5))
+    return client
+
+
+def load(client, backend):
+    objects = client.list_objects(NAMESPACE, BUCKET, prefix='FOCUS Reports').data.objects
+    return load_reports(backend, client, NAMESPACE, BUCKET, objects, workers=2, batch_size=4)
+
+
+def query(path, sql):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute(sql).fetchall()
+    finally:
+        connection.close()
+
+
+def test_reload_is_idempotent(client, tmp_path):
+    path = str(tmp_path / 'focus.db')
+    backend = SqliteBackend(path)
+
+    first = load(client, backend)
+    assert not first.failed
+    assert first.rows == 15
+
+    second = load(client, backend)
+    assert second.skipped == 2
+    assert not second.results
+    assert query(path, f"SELECT COUNT(*), SUM(EffectiveCost) FROM {TARGET_TABLE}") == [(15, 15 * 1.25)]
+    assert query(path, f"SELECT COUNT(*) FROM {LEDGER_TABLE}") == [(2,)]
+
+
+def test_changed_report_replaces_its_rows(client, tmp_path):
+    path = str(tmp_path / 'focus.db')
+    backend = SqliteBackend(path)
+    load(client, backend)
+
+    client.put_object(NAMESPACE, BUCKET, 'FOCUS Reports/2026/10/01/0001.csv.gz', report(3, cost=2.0))
+    summary = load(client, backend)
+
+    assert summary.skipped == 1
+    assert [r.source_name for r in summary.loaded] == ['FOCUS Reports/2026/10/01/0001.csv.gz']
+    assert query(path, f"SELECT SourceFile, COUNT(*), SUM(EffectiveCost) FROM {TARGET_TABLE} "
+                       "GROUP BY SourceFile ORDER BY SourceFile") == [
+        ('FOCUS Reports/2026/10/01/0001.csv.gz', 3, 6.0),
+        ('FOCUS Reports/2026/10/01/0002.csv.gz', 5, 5 * 1.25),
+    ]
+
+
+def test_quantities_are_loaded_at_full_precision(client, tmp_path):
+    path = str(tmp_path / 'focus.db')
+    load(client, SqliteBackend(path))
+
+    assert query(path, f"SELECT DISTINCT UsageQuantity FROM {TARGET_TABLE}") == [(1234567.891234,)]
@@ -0,0 +1,40 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from anomaly_engine import AnomalyEngine
+
+START = date(2026, 6, 1)
+
+
+def weekday_only(weeks, seed=0):
+    # Cost on Monday to Friday only, as a workload that is shut down over the weekend
+    rng = np.random.default_rng(seed)
+    days = [START + timedelta(days=i) for i in range(7 * weeks)]
+    cost = [100 + rng.normal(0, 5) if day.weekday() < 5 else 0.0 for day in days]
+    return pd.DataFrame({'ServiceName': 'COMPUTE', 'Region': 'us-ashburn-1', 'BillingDay': days, 'EffectiveCost': cost})
+
+
+def test_series_without_weekend_cost():
+    daily = weekday_only(10)
+    scores = AnomalyEngine(scorers=('mad', 'ewma', 'seasonal')).update(daily)
+    scored = scores.iloc[14:]
+
+    score_columns = ['score_mad', 'score_ewma', 'score_seasonal']
+    assert np.isfinite(scored[score_columns].to_numpy()).all()
+    # Empty weekends are the series' normal pattern
+    assert not scored['is_anomaly'].any(), scored[scored['is_anomaly']][['BillingDay'] + score_columns]
+
+
+def test_weekend_cost_scores_finite_and_is_flagged():
+    engine = AnomalyEngine()
+    # Ten weeks up to a Friday
+    engine.update(weekday_only(10).iloc[:-2])
+    saturday = engine.state.last_day + timedelta(days=1)
+    assert saturday.weekday() == 5
+
+    scores = engine.update(pd.DataFrame({'ServiceName': ['COMPUTE'], 'Region': ['us-ashburn-1'],
+                                         'BillingDay': [saturday], 'EffectiveCost': [100.0]}))
+    assert np.isfinite(scores[['score_mad', 'score_seasonal']].to_numpy()).all()
+    assert scores['is_anomaly'].all()
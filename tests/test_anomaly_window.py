@@ -0,0 +1,66 @@
+import gzip
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from anomaly_window import AnomalyWindow, first_day
+from focus_cache import cache_payload
+from focus_cube import update_cube
+from main import window_zscores
+
+END = date(2026, 10, 17)
+DAYS = 120
+HEADER = 'BillingPeriodStart,BillingPeriodEnd,EffectiveCost,BilledCost,Region,ServiceName\n'
+
+
+def write_reports(cache_dir, first, last, seed=0):
+    # One report per day with rows at every hour, so the first day of the window is only partly inside a
+    # window that starts at a time of day instead of midnight
+    rng = np.random.default_rng(seed)
+    day = first
+    while day <= last:
+        lines = []
+        for hour in range(24):
+            for service in ('COMPUTE', 'BIG_DATA', 'NETWORK'):
+                for region in ('us-ashburn-1', 'ca-toronto-1'):
+                    cost = rng.random() * (40 if service == 'BIG_DATA' and region == 'ca-toronto-1' else 1)
+                    stamp = f"{day.isoformat()}T{hour:02}:30Z"
+                    lines.append(f"{stamp},{stamp},{cost},{cost},{region},{service}\n")
+        cache_payload(f"FOCUS Reports/{day:%Y/%m/%d}/0001.csv.gz", gzip.compress((HEADER + ''.join(lines)).encode()),
+                      cache_dir)
+        day += timedelta(days=1)
+
+
+def incremental(tmp_path, cache_dir, end):
+    cube = update_cube(cache_dir, str(tmp_path / 'cube.parquet'))
+    window = AnomalyWindow.open(str(tmp_path / 'window'), days=DAYS)
+    window.update(cube, cube.updated, end=end)
+    window.save(str(tmp_path / 'window'))
+    return window.totals.reset_index()
+
+
+def full(cache_dir, end):
+    totals = window_zscores(cache_dir, pd.Timestamp(first_day(end, DAYS), tz='UTC'))
+    return totals.astype({'ServiceName': str, 'Region': str})
+
+
+def compare(window, totals):
+    merged = window.merge(totals, on=['ServiceName', 'Region'], suffixes=('_window', '_full'), validate='1:1')
+    assert len(merged) == len(window) == len(totals)
+    assert np.allclose(merged['EffectiveCost_window'], merged['EffectiveCost_full'], rtol=0, atol=1e-9)
+    assert np.allclose(merged['z_score_window'], merged['z_score_full'], rtol=0, atol=1e-9)
+
+
+def test_window_is_days_whole_days():
+    assert first_day(END, DAYS) == END - timedelta(days=DAYS - 1)
+
+
+def test_incremental_matches_full_run(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    write_reports(cache_dir, END - timedelta(days=DAYS + 10), END)
+    compare(incremental(tmp_path, cache_dir, END), full(cache_dir, END))
+
+    # The window slides a day: one day enters, one leaves
+    write_reports(cache_dir, END + timedelta(days=1), END + timedelta(days=1), seed=1)
+    compare(incremental(tmp_path, cache_dir, END + timedelta(days=1)), full(cache_dir, END + timedelta(days=1)))
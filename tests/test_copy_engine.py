@@ -0,0 +1,98 @@
+import os
+
+import pytest
+
+from copy_engine import CopyEngine
+from local_object_storage import LocalObjectStorageClient, LocalServiceError
+
+SOURCE = ('bling', 'reports')
+DESTINATION = ('ociateam', 'cost_and_usage_reports')
+PART_SIZE = 64 * 1024
+CHUNK_SIZE = 16 * 1024
+# One part, exactly one full part, and several parts with a short last one
+SIZES = {'small.csv.gz': 1000, 'one_part.csv.gz': PART_SIZE, 'multi_part.csv.gz': 2 * PART_SIZE + 12345}
+
+
+@pytest.fixture
+def client(tmp_path):
+    client = LocalObjectStorageClient(str(tmp_path / 'store'))
+    for name, size in SIZES.items():
+        client.put_object(*SOURCE, f"FOCUS Reports/2026/10/01/{name}", os.urandom(size))
+    return client
+
+
+def listed(client):
+    return client.list_objects(*SOURCE, prefix='FOCUS Reports').data.objects
+
+
+def read(client, namespace, bucket, name):
+    return client.get_object(namespace, bucket, name).data.content
+
+
+def engine(client, tmp_path, mode, **kwargs):
+    return CopyEngine(client, workers=2, retries=1, backoff=0.0, tmp_dir=str(tmp_path), mode=mode,
+                      part_size=PART_SIZE, chunk_size=CHUNK_SIZE, **kwargs)
+
+
+@pytest.mark.parametrize('mode', ['spool', 'stream', 'server'])
+def test_copies_every_object_byte_for_byte(client, tmp_path, mode):
+    objects = listed(client)
+    summary = engine(client, tmp_path, mode).copy(*SOURCE, *DESTINATION, objects)
+
+    assert not summary.failed
+    assert {r.method for r in summary.results} == {mode}
+    assert summary.bytes == sum(SIZES.values())
+    for obj in objects:
+        assert read(client, *DESTINATION, obj.name) == read(client, *SOURCE, obj.name)
+
+
+def test_stream_keeps_inflight_parts_bounded(client, tmp_path):
+    objects = listed(client)
+    summary = engine(client, tmp_path, 'stream', inflight_parts=2).copy(*SOURCE, *DESTINATION, objects)
+
+    assert not summary.failed
+    for obj in objects:
+        assert read(client, *DESTINATION, obj.name) == read(client, *SOURCE, obj.name)
+    # Nothing left staged by the multipart uploads
+    assert not os.listdir(os.path.join(client.root, '.uploads'))
+
+
+def test_destination_name(client, tmp_path):
+    objects = listed(client)
+    summary = engine(client, tmp_path, 'stream').copy(*SOURCE, *DESTINATION, objects,
+                                                      destination_name=lambda name: f"copied/{name}")
+
+    assert sorted(r.destination_name for r in summary.results) == sorted(f"copied/{o.name}" for o in objects)
+    for obj in objects:
+        assert read(client, *DESTINATION, f"copied/{obj.name}") == read(client, *SOURCE, obj.name)
+
+
+def test_server_copy_not_permitted_falls_back_to_stream(client, tmp_path):
+    def forbidden(*args, **kwargs):
+        raise LocalServiceError(403, 'NotAuthorizedOrNotFound', 'cross-tenancy copy')
+
+    client.copy_object = forbidden
+    objects = listed(client)
+    summary = engine(client, tmp_path, 'server').copy(*SOURCE, *DESTINATION, objects)
+
+    assert not summary.failed
+    assert {r.method for r in summary.results} == {'stream'}
+    for obj in objects:
+        assert read(client, *DESTINATION, obj.name) == read(client, *SOURCE, obj.name)
+
+
+@pytest.mark.parametrize('mode', ['spool', 'stream'])
+def test_missing_object_fails_without_retries(client, tmp_path, mode):
+    summary = engine(client, tmp_path, mode).copy(*SOURCE, *DESTINATION, ['FOCUS Reports/2026/10/01/gone.csv.gz'])
+
+    [result] = summary.failed
+    assert result.status == 404
+    assert result.attempts == 1
+    assert summary.as_dict()['failed'] == ['FOCUS Reports/2026/10/01/gone.csv.gz']
+
+
+def test_memory_budget_caps_stream_workers(client):
+    # A stream worker holds its in-flight part and the one it is reading
+    assert CopyEngine(client, workers=8, part_size=PART_SIZE, memory_budget=6 * PART_SIZE).workers == 3
+    assert CopyEngine(client, workers=8, part_size=PART_SIZE, memory_budget=PART_SIZE).workers == 1
+    assert CopyEngine(client, workers=8, part_size=PART_SIZE, memory_budget=PART_SIZE, mode='spool').workers == 8
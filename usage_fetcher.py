@@ -0,0 +1,279 @@
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Retry classification is shared with the copy engine of the copy-cost-reports function
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'copy-cost-reports'))
+from copy_engine import is_retryable
+
+# Usage API client layer with an on-disk result cache.
+# A date range is split into day (or month) periods; periods already in the cache are read from disk and
+# the missing ones are fetched in shards of consecutive periods, concurrently, under a shared request rate
+# limit and with retries, following every page of each response. Results are typed DataFrames.
+# The cache is keyed by the query (tenant, granularity, query type, group_by, filter):
+#   <cache_dir>/<query key>/query.json
+#   <cache_dir>/<query key>/<YYYY-MM-DD>.parquet   one file per period, possibly empty
+# so a wider or shifted range later only fetches the periods it adds.
+
+DEFAULT_WORKERS = 4
+DEFAULT_RATE = 5.0
+DEFAULT_RETRIES = 4
+DEFAULT_BACKOFF = 1.0
+MAX_BACKOFF = 30.0
+SHARD_PERIODS = 7
+PAGE_LIMIT = 1000
+# Usage is restated for a while after the fact, recent periods are returned but not cached
+SETTLE_DAYS = 3
+
+TIMESTAMP_FIELDS = ['time_usage_started', 'time_usage_ended']
+NUMERIC_FIELDS = ['computed_amount', 'computed_quantity', 'attributed_cost', 'attributed_usage',
+                  'unit_price', 'list_rate', 'discount']
+STRING_FIELDS = ['tenant_id', 'tenant_name', 'compartment_id', 'compartment_path', 'compartment_name', 'service',
+                 'resource_name', 'resource_id', 'region', 'ad', 'sku_part_number', 'sku_name', 'platform',
+                 'subscription_id', 'shape', 'unit', 'currency', 'overages_flag', 'is_forecast']
+USAGE_FIELDS = TIMESTAMP_FIELDS + STRING_FIELDS + NUMERIC_FIELDS
+
+
+def _field_type(name):
+    if name in TIMESTAMP_FIELDS:
+        return pa.timestamp('ns', tz='UTC')
+    if name in NUMERIC_FIELDS:
+        return pa.float64()
+    return pa.string()
+
+
+USAGE_SCHEMA = pa.schema([pa.field(f, _field_type(f)) for f in USAGE_FIELDS])
+
+
+def _models():
+    # Request models come from the SDK when present; test clients accept plain namespaces
+    try:
+        from oci.usage_api import models
+    except ImportError:
+        return None
+    return models
+
+
+def _filter_model(spec):
+    # Filters are given in their JSON form, e.g.
+    # {"operator": "AND", "dimensions": [{"key": "service", "value": "COMPUTE"}]}
+    models = _models()
+    if spec is None or models is None:
+        return spec
+    return models.Filter(
+        operator=spec.get('operator'),
+        dimensions=[models.Dimension(key=d['key'], value=d['value']) for d in spec.get('dimensions') or []] or None,
+        tags=[models.Tag(namespace=t.get('namespace'), key=t['key'], value=t.get('value'))
+              for t in spec.get('tags') or []] or None,
+        filters=[_filter_model(f) for f in spec.get('filters') or []] or None,
+    )
+
+
+@dataclass(frozen=True)
+class UsageQuery:
+    tenant_id: str
+    granularity: str = 'DAILY'
+    query_type: str = 'COST'
+    group_by: tuple = ()
+    filter: str = None  # JSON text of the filter, see _filter_model
+
+    @property
+    def key(self):
+        return hashlib.sha1(json.dumps(asdict(self), sort_keys=True).encode()).hexdigest()[:16]
+
+    def details(self, start, end, page_limit=None):
+        fields = dict(
+            tenant_id=self.tenant_id,
+            time_usage_started=datetime.combine(start, datetime.min.time(), timezone.utc),
+            time_usage_ended=datetime.combine(end, datetime.min.time(), timezone.utc),
+            granularity=self.granularity,
+            query_type=self.query_type,
+            group_by=list(self.group_by) or None,
+            filter=_filter_model(json.loads(self.filter)) if self.filter else None,
+        )
+        models = _models()
+        return models.RequestSummarizedUsagesDetails(**fields) if models else SimpleNamespace(**fields)
+
+
+def periods(start, end, granularity='DAILY'):
+    # Cache periods covering [start, end): months for MONTHLY, days otherwise
+    current = start if granularity != 'MONTHLY' else start.replace(day=1)
+    while current < end:
+        following = current + timedelta(days=1)
+        if granularity == 'MONTHLY':
+            following = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+        yield current, following
+        current = following
+
+
+class RateLimiter:
+    # Token bucket shared by all fetch threads
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def to_frame(items):
+    rows = [{f: getattr(item, f, None) for f in USAGE_FIELDS} for item in items]
+    frame = pd.DataFrame(rows, columns=USAGE_FIELDS)
+    for name in TIMESTAMP_FIELDS:
+        frame[name] = pd.to_datetime(frame[name], utc=True).astype('datetime64[ns, UTC]')
+    for name in NUMERIC_FIELDS:
+        frame[name] = pd.to_numeric(frame[name], errors='coerce').astype('float64')
+    for name in STRING_FIELDS:
+        frame[name] = frame[name].astype('string')
+    return frame
+
+
+@dataclass
+class FetchStats:
+    cached_periods: int = 0
+    fetched_periods: int = 0
+    requests: int = 0
+    retries: int = 0
+    rows: int = 0
+    seconds: float = 0.0
+    errors: list = field(default_factory=list)
+
+
+class UsageFetcher:
+    def __init__(self, client, cache_dir, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE, retries=DEFAULT_RETRIES,
+                 backoff=DEFAULT_BACKOFF, shard_periods=SHARD_PERIODS, page_limit=PAGE_LIMIT, settle_days=SETTLE_DAYS):
+        self.client = client
+        self.cache_dir = cache_dir
+        self.workers = max(1, workers)
+        self.limiter = RateLimiter(rate)
+        self.retries = retries
+        self.backoff = backoff
+        self.shard_periods = max(1, shard_periods)
+        self.page_limit = page_limit
+        self.settle_days = settle_days
+        self.stats = FetchStats()
+        self._stats_lock = threading.Lock()
+
+    def _query_dir(self, query):
+        path = os.path.join(self.cache_dir, query.key)
+        if not os.path.exists(path):
+            os.makedirs(path, exist_ok=True)
+            with open(os.path.join(path, 'query.json'), 'w') as f:
+                json.dump(asdict(query), f, indent=2)
+        return path
+
+    def _period_path(self, query_dir, period_start):
+        return os.path.join(query_dir, f"{period_start.isoformat()}.parquet")
+
+    def _call(self, details, page):
+        attempts = 0
+        while True:
+            self.limiter.acquire()
+            attempts += 1
+            try:
+                with self._stats_lock:
+                    self.stats.requests += 1
+                return self.client.request_summarized_usages(details, page=page, limit=self.page_limit)
+            except Exception as ex:
+                if attempts > self.retries or not is_retryable(ex):
+                    raise
+                with self._stats_lock:
+                    self.stats.retries += 1
+                # Exponential backoff with full jitter, as in the copy engine
+                time.sleep(random.uniform(0, min(MAX_BACKOFF, self.backoff * 2 ** (attempts - 1))))
+
+    def _fetch_shard(self, query, start, end):
+        details = query.details(start, end)
+        items = []
+        page = None
+        while True:
+            response = self._call(details, page)
+            items.extend(response.data.items or [])
+            page = response.next_page
+            if not page:
+                return to_frame(items)
+
+    def fetch(self, query, start, end):
+        # start/end are dates, end exclusive. Returns one typed row per usage summary.
+        started = time.perf_counter()
+        query_dir = self._query_dir(query)
+        settled = datetime.now(timezone.utc).date() - timedelta(days=self.settle_days)
+
+        wanted = list(periods(start, end, query.granularity))
+        frames = []
+        missing = []
+        errors = []
+        for period_start, period_end in wanted:
+            path = self._period_path(query_dir, period_start)
+            if os.path.exists(path):
+                frames.append(pq.read_table(path, schema=USAGE_SCHEMA).to_pandas())
+            else:
+                missing.append((period_start, period_end))
+        self.stats.cached_periods += len(wanted) - len(missing)
+
+        # Consecutive missing periods are requested together, up to shard_periods per request
+        shards = []
+        for period in missing:
+            if shards and shards[-1][-1][1] == period[0] and len(shards[-1]) < self.shard_periods:
+                shards[-1].append(period)
+            else:
+                shards.append([period])
+
+        with ThreadPoolExecutor(self.workers) as pool:
+            futures = {pool.submit(self._fetch_shard, query, s[0][0], s[-1][1]): s for s in shards}
+            for future in as_completed(futures):
+                shard = futures[future]
+                try:
+                    frame = future.result()
+                except Exception as ex:
+                    errors.append(f"{shard[0][0]} to {shard[-1][1]}: {ex}")
+                    continue
+                self.stats.fetched_periods += len(shard)
+                frames.append(frame)
+                day = frame['time_usage_started'].dt.date
+                for period_start, period_end in shard:
+                    if period_end > settled:
+                        continue
+                    part = frame[(day >= period_start) & (day < period_end)]
+                    path = self._period_path(query_dir, period_start)
+                    pq.write_table(pa.Table.from_pandas(part, schema=USAGE_SCHEMA, preserve_index=False), f"{path}.tmp")
+                    os.replace(f"{path}.tmp", path)
+
+        self.stats.seconds += time.perf_counter() - started
+        if errors:
+            # The shards that succeeded are cached, a re-run only fetches the failed ones
+            self.stats.errors.extend(errors)
+            raise RuntimeError(f"{len(errors)} of {len(shards)} usage shard(s) failed: {'; '.join(errors)}")
+
+        frames = [f for f in frames if not f.empty]
+        result = pd.concat(frames, ignore_index=True) if frames else to_frame([])
+        result = result.sort_values('time_usage_started', kind='stable', ignore_index=True)
+        self.stats.rows += len(result)
+        return result
+
+    def fetch_arrow(self, query, start, end):
+        return pa.Table.from_pandas(self.fetch(query, start, end), schema=USAGE_SCHEMA, preserve_index=False)